@@ -1,5 +1,23 @@
-from quart import Quart, jsonify
-from util import time_to_timedelta
+from quart import Quart, jsonify, request
+from sqlalchemy.exc import SQLAlchemyError
+from database import snapshot
+
+from datetime import timezone
+import zlib
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def _rank_neighbour(entry, neighbour):
+    if neighbour is None:
+        return None
+    return {
+        "name": neighbour.name,
+        "position": neighbour.position,
+        "points": neighbour.final_points,
+        "gap": neighbour.final_points - entry.final_points
+    }
 
 
 class Api:
@@ -10,38 +28,133 @@ class Api:
         self.host = config.get("host", "127.0.0.1")
         self.port = config.get("port", "5001")
 
+        def etag(lb, *resource):
+            return "-".join(str(part) for part in (lb.id, lb.version) + resource)
+
+        def last_modified(lb):
+            return None if lb.updated_at is None else lb.updated_at.replace(tzinfo=timezone.utc)
+
+        def cache_headers(response, tag, modified=None):
+            # Even closed leaderboards change when rebuilt, clients always revalidate with the ETag
+            response.set_etag(tag)
+            if modified is not None:
+                response.last_modified = modified
+            response.cache_control.no_cache = True
+            return response
+
+        def not_modified(tag, modified=None):
+            if tag in request.if_none_match:
+                return cache_headers(self.api.response_class("", status=304), tag, modified)
+            return None
+
+        def json_response(tag, data, gzip_data=None, modified=None):
+            # Snapshots are sent as they were stored, compressed if the client accepts it
+            if "gzip" in request.accept_encodings:
+                response = self.api.response_class(gzip_data or snapshot.compress(data), mimetype="application/json")
+                response.headers["Content-Encoding"] = "gzip"
+            else:
+                response = self.api.response_class(data, mimetype="application/json")
+            response.vary.add("Accept-Encoding")
+            return cache_headers(response, tag, modified)
+
+        async def store_snapshot(session, lb, week, document, version=None):
+            # Snapshots missing or behind their version are stored by the first request that builds them
+            stored = await self.db.save_leaderboard_snapshot(session, lb, week, document, version)
+            data, gzip_data = stored.data, stored.gzip_data
+            try:
+                await session.commit()
+            except SQLAlchemyError as e:
+                # Another request stored it first or the database is busy, the next request tries again
+                logger.warning("Could not store the snapshot of week %d of leaderboard %d: %s", week, lb.id, e)
+                await session.rollback()
+            return data, gzip_data
+
         @self.api.route("/leaderboard/<int:id>", methods=['GET'])
         async def leaderboard(id):
-            with self.db.Session() as session:
-                lb = self.db.get_leaderboard(session, id)
+            if any(arg in request.args for arg in ("after_position", "limit", "fields")):
+                return await leaderboard_page(id)
+
+            async with self.db.Session() as session:
+                lb = await self.db.get_leaderboard_summary(session, id, with_snapshot=True)
+                if lb is None:
+                    return jsonify({
+                        "error": "Não existe uma Leaderboard com id %d" % id
+                    }), 404
+                tag = etag(lb)
+                response = not_modified(tag, last_modified(lb))
+                if response is not None:
+                    return response
+                if lb.data is not None:
+                    return json_response(tag, lb.data, lb.gzip_data, last_modified(lb))
+
+                entries, results = await self.db.get_leaderboard_standings(session, id)
+                data, gzip_data = await store_snapshot(
+                    session, lb, 0, snapshot.leaderboard_document(lb, entries, results)
+                )
+                return json_response(tag, data, gzip_data, last_modified(lb))
+
+        async def leaderboard_page(id):
+            after_position = request.args.get("after_position", type=int)
+            limit = request.args.get("limit", type=int)
+            fields = request.args.get("fields")
+            if fields is not None:
+                fields = [field for field in fields.split(",") if len(field) > 0]
+                unknown = [field for field in fields if field not in snapshot.LEADERBOARD_ENTRY_FIELDS]
+                if len(unknown) > 0:
+                    return jsonify({
+                        "error": "Campos desconhecidos: %s" % ", ".join(unknown)
+                    }), 400
+            if ("limit" in request.args and (limit is None or limit <= 0)) or \
+                    ("after_position" in request.args and after_position is None):
+                return jsonify({
+                    "error": "Os parâmetros 'after_position' e 'limit' devem ser números inteiros positivos"
+                }), 400
+
+            async with self.db.Session() as session:
+                lb = await self.db.get_leaderboard_summary(session, id)
                 if lb is None:
                     return jsonify({
                         "error": "Não existe uma Leaderboard com id %d" % id
                     }), 404
-                entries = sorted(
-                    filter(lambda e: e.leaderboard_data.get("position", None) is not None, lb.entries),
-                    key=lambda e: e.leaderboard_data["position"]
+                tag = etag(lb, "%08x" % zlib.crc32(request.query_string))
+                response = not_modified(tag, last_modified(lb))
+                if response is not None:
+                    return response
+
+                entries, results = await self.db.get_leaderboard_standings(
+                    session,
+                    id,
+                    after_position=after_position,
+                    limit=limit,
+                    with_player=fields is None or "name" in fields,
+                    with_results=fields is None or "weeklies" in fields
                 )
+                document = snapshot.leaderboard_document(lb, entries, results, fields)
+                if limit is not None:
+                    document["next_after_position"] = entries[-1].position if len(entries) >= limit else None
+                return json_response(tag, snapshot.encode(document), modified=last_modified(lb))
+
+        @self.api.route("/leaderboard/<int:id>/player/<int:player_id>", methods=['GET'])
+        async def leaderboard_player(id, player_id):
+            async with self.db.Session() as session:
+                entry, above, below = await self.db.get_leaderboard_rank(session, id, player_id)
+                if entry is None:
+                    return jsonify({
+                        "error": "O jogador %d não está classificado na Leaderboard com id %d" % (player_id, id)
+                    }), 404
                 return jsonify(
-                    id=lb.id,
-                    game=lb.game.name,
-                    status=lb.status.name,
-                    created_at=lb.created_at,
-                    data=lb.leaderboard_data,
-                    entries=[
-                        {
-                            "name": e.player.name,
-                            "position": e.leaderboard_data["position"],
-                            "points": e.leaderboard_data["final_points"],
-                            "weeklies": e.leaderboard_data["weeklies"]
-                        } for e in entries
-                    ]
+                    leaderboard_id=id,
+                    name=entry.name,
+                    position=entry.position,
+                    points=entry.final_points,
+                    above=_rank_neighbour(entry, above),
+                    below=_rank_neighbour(entry, below)
                 )
 
         @self.api.route("/leaderboard/<int:id>/<int:week_id>", methods=['GET'])
         async def leaderboard_week(id, week_id):
-            with self.db.Session() as session:
-                lb = self.db.get_leaderboard(session, id)
+            async with self.db.Session() as session:
+                lb = await self.db.get_leaderboard_summary(session, id)
                 if lb is None:
                     return jsonify({
                         "error": "Não existe uma Leaderboard com id %d" % id
@@ -51,30 +164,23 @@ class Api:
                         "A leaderboard selecionada não possuí a semanal #%d" % (week_id + 1)
                     }), 404
 
-                weekly = self.db.get_weekly(session, lb.leaderboard_data["weeklies"][week_id - 1])
-                entries = sorted(
-                    filter(lambda e: not e.leaderboard_data.get("excluded", False), weekly.entries),
-                    key=lambda e: e.leaderboard_data["points"],
-                    reverse=True
+                # Weeks change with their weekly only, not with the rest of the leaderboard, so the ETag of the
+                # weekly is their only validator
+                weekly = await self.db.get_weekly_summary(
+                    session, lb.leaderboard_data["weeklies"][week_id - 1], id, week_id
                 )
-                return jsonify(
-                    leaderboard_id=lb.id,
-                    leaderboard_week=week_id,
-                    weekly_id=weekly.id,
-                    game=weekly.game.name,
-                    status=weekly.status.name,
-                    created_at=weekly.created_at,
-                    seed=weekly.seed_url,
-                    hash=weekly.seed_hash,
-                    entries=[
-                        {
-                            "name": e.player.name,
-                            "position": e.leaderboard_data["position"],
-                            "points": e.leaderboard_data["points"],
-                            "time": None if e.finish_time is None else int(time_to_timedelta(e.finish_time).total_seconds())
-                        } for e in entries
-                    ]
+                tag = "-".join(str(part) for part in (lb.id, "week", week_id, weekly.id, weekly.version))
+                response = not_modified(tag)
+                if response is not None:
+                    return response
+                if weekly.data is not None:
+                    return json_response(tag, weekly.data, weekly.gzip_data)
+
+                entries = await self.db.get_weekly_standings(session, weekly.id)
+                data, gzip_data = await store_snapshot(
+                    session, lb, week_id, snapshot.weekly_document(lb, week_id, weekly, entries), weekly.version
                 )
+                return json_response(tag, data, gzip_data)
 
     def run(self, loop, use_reloader):
         return self.api.run(host=self.host, port=self.port, loop=loop, use_reloader=use_reloader)
@@ -0,0 +1,16 @@
+from util import load_conf, setup_logging
+from database import AsyncDatabase
+
+from .Api import Api
+
+
+# Entry point for ASGI servers, e.g. 'hypercorn api.asgi:app'. Every worker process builds its own engine and pool.
+
+def create_app(cfg=None):
+    if cfg is None:
+        cfg = load_conf()
+        setup_logging(cfg['logging'])
+    return Api(AsyncDatabase(**cfg['database']), cfg['api']).api
+
+
+app = create_app()
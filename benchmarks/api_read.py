@@ -0,0 +1,67 @@
+"""Latency and memory of building the API documents from Core projections against walking the ORM objects.
+
+Run with: python -m benchmarks.api_read
+"""
+from sqlalchemy import create_engine
+
+from database import Database, snapshot
+from database.model import Base
+
+from bot.cogs.weekly_races.leaderboard import update_weekly, update_leaderboard
+from tests import orm_documents
+from tests.factories import seed_leaderboard
+from tests.test_api_documents import core_leaderboard_document, core_weekly_document
+
+import time
+import tracemalloc
+
+
+PLAYERS = 500
+WEEKLIES = 30
+RUNS = 20
+
+
+def measure(db, build):
+    # A session per request, as the API opens them
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        with db.Session() as session:
+            snapshot.encode(build(session))
+    elapsed = (time.perf_counter() - start) / RUNS
+
+    tracemalloc.start()
+    with db.Session() as session:
+        snapshot.encode(build(session))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(engine)
+    db = Database.from_engine(engine)
+    with db.Session() as session:
+        lb, closed, _, _ = seed_leaderboard(session, players=PLAYERS, weeklies=WEEKLIES)
+        for weekly in closed:
+            update_weekly(db, session, weekly)
+        update_leaderboard(db, session, lb)
+        session.commit()
+        leaderboard_id = lb.id
+
+    paths = [
+        ("leaderboard", "core", lambda session: core_leaderboard_document(db, session, leaderboard_id)),
+        ("leaderboard", "orm", lambda session: orm_documents.leaderboard_document(db, session, leaderboard_id)),
+        ("week", "core", lambda session: core_weekly_document(db, session, leaderboard_id, 1)),
+        ("week", "orm", lambda session: orm_documents.weekly_document(db, session, leaderboard_id, 1)),
+    ]
+    print("%d players, %d weeklies" % (PLAYERS, WEEKLIES))
+    print("%12s %6s %10s %12s" % ("document", "path", "ms", "peak KiB"))
+    for document, path, build in paths:
+        elapsed, peak = measure(db, build)
+        print("%12s %6s %10.2f %12.0f" % (document, path, elapsed * 1000, peak / 1024))
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Weekly scoring of the pre-ranking module loops against the scoring kernels, at 10k and 100k entries.
+
+Run with: python -m benchmarks.ranking
+"""
+from bot.cogs.weekly_races import ranking
+from util import time_to_timedelta
+
+from tests import legacy_scoring
+from tests.factories import random_time
+
+import random
+import time
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    kernels = [("python", ranking.get_kernel("python")), ("numpy", ranking.get_kernel("numpy"))]
+    print("%8s %10s %10s %10s" % ("entries", "legacy", *[name for name, _ in kernels]))
+    for size in [10000, 100000]:
+        rng = random.Random(size)
+        # Minute resolution, so there are plenty of ties
+        finish_times = [random_time(rng, step=60) for _ in range(size)]
+        keys = [time_to_timedelta(t).total_seconds() for t in finish_times]
+
+        expected, legacy_seconds = timed(legacy_scoring.weekly, finish_times)
+        row = [legacy_seconds]
+        for _, kernel in kernels:
+            (weekly_positions, weekly_points), seconds = timed(kernel.weekly_points, keys)
+            assert [(str(p), points) for p, points in zip(weekly_positions, weekly_points)] == expected
+            row.append(seconds)
+        print("%8d %10.3f %10.3f %10.3f" % (size, *row))
+
+
+if __name__ == '__main__':
+    main()
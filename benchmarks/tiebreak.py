@@ -0,0 +1,51 @@
+"""Time and reads of update_leaderboard as the number of tied players grows.
+
+Run with: python -m benchmarks.tiebreak
+"""
+from sqlalchemy import create_engine, event
+
+from database import Database
+from database.model import Base
+from datatypes import Games
+
+from bot.cogs.weekly_races.leaderboard import update_weekly, update_leaderboard
+from tests.factories import seed_tied_leaderboard
+
+import time
+
+
+def run(groups, group_size):
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(engine)
+    db = Database.from_engine(engine)
+    reads = []
+    event.listen(
+        engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: reads.append(statement) if statement.startswith("SELECT") else None
+    )
+
+    with db.Session() as session:
+        _, closed = seed_tied_leaderboard(session, groups=groups, group_size=group_size, weeklies=6)
+        for weekly in closed:
+            update_weekly(db, session, weekly)
+        session.commit()
+
+        lb = db.get_open_leaderboard_with_entries(session, Games.ALTTPR)
+        reads.clear()
+        start = time.perf_counter()
+        update_leaderboard(db, session, lb)
+        session.flush()
+        elapsed = time.perf_counter() - start
+    engine.dispose()
+    return len(reads), elapsed
+
+
+def main():
+    print("%8s %8s %8s %10s" % ("groups", "tied", "reads", "seconds"))
+    for groups in [1, 10, 100, 1000]:
+        reads, elapsed = run(groups, 5)
+        print("%8d %8d %8d %10.3f" % (groups, groups * 5, reads, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,24 @@ from discord.ext import commands
 
 from util import get_discord_name
 from .exceptions import FrompsBotException
+from .ReactionQueue import ReactionQueue
 from .converters import TimeConverter, DatetimeConverter, DateConverter, GameConverter
 
+import time
+
 import logging
 logger = logging.getLogger(__name__)
 
 
+def _max_rss():
+    try:
+        import resource
+    except ImportError:
+        return "unavailable"
+    # Reported in kilobytes on Linux
+    return "%.1f MiB" % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+
 async def ping_on_error(user, ctx, error):
     dm = user.dm_channel
     if dm is None:
@@ -53,10 +65,16 @@ class FrompsBot(commands.Bot):
             busy_emoji='⌚',
             success_emoji='✅',
             error_emoji='❌',
+            busy_emoji_delay=1.0,
+            reaction_interval=0.25,
+            member_cache=True,
             **kwargs
     ):
         intents = discord.Intents.default()
-        intents.members = True
+        intents.members = member_cache
+        if not member_cache:
+            # Members are looked up on demand by the cogs that need them
+            kwargs.update(member_cache_flags=discord.MemberCacheFlags.none(), chunk_guilds_at_startup=False)
 
         super().__init__(
             intents=intents,
@@ -74,6 +92,10 @@ class FrompsBot(commands.Bot):
         self.busy_emoji = busy_emoji
         self.success_emoji = success_emoji
         self.error_emoji = error_emoji
+        self.member_cache = member_cache
+        self.started_at = None
+        self.ready_after = None
+        self.reactions = ReactionQueue(self, busy_emoji, busy_delay=busy_emoji_delay, interval=reaction_interval)
 
     async def on_ready(self):
         try:
@@ -92,6 +114,13 @@ class FrompsBot(commands.Bot):
             await self.close()
             raise
 
+        if self.ready_after is None:
+            self.ready_after = time.monotonic() - self.started_at
+            logger.info(
+                "Ready after %.2fs with the member cache %s (max RSS: %s).", self.ready_after,
+                "enabled" if self.member_cache else "disabled", _max_rss()
+            )
+
     async def on_message(self, message):
         if message.author.id == self.user.id or (
                 not isinstance(message.channel, discord.DMChannel) and message.channel not in self.signup_channels):
@@ -128,16 +157,19 @@ class FrompsBot(commands.Bot):
             await super().invoke(ctx)
 
     async def on_command(self, ctx):
-        await ctx.message.add_reaction(self.busy_emoji)
+        self.reactions.started(ctx.message)
 
     async def on_command_completion(self, ctx):
-        await ctx.message.add_reaction(self.success_emoji)
-        await ctx.message.remove_reaction(self.busy_emoji, self.user)
+        self.reactions.finished(ctx.message, self.success_emoji)
 
     async def on_command_error(self, ctx, error):
-        await ctx.message.add_reaction(self.error_emoji)
-        await ctx.message.remove_reaction(self.busy_emoji, self.user)
+        try:
+            await self._reply_error(ctx, error)
+        finally:
+            # Replies go out before the cosmetic reactions
+            self.reactions.finished(ctx.message, self.error_emoji)
 
+    async def _reply_error(self, ctx, error):
         async def handle_unknown_exception():
             logger.exception(error)
 
@@ -194,6 +226,7 @@ class FrompsBot(commands.Bot):
         raise Exception("This decorator is disabled. Use 'listen()' instead")
 
     async def start(self, *args, **kwargs):
+        self.started_at = time.monotonic()
         await super().start(self.token, *args, **kwargs)
 
     def run(self, *args, **kwargs):
@@ -0,0 +1,86 @@
+import discord
+
+import asyncio
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class _MessageState:
+    __slots__ = ("timer", "busy_sent", "finished")
+
+    def __init__(self):
+        self.timer = None
+        self.busy_sent = False
+        self.finished = False
+
+
+class ReactionQueue:
+    """Status reactions for command messages, sent after replies and paced per channel.
+
+    The busy reaction is only added to commands that are still running after busy_delay seconds, and the final
+    reaction is coalesced with the removal of the busy one. Reactions for a channel are sent one at a time, so they
+    never compete with each other for its rate limit bucket.
+    """
+
+    def __init__(self, bot, busy_emoji, *, busy_delay=1.0, interval=0.25):
+        self.bot = bot
+        self.busy_emoji = busy_emoji
+        self.busy_delay = busy_delay
+        self.interval = interval
+
+        self._states = {}
+        self._queues = {}
+        self._workers = {}
+
+    def started(self, message):
+        state = _MessageState()
+        self._states[message.id] = state
+        if self.busy_delay > 0:
+            state.timer = asyncio.get_running_loop().call_later(self.busy_delay, self._enqueue, message, state, None)
+        else:
+            self._enqueue(message, state, None)
+
+    def finished(self, message, emoji):
+        state = self._states.pop(message.id, None)
+        if state is None:
+            state = _MessageState()
+        state.finished = True
+        if state.timer is not None:
+            state.timer.cancel()
+        self._enqueue(message, state, emoji)
+
+    def _enqueue(self, message, state, emoji):
+        channel_id = message.channel.id
+        queue = self._queues.get(channel_id)
+        if queue is None:
+            queue = self._queues[channel_id] = asyncio.Queue()
+            # The event loop only keeps weak references to tasks
+            self._workers[channel_id] = asyncio.create_task(self._run(channel_id, queue))
+        queue.put_nowait((message, state, emoji))
+
+    async def _run(self, channel_id, queue):
+        try:
+            while not queue.empty():
+                message, state, emoji = queue.get_nowait()
+                try:
+                    if emoji is None:
+                        # A command that finished before its busy reaction was sent does not need it anymore
+                        if state.finished:
+                            continue
+                        await message.add_reaction(self.busy_emoji)
+                        state.busy_sent = True
+                    else:
+                        await message.add_reaction(emoji)
+                        if state.busy_sent:
+                            await asyncio.sleep(self.interval)
+                            await message.remove_reaction(self.busy_emoji, self.bot.user)
+                except discord.HTTPException as e:
+                    logger.warning("Could not update the reactions of message %d: %s", message.id, e)
+                except Exception:
+                    logger.exception("Unexpected error while updating the reactions of message %d.", message.id)
+                await asyncio.sleep(self.interval)
+        finally:
+            # Whatever stops the worker, the next reaction for the channel starts a new one
+            del self._queues[channel_id]
+            del self._workers[channel_id]
@@ -3,17 +3,22 @@ from discord.ext import commands
 import yaml
 
 from database import model
+from database.cache import Cache
 from datatypes import Games, EntryStatus, WeeklyStatus, PlayerStatus
 
-from util import get_discord_name, time_to_timedelta, timedelta_to_str
+from util import get_discord_name
 from util.ImageHashGenerator import ImageHashGenerator
 from bot.converters import GameConverter, TimeConverter, DatetimeConverter, DateConverter
 from bot.exceptions import FrompsBotException
 
-from . import embeds
-from .leaderboard import update_weekly, update_leaderboard
+from . import embeds, listing
+from .members import MemberNames, LazyMemberNames
+from .leaderboard import update_provisional, update_leaderboard, snapshot_weeks
+from .ranking import get_kernel
+from .rebuild import rebuild_leaderboards, STAGES
 
-from datetime import datetime, time
+from datetime import datetime
+import asyncio
 import io
 import functools
 
@@ -40,12 +45,23 @@ def log(f):
 
 
 class Weekly(commands.Cog, name="Semanais"):
-    def __init__(self, bot, database, *, admins, monitors, instructions_file):
+    def __init__(self, bot, database, *, admins, monitors, instructions_file, scoring_kernel="python",
+                 entries_max_messages=5, member_lookup_size=1024, member_lookup_ttl=600):
         self.bot = bot
         self.db = database
+        self.scoring_kernel_name = scoring_kernel
+        self.scoring_kernel = get_kernel(scoring_kernel)
+        self.entries_max_messages = entries_max_messages
         self.monitors = {Games[key]: monitor for (key, monitor) in monitors.items()}
         self.admins = admins
         self.img_hash_generator = ImageHashGenerator()
+        self.seed_embeds = Cache()
+        if bot.member_cache:
+            self.member_names = MemberNames(bot)
+        else:
+            self.member_names = LazyMemberNames(bot, capacity=member_lookup_size, ttl=member_lookup_ttl)
+        self.weekly_listing = None
+        self.weekly_listing_generation = 0
 
         # Load instructions file
         with open(instructions_file, 'r') as instructions_file:
@@ -78,10 +94,19 @@ class Weekly(commands.Cog, name="Semanais"):
         help="Listar as semanais abertas."
     )
     async def weeklies(self, ctx):
-        with self.db.Session() as session:
-            weeklies = sorted(self.db.list_open_weeklies(session), key=lambda w: w.submission_end)
-            embed = embeds.list_embed(weeklies)
-            await ctx.message.reply(embed=embed)
+        listing = self.weekly_listing
+        if listing is None or (listing[1] is not None and datetime.now() >= listing[1]):
+            generation = self.weekly_listing_generation
+            async with self.db.session() as session:
+                weeklies = await self.db.run(self.db.list_open_weeklies, session)
+
+            # The listing changes when the earliest open submission period ends
+            now = datetime.now()
+            expires_at = min((w.submission_end for w in weeklies if w.submission_end > now), default=None)
+            listing = (embeds.list_embed(weeklies, now), expires_at)
+            if generation == self.weekly_listing_generation:
+                self.weekly_listing = listing
+        await ctx.message.reply(embed=listing[0])
 
     @commands.command(
         name='setname',
@@ -97,13 +122,17 @@ class Weekly(commands.Cog, name="Semanais"):
         discord_id = id_do_jogador
         self._check_admin(ctx.author)
 
-        with self.db.Session() as session:
+        def rename(session):
             player = self.db.get_player(session, discord_id)
             if player is None:
                 raise FrompsBotException("Jogador não encontrado.")
-            player.name = new_name
+            for lb in self.db.set_player_name(session, player, new_name):
+                snapshot_weeks(self.db, session, lb)
             session.commit()
-            await ctx.message.reply("Nome do jogador '%d' alterado com sucesso." % discord_id)
+
+        async with self.db.session() as session:
+            await self.db.run(rename, session)
+        await ctx.message.reply("Nome do jogador '%d' alterado com sucesso." % discord_id)
 
     @commands.command(
         name='ban',
@@ -121,24 +150,29 @@ class Weekly(commands.Cog, name="Semanais"):
         unban = str.lower(remover_ban) == "remover"
         self._check_admin(ctx.author)
 
-        with self.db.Session() as session:
+        def set_ban(session):
             player = self.db.get_player(session, discord_id)
             if player is None:
                 raise FrompsBotException("Jogador não encontrado.")
+            name = player.name
             if unban:
                 if player.status == PlayerStatus.BANNED:
-                    player.status = PlayerStatus.ACTIVE
+                    self.db.set_player_status(session, player, PlayerStatus.ACTIVE)
                     session.commit()
-                    await ctx.message.reply("Banimento do(a) jogador(a) '%s' removido com sucesso!" % player.name)
+                    return "Banimento do(a) jogador(a) '%s' removido com sucesso!" % name
                 else:
-                    await ctx.message.reply("O(a) jogador(a) '%s' não está banido(a)." % player.name)
+                    return "O(a) jogador(a) '%s' não está banido(a)." % name
             else:
                 if player.status != PlayerStatus.BANNED:
-                    player.status = PlayerStatus.BANNED
+                    self.db.set_player_status(session, player, PlayerStatus.BANNED)
                     session.commit()
-                    await ctx.message.reply("O jogador(a) '%s' foi banido(a)!" % player.name)
+                    return "O jogador(a) '%s' foi banido(a)!" % name
                 else:
-                    await ctx.message.reply("O(a) jogador(a) '%s' já está banido(a)." % player.name)
+                    return "O(a) jogador(a) '%s' já está banido(a)." % name
+
+        async with self.db.session() as session:
+            message = await self.db.run(set_ban, session)
+        await ctx.message.reply(message)
 
     @commands.command(
         name='seed',
@@ -151,15 +185,15 @@ class Weekly(commands.Cog, name="Semanais"):
     async def seed(self, ctx, codigo_do_jogo: GameConverter()):
         game = codigo_do_jogo
 
-        with self.db.Session() as session:
-            weekly = self.db.get_open_weekly(session, game)
+        def register(session):
+            weekly = self.db.get_open_weekly_snapshot(session, game)
             if weekly is None:
                 raise FrompsBotException("A semanal de %s não está aberta." % game)
 
             if datetime.now() >= weekly.submission_end:
                 raise FrompsBotException("As inscrições para a semanal de %s foram encerradas." % game)
 
-            player = self.db.get_or_create_player(session, ctx.author)
+            player = self.db.get_or_create_player_snapshot(session, ctx.author)
             if player.status != PlayerStatus.ACTIVE:
                 raise FrompsBotException(
                     "Seu perfil contém restrições. Para saber mais, contate um moderador.", reply_on_private=True
@@ -170,10 +204,9 @@ class Weekly(commands.Cog, name="Semanais"):
             if entry is None:
                 registered = self.db.get_registered_entry(session, player)
                 if registered is not None:
-                    game = registered.weekly.game
                     raise FrompsBotException(
                         "Você deve registrar o seu tempo ou desistir da semanal de %s"
-                        " antes de participar de outra. " % game
+                        " antes de participar de outra. " % registered.weekly.game
                     )
                 self.db.register_player(session, weekly, player)
                 commit = True
@@ -184,11 +217,17 @@ class Weekly(commands.Cog, name="Semanais"):
                     " você pode fazê-lo utilizando o comando %svod" % (game, ctx.prefix)
                 )
 
-            gameData = self.db.get_game(session, game)
-            embed = embeds.seed_embed(ctx, weekly, gameData, self.instructions)
+            embed = self.seed_embeds.get_or_load(
+                (weekly.id, embeds.signup_channel_name(ctx)),
+                lambda: embeds.seed_embed(ctx, weekly, self.db.get_game(session, game), self.instructions)
+            )
+            return embed, commit
+
+        async with self.db.session() as session:
+            embed, commit = await self.db.run(register, session)
             await ctx.author.send(embed=embed)
             if commit:
-                session.commit()
+                await self.db.run(session.commit)
 
     @commands.command(
         name="time",
@@ -204,8 +243,8 @@ class Weekly(commands.Cog, name="Semanais"):
     async def time(self, ctx, tempo: TimeConverter()):
         finish_time = tempo
 
-        with self.db.Session() as session:
-            player = self.db.get_player(session, ctx.author.id)
+        def submit(session):
+            player = self.db.get_player_snapshot(session, ctx.author.id)
             if player is not None:
                 entry = self.db.get_registered_entry(session, player)
             if player is None or entry is None:
@@ -216,17 +255,23 @@ class Weekly(commands.Cog, name="Semanais"):
                     "Você deve enviar o print mostrando a tela final do jogo e o seu timer juntamente com este comando."
                 )
 
-            self.db.submit_time(session, entry, finish_time, ctx.message.attachments[0].url)
-            session.commit()
-
-            await ctx.message.reply(
-                "Seu tempo de %s na semanal de %s foi registrado! "
-                "Não esqueça de enviar o seu vídeo através do comando %svod." % (
-                    finish_time.strftime("%H:%M:%S"),
-                    entry.weekly.game,
-                    ctx.prefix,
-                )
+            with self.db.lock_weekly(session, entry.weekly_id):
+                self.db.submit_time(session, entry, finish_time, ctx.message.attachments[0].url)
+                update_provisional(self.db, session, entry.weekly, self.scoring_kernel)
+                game = entry.weekly.game
+                session.commit()
+            return game
+
+        async with self.db.session() as session:
+            game = await self.db.run(submit, session)
+        await ctx.message.reply(
+            "Seu tempo de %s na semanal de %s foi registrado! "
+            "Não esqueça de enviar o seu vídeo através do comando %svod." % (
+                finish_time.strftime("%H:%M:%S"),
+                game,
+                ctx.prefix,
             )
+        )
 
     @commands.command(
         name="forfeit",
@@ -237,8 +282,8 @@ class Weekly(commands.Cog, name="Semanais"):
     )
     @log
     async def forfeit(self, ctx, *, ok: str = None):
-        with self.db.Session() as session:
-            player = self.db.get_player(session, ctx.author.id)
+        def do_forfeit(session):
+            player = self.db.get_player_snapshot(session, ctx.author.id)
             if player is not None:
                 entry = self.db.get_registered_entry(session, player)
             if player is None or entry is None:
@@ -250,10 +295,16 @@ class Weekly(commands.Cog, name="Semanais"):
                     (entry.weekly.game, ctx.prefix, ctx.invoked_with)
                 )
 
-            self.db.forfeit(session, entry)
-            session.commit()
+            with self.db.lock_weekly(session, entry.weekly_id):
+                self.db.forfeit(session, entry)
+                update_provisional(self.db, session, entry.weekly, self.scoring_kernel)
+                game = entry.weekly.game
+                session.commit()
+            return game
 
-            await ctx.message.reply("Você não está mais participando da semanal de %s." % entry.weekly.game)
+        async with self.db.session() as session:
+            game = await self.db.run(do_forfeit, session)
+        await ctx.message.reply("Você não está mais participando da semanal de %s." % game)
 
     @commands.command(
         name="vod",
@@ -270,12 +321,12 @@ class Weekly(commands.Cog, name="Semanais"):
         game = codigo_do_jogo
         vod_url = url_do_vod
 
-        with self.db.Session() as session:
-            weekly = self.db.get_open_weekly(session, game)
+        def submit(session):
+            weekly = self.db.get_open_weekly_snapshot(session, game)
             if weekly is None:
                 raise FrompsBotException("Não há uma semanal de %s em andamento." % game)
 
-            player = self.db.get_player(session, ctx.author.id)
+            player = self.db.get_player_snapshot(session, ctx.author.id)
             if player is not None:
                 entry = self.db.get_player_entry(session, weekly.id, player.discord_id)
             if player is None or entry is None:
@@ -293,7 +344,9 @@ class Weekly(commands.Cog, name="Semanais"):
             self.db.submit_vod(session, entry, vod_url)
             session.commit()
 
-            await ctx.message.reply("VOD recebido com sucesso! Agradecemos a sua participação!")
+        async with self.db.session() as session:
+            await self.db.run(submit, session)
+        await ctx.message.reply("VOD recebido com sucesso! Agradecemos a sua participação!")
 
     @commands.command(
         name="comment",
@@ -307,12 +360,12 @@ class Weekly(commands.Cog, name="Semanais"):
         game = codigo_do_jogo
         comment = comentario
 
-        with self.db.Session() as session:
-            weekly = self.db.get_open_weekly(session, game)
+        def submit(session):
+            weekly = self.db.get_open_weekly_snapshot(session, game)
             if weekly is None:
                 raise FrompsBotException("Não há uma semanal de %s em andamento." % game)
 
-            player = self.db.get_player(session, ctx.author.id)
+            player = self.db.get_player_snapshot(session, ctx.author.id)
             if player is not None:
                 entry = self.db.get_player_entry(session, weekly.id, player.discord_id)
             if player is None or entry is None:
@@ -324,10 +377,12 @@ class Weekly(commands.Cog, name="Semanais"):
             self.db.submit_comment(session, entry, comment)
             session.commit()
 
-            if comment is None:
-                await ctx.message.reply("Comentário removido com sucesso!")
-            else:
-                await ctx.message.reply("Comentário recebido com sucesso!")
+        async with self.db.session() as session:
+            await self.db.run(submit, session)
+        if comment is None:
+            await ctx.message.reply("Comentário removido com sucesso!")
+        else:
+            await ctx.message.reply("Comentário recebido com sucesso!")
 
     @commands.command(
         name="entries",
@@ -344,73 +399,91 @@ class Weekly(commands.Cog, name="Semanais"):
         ]
         self._check_monitor(ctx.author, game)
 
-        with self.db.Session() as session:
+        def open_weekly_id(session):
             weekly = self.db.get_open_weekly(session, game)
             if weekly is None:
                 raise FrompsBotException("Não há uma semanal de %s em andamento." % game)
+            return weekly.id
+
+        async with self.db.session() as session:
+            weekly_id = await self.db.run(open_weekly_id, session)
+
+        max_messages = self.entries_max_messages
+        rows = []
+        count = 0
+
+        async def texts():
+            nonlocal count
+            async for e, player, nicknames in self._stream_entries(weekly_id):
+                count += 1
+                if max_messages > 0:
+                    rows.append(listing.csv_row(e, player, nicknames))
+                yield listing.format_entry(e, player, nicknames, verbose)
+
+        async with listing.PageSender(ctx.message) as sender:
+            # Pages go out as they are produced, the listing continues as a file once there are too many of them
+            sent = 0
+            too_long = False
+            async for page in listing.paginate(texts()):
+                if max_messages == 0 or sent < max_messages:
+                    await sender.send(page)
+                    sent += 1
+                else:
+                    too_long = True
 
-            entries = sorted(weekly.entries, key=lambda e: e.finish_time if e.finish_time is not None else time(23, 59))
-
-            if len(entries) > 0:
-                reply = ""
-                for e in entries:
-                    player = e.player
-                    user = self.bot.get_user(player.discord_id)
-                    if user is None:
-                        try:
-                            user = await self.bot.fetch_user(player.discord_id)
-                        except Exception:
-                            pass
-                    nicknames = []
-                    for guild in self.bot.guilds:
-                        member = guild.get_member(player.discord_id)
-                        if member is not None:
-                            name = member.display_name
-                            if player.name != name and name not in nicknames:
-                                nicknames.append(name)
-
-                    name = player.name
-                    if len(nicknames) > 0:
-                        name += " (Aka: {})".format(", ".join(nicknames))
-
-                    reply_entry = "Player: %s\nStatus: %s\n" % (name, e.status.name)
-                    if e.status in [EntryStatus.TIME_SUBMITTED, EntryStatus.DONE]:
-                        finish_time = str(e.finish_time)
-                        if not verbose:
-                            finish_time = "||" + finish_time + "||"
-                        reply_entry += "Tempo: %s\nPrint: <%s>\n" % (finish_time, e.print_url)
-                    if e.status == EntryStatus.DONE:
-                        reply_entry += "VOD: <%s>\n" % e.vod_url
-                    if e.comment is not None:
-                        comment = e.comment if verbose else "||" + e.comment + "||"
-                        reply_entry += "Comentário: %s\n" % comment
-
-                    if verbose:
-                        formatstr = "%d/%m/%Y %H:%M"
-                        reply_entry += "Registro: %s\n" % e.registered_at.strftime(formatstr)
-                        if e.status in [EntryStatus.TIME_SUBMITTED, EntryStatus.DONE]:
-                            reply_entry += "Envio do tempo: %s (%s)\n" % (
-                                e.time_submitted_at.strftime(formatstr),
-                                timedelta_to_str(
-                                    e.time_submitted_at - e.registered_at - time_to_timedelta(e.finish_time)
-                                )
-                            )
-                            if e.status is EntryStatus.DONE:
-                                reply_entry += "Envio do VOD: %s\n" % e.vod_submitted_at.strftime(formatstr)
-
-                    reply_entry += "\n"
-
-                    if len(reply) + len(reply_entry) <= 1800:
-                        reply += reply_entry
-                    else:
-                        await ctx.message.reply(reply)
-                        reply = reply_entry
+            if too_long:
+                filename = "entries.csv" if verbose else "SPOILER_entries.csv"
+                await sender.send(
+                    "Lista completa de entradas em anexo.", file=File(listing.csv_file(rows), filename)
+                )
 
-                if len(reply) > 0:
-                    await ctx.message.reply(reply)
+        if count == 0:
+            await ctx.message.reply("Nenhuma entrada resgistrada.")
 
-            else:
-                await ctx.message.reply("Nenhuma entrada resgistrada.")
+    async def _stream_entries(self, weekly_id):
+        after = None
+        while True:
+            # Each page is read in a session of its own, closed before waiting on Discord for the names
+            async with self.db.session() as session:
+                batch = await self.db.run(self.db.get_weekly_entries_page, session, weekly_id, after)
+            if len(batch) == 0:
+                return
+            after = batch[-1][0]
+
+            names = await self.member_names.resolve([player.discord_id for _, player in batch])
+            for e, player in batch:
+                nicknames = names.get(player.discord_id, set())
+                yield e, player, sorted(name for name in nicknames if name != player.name)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.member_names.rebuild()
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        self.member_names.refresh_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.member_names.remove_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self.member_names.refresh(member.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.member_names.refresh(member.id)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if before.display_name != after.display_name:
+            self.member_names.refresh(after.id)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before, after):
+        if before.name != after.name:
+            self.member_names.refresh(after.id)
 
     @commands.command(
         name="weeklycreate",
@@ -439,8 +512,19 @@ class Weekly(commands.Cog, name="Semanais"):
         submission_end = limite_para_envios
         self._check_monitor(ctx.author, game)
 
-        with self.db.Session() as session:
-            weekly = self.db.get_open_weekly(session, game)
+        def create(session, hash_str):
+            lb = self.db.get_open_leaderboard(session, game)
+            self.db.create_weekly(session, game, seed_url, hash_str, submission_end, lb)
+            session.commit()
+
+            if lb is None:
+                return "Semanal de %s criada com sucesso!" % game
+            else:
+                count = len(lb.weeklies)
+                return "Semanal #%d da leaderboard de %s criada com sucesso!" % (count, game)
+
+        async with self.db.session() as session:
+            weekly = await self.db.run(self.db.get_open_weekly_snapshot, session, game)
             if weekly is not None:
                 raise FrompsBotException(
                     "Há uma semanal aberta para %s. Feche-a primeiro antes de criar uma nova." % game
@@ -449,16 +533,9 @@ class Weekly(commands.Cog, name="Semanais"):
             if game in [Games.ALTTPR, Games.OOTR]:
                 hash_str = await self.genhash(ctx, game, hash_str)
 
-            lb = self.db.get_open_leaderboard(session, game)
-            self.db.create_weekly(session, game, seed_url, hash_str, submission_end, lb)
-            session.commit()
-
-            if lb is None:
-                msg = "Semanal de %s criada com sucesso!" % game
-            else:
-                count = len(lb.weeklies)
-                msg = "Semanal #%d da leaderboard de %s criada com sucesso!" % (count, game)
-            await ctx.message.reply(msg)
+            msg = await self.db.run(create, session, hash_str)
+        self._invalidate_weekly_listing()
+        await ctx.message.reply(msg)
 
     @commands.command(
         name="weeklytest",
@@ -495,8 +572,8 @@ class Weekly(commands.Cog, name="Semanais"):
             submission_end=submission_end
         )
 
-        with self.db.Session() as session:
-            gameData = self.db.get_game(session, game)
+        async with self.db.session() as session:
+            gameData = await self.db.run(self.db.get_game, session, game)
         embed = embeds.seed_embed(ctx, weekly, gameData, self.instructions)
         await ctx.author.send(embed=embed)
 
@@ -517,17 +594,24 @@ class Weekly(commands.Cog, name="Semanais"):
         game = codigo_do_jogo
         self._check_monitor(ctx.author, game)
 
-        with self.db.Session() as session:
-            weekly = self.db.get_open_weekly(session, game)
+        def close(session):
+            weekly = self.db.get_open_weekly_snapshot(session, game)
             if weekly is None:
                 raise FrompsBotException("A semanal de %s não está aberta." % game)
 
-            self.db.close_weekly(session, weekly)
-            if weekly.leaderboard is not None:
-                update_weekly(self.db, session, weekly)
+            with self.db.lock_weekly(session, weekly.id):
+                weekly = self.db.get_open_weekly_with_entries(session, game)
+                if weekly is None:
+                    raise FrompsBotException("A semanal de %s não está aberta." % game)
 
-            session.commit()
-            await ctx.message.reply("Semanal de %s fechada com sucesso!" % game)
+                self.db.close_weekly(session, weekly)
+                update_provisional(self.db, session, weekly, self.scoring_kernel)
+                session.commit()
+
+        async with self.db.session() as session:
+            await self.db.run(close, session)
+        self._invalidate_weekly_listing()
+        await ctx.message.reply("Semanal de %s fechada com sucesso!" % game)
 
     @commands.command(
         name="weeklyreopen",
@@ -543,8 +627,8 @@ class Weekly(commands.Cog, name="Semanais"):
         game = codigo_do_jogo
         self._check_monitor(ctx.author, game)
 
-        with self.db.Session() as session:
-            weekly = self.db.get_open_weekly(session, game)
+        def reopen(session):
+            weekly = self.db.get_open_weekly_snapshot(session, game)
             if weekly is not None:
                 raise FrompsBotException("A semanal de %s não está fechada." % game)
             weekly = self.db.get_last_closed_weekly(session, game)
@@ -553,7 +637,10 @@ class Weekly(commands.Cog, name="Semanais"):
             self.db.reopen_weekly(session, weekly)
             session.commit()
 
-            await ctx.message.reply("Semanal de %s reaberta com sucesso!" % game)
+        async with self.db.session() as session:
+            await self.db.run(reopen, session)
+        self._invalidate_weekly_listing()
+        await ctx.message.reply("Semanal de %s reaberta com sucesso!" % game)
 
     @commands.command(
         name="weeklyupdate",
@@ -579,7 +666,7 @@ class Weekly(commands.Cog, name="Semanais"):
         submission_end = limite_para_envios
         self._check_monitor(ctx.author, game)
 
-        with self.db.Session() as session:
+        def check(session):
             weekly = self.db.get_open_weekly(session, game)
             if weekly is None:
                 raise FrompsBotException("Não há uma semanal aberta para %s." % game)
@@ -588,14 +675,22 @@ class Weekly(commands.Cog, name="Semanais"):
                 raise FrompsBotException(
                     "Existem entradas registradas para esta semanal, portanto não é possível alterar a URL da seed."
                 )
+            return weekly
 
-            if game in [Games.ALTTPR, Games.OOTR]:
-                hash_str = await self.genhash(ctx, game, hash_str)
-
+        def update(session, weekly, hash_str):
             self.db.update_weekly(session, weekly, seed_url, hash_str, submission_end)
             session.commit()
+            self.seed_embeds.clear()
+
+        async with self.db.session() as session:
+            weekly = await self.db.run(check, session)
 
-            await ctx.message.reply("Semanal de %s atualizada com sucesso!" % game)
+            if game in [Games.ALTTPR, Games.OOTR]:
+                hash_str = await self.genhash(ctx, game, hash_str)
+
+            await self.db.run(update, session, weekly, hash_str)
+        self._invalidate_weekly_listing()
+        await ctx.message.reply("Semanal de %s atualizada com sucesso!" % game)
 
     @commands.command(
         name="entryupdate",
@@ -621,51 +716,62 @@ class Weekly(commands.Cog, name="Semanais"):
         value = valor
         self._check_monitor(ctx.author, game)
 
-        with self.db.Session() as session:
-            weekly = self.db.get_open_weekly(session, game)
+        def find_entry(session):
+            weekly = self.db.get_open_weekly_snapshot(session, game)
             if weekly is None:
                 raise FrompsBotException("Não há uma semanal de %s em andamento." % game)
 
-            player = self.db.get_player(session, player_id)
+            player = self.db.get_player_snapshot(session, player_id)
             if player is not None:
                 entry = self.db.get_player_entry(session, weekly.id, player.discord_id)
             if player is None or entry is None:
                 raise FrompsBotException("O usuário informado não está participando da semanal de %s." % game)
 
             if entry.status == EntryStatus.DNF:
-                raise FrompsBotException("%s não está mais participando da semanal de %s." % (entry.player.name, game))
+                raise FrompsBotException("%s não está mais participando da semanal de %s." % (player.name, game))
+            return entry, player.name
 
+        def update(session, entry, player_name, finish_time):
             if parameter == 'time':
-                converter = TimeConverter()
-                try:
-                    finish_time = await converter.convert(ctx, value)
-                except Exception:
-                    raise FrompsBotException(
-                        "O tempo fornecido deve estar no formato '%s'." % converter.description_format
-                    )
-
-                if entry.status not in [EntryStatus.TIME_SUBMITTED, EntryStatus.DONE]:
-                    raise FrompsBotException(
-                        "%s ainda não enviou seu tempo para a semanal de %s." % (entry.player.name, game)
-                    )
-
-                self.db.update_time(session, entry, finish_time)
+                with self.db.lock_weekly(session, entry.weekly_id):
+                    if entry.status not in [EntryStatus.TIME_SUBMITTED, EntryStatus.DONE]:
+                        raise FrompsBotException(
+                            "%s ainda não enviou seu tempo para a semanal de %s." % (player_name, game)
+                        )
+
+                    self.db.update_time(session, entry, finish_time)
+                    update_provisional(self.db, session, entry.weekly, self.scoring_kernel)
+                    session.commit()
 
             elif parameter == 'vod':
                 if entry.status is not EntryStatus.DONE:
                     raise FrompsBotException(
-                        "%s ainda não enviou seu VOD para a semanal de %s." % (entry.player.name, game)
+                        "%s ainda não enviou seu VOD para a semanal de %s." % (player_name, game)
                     )
 
                 self.db.update_vod(session, entry, value)
+                session.commit()
 
             else:
                 raise FrompsBotException("Parâmetro desconhecido: %s." % parametro)
 
-            session.commit()
-            await ctx.message.reply(
-                "Entrada de %s para a semanal de %s alterada com sucesso!" % (entry.player.name, game)
-            )
+        async with self.db.session() as session:
+            entry, player_name = await self.db.run(find_entry, session)
+
+            finish_time = None
+            if parameter == 'time':
+                converter = TimeConverter()
+                try:
+                    finish_time = await converter.convert(ctx, value)
+                except Exception:
+                    raise FrompsBotException(
+                        "O tempo fornecido deve estar no formato '%s'." % converter.description_format
+                    )
+
+            await self.db.run(update, session, entry, player_name, finish_time)
+        await ctx.message.reply(
+            "Entrada de %s para a semanal de %s alterada com sucesso!" % (player_name, game)
+        )
 
     @commands.group(
         name="game",
@@ -690,14 +796,19 @@ class Weekly(commands.Cog, name="Semanais"):
         message = mensagem
         self._check_admin(ctx.author)
 
-        with self.db.Session() as session:
+        def settings(session):
             gameEntity = self.db.get_game(session, game)
             if message is None:
-                await ctx.reply("Settings atuais: %s" % gameEntity.settings_text)
+                return "Settings atuais: %s" % gameEntity.settings_text
             else:
                 gameEntity.settings_text = mensagem
                 session.commit()
-                await ctx.reply("Settings atualizadas com sucesso!")
+                self.seed_embeds.clear()
+                return "Settings atualizadas com sucesso!"
+
+        async with self.db.session() as session:
+            reply = await self.db.run(settings, session)
+        await ctx.reply(reply)
 
     @game.command(
         name="verification_text",
@@ -711,14 +822,19 @@ class Weekly(commands.Cog, name="Semanais"):
         message = mensagem
         self._check_admin(ctx.author)
 
-        with self.db.Session() as session:
+        def verification_text(session):
             gameEntity = self.db.get_game(session, game)
             if message is None:
-                await ctx.reply("Texto atual: %s" % gameEntity.verification_text)
+                return "Texto atual: %s" % gameEntity.verification_text
             else:
                 gameEntity.verification_text = mensagem
                 session.commit()
-                await ctx.reply("Texto de verificação atualizado!")
+                self.seed_embeds.clear()
+                return "Texto de verificação atualizado!"
+
+        async with self.db.session() as session:
+            reply = await self.db.run(verification_text, session)
+        await ctx.reply(reply)
 
     @commands.group(
         name="leaderboard",
@@ -732,15 +848,15 @@ class Weekly(commands.Cog, name="Semanais"):
     async def leaderboard(self, ctx, codigo_do_jogo: GameConverter()):
         game = codigo_do_jogo
 
-        with self.db.Session() as session:
-            lb = self.db.get_open_leaderboard(session, game)
-            if lb is None:
-                await ctx.reply("Não há uma leaderboard aberta para %s." % game)
+        async with self.db.session() as session:
+            lb = await self.db.run(self.db.get_open_leaderboard, session, game)
+        if lb is None:
+            await ctx.reply("Não há uma leaderboard aberta para %s." % game)
+        else:
+            if lb.results_url is None:
+                await ctx.reply("Os resultados da leaderboard de %s ainda não foram publicados." % game)
             else:
-                if lb.results_url is None:
-                    await ctx.reply("Os resultados da leaderboard de %s ainda não foram publicados." % game)
-                else:
-                    await ctx.reply("Leaderboard de %s: <%s>" % (game, lb.results_url))
+                await ctx.reply("Leaderboard de %s: <%s>" % (game, lb.results_url))
 
     @leaderboard.command(
         name="entrar",
@@ -755,13 +871,50 @@ class Weekly(commands.Cog, name="Semanais"):
     async def leaderboard_enter(self, ctx, codigo_do_jogo: GameConverter()):
         game = codigo_do_jogo
 
-        with self.db.Session() as session:
+        def enter(session):
             player = self.db.get_or_create_player(session, ctx.author)
             if not self.db.excluded_from_leaderboard(session, player, game):
                 raise FrompsBotException("Você já está participando da leaderboard de '%s'." % game)
             self.db.include_on_leaderboard(session, player, game)
             session.commit()
-            await ctx.reply("Você entrou para a leaderboard de '%s'." % game)
+
+        async with self.db.session() as session:
+            await self.db.run(enter, session)
+        await ctx.reply("Você entrou para a leaderboard de '%s'." % game)
+
+    @leaderboard.command(
+        name="posicao",
+        aliases=['rank', 'p'],
+        help="Mostra a sua posição na leaderboard e a diferença de pontos para os jogadores logo acima e abaixo.",
+        brief="Mostra a sua posição na leaderboard.",
+        hidden=True,
+        ignore_extra=False,
+        signup_only=True
+    )
+    async def leaderboard_rank(self, ctx, codigo_do_jogo: GameConverter()):
+        game = codigo_do_jogo
+
+        def rank(session):
+            lb = self.db.get_open_leaderboard(session, game)
+            if lb is None:
+                raise FrompsBotException("Não há uma leaderboard aberta para %s." % game)
+
+            entry, above, below = self.db.get_leaderboard_rank(session, lb.id, ctx.author.id)
+            if entry is None:
+                raise FrompsBotException("Você ainda não está classificado na leaderboard de %s." % game)
+
+            neighbours = [(n.position, n.name, n.final_points) for n in (above, below) if n is not None]
+            return entry.position, entry.final_points, neighbours
+
+        async with self.db.session() as session:
+            position, points, neighbours = await self.db.run(rank, session)
+
+        msg = "Você está em **%dº** na leaderboard de %s, com **%s** pontos." % (position, game, "%g" % points)
+        for n_position, n_name, n_points in neighbours:
+            msg += "\n%dº: %s (%s pontos, diferença de **%s**)" % (
+                n_position, n_name, "%g" % n_points, "%+g" % (n_points - points)
+            )
+        await ctx.reply(msg)
 
     @leaderboard.command(
         name="sair",
@@ -777,13 +930,16 @@ class Weekly(commands.Cog, name="Semanais"):
     async def leaderboard_quit(self, ctx, codigo_do_jogo: GameConverter()):
         game = codigo_do_jogo
 
-        with self.db.Session() as session:
+        def leave(session):
             player = self.db.get_or_create_player(session, ctx.author)
             if self.db.excluded_from_leaderboard(session, player, game):
                 raise FrompsBotException("Você já saiu da leaderboard de '%s'." % game)
             self.db.exclude_from_leaderboard(session, player, game)
             session.commit()
-            await ctx.reply("Você não está mais participando da leaderboard de '%s'." % game)
+
+        async with self.db.session() as session:
+            await self.db.run(leave, session)
+        await ctx.reply("Você não está mais participando da leaderboard de '%s'." % game)
 
     @leaderboard.command(
         name="open",
@@ -799,14 +955,14 @@ class Weekly(commands.Cog, name="Semanais"):
         results_url = url_dos_resultados
         self._check_monitor(ctx.author, game)
 
-        with self.db.Session() as session:
+        def open_leaderboard(session):
             lb = self.db.get_open_leaderboard(session, game)
             if lb is not None:
                 raise FrompsBotException(
                     "Há uma leaderboard aberta para %s. Feche-a primeiro antes de criar uma nova." % game
                 )
 
-            open_weekly = self.db.get_open_weekly(session, game)
+            open_weekly = self.db.get_open_weekly_snapshot(session, game)
             if open_weekly is not None:
                 raise FrompsBotException(
                     "Não foi possível abrir a leaderboard de '%s' pois há uma semanal aberta para este jogo." % game
@@ -815,7 +971,9 @@ class Weekly(commands.Cog, name="Semanais"):
             self.db.create_leaderboard(session, game, results_url)
             session.commit()
 
-            await ctx.message.reply("Leaderboard de %s aberta com sucesso!" % game)
+        async with self.db.session() as session:
+            await self.db.run(open_leaderboard, session)
+        await ctx.message.reply("Leaderboard de %s aberta com sucesso!" % game)
 
     @leaderboard.command(
         name="close",
@@ -830,19 +988,21 @@ class Weekly(commands.Cog, name="Semanais"):
         game = codigo_do_jogo
         self._check_monitor(ctx.author, game)
 
-        with self.db.Session() as session:
+        def close_leaderboard(session):
             lb = self.db.get_open_leaderboard(session, game)
             if lb is None:
                 raise FrompsBotException("A leaderboard de %s não está aberta." % game)
 
-            weekly = self.db.get_open_weekly(session, game)
+            weekly = self.db.get_open_weekly_snapshot(session, game)
             if weekly is not None:
                 raise FrompsBotException("Não foi possível fechar a leaderboard pois há uma semanal de %s aberta." % game)
 
             self.db.close_leaderboard(session, lb)
             session.commit()
 
-            await ctx.message.reply("Leaderboard de %s fechada com sucesso!" % game)
+        async with self.db.session() as session:
+            await self.db.run(close_leaderboard, session)
+        await ctx.message.reply("Leaderboard de %s fechada com sucesso!" % game)
 
     @leaderboard.command(
         name="update",
@@ -857,16 +1017,45 @@ class Weekly(commands.Cog, name="Semanais"):
         game = codigo_do_jogo
         self._check_monitor(ctx.author, game)
 
-        with self.db.Session() as session:
-            lb = self.db.get_open_leaderboard(session, game)
+        def update(session):
+            lb = self.db.get_open_leaderboard_with_entries(session, game)
             if lb is None:
                 raise FrompsBotException("A leaderboard de %s não está aberta." % game)
 
-            update_leaderboard(self.db, session, lb)
+            update_leaderboard(self.db, session, lb, self.scoring_kernel)
             session.commit()
-            await ctx.reply("A leaderboard de %s foi atualizada!" % game)
+
+        async with self.db.session() as session:
+            await self.db.run(update, session)
+        await ctx.reply("A leaderboard de %s foi atualizada!" % game)
 
 
+    @leaderboard.command(
+        name="rebuild",
+        help="Recalcula todas as leaderboards a partir dos resultados das semanais.\nEste comando deve ser utilizado APENAS NO PRIVADO.",
+        brief="*NO PRIVADO* Recalcula todas as leaderboards.",
+        hidden=True,
+        ignore_extra=False,
+        dm_only=True
+    )
+    @log
+    async def leaderboard_rebuild(self, ctx):
+        self._check_admin(ctx.author)
+
+        loop = asyncio.get_running_loop()
+        results, elapsed = await loop.run_in_executor(
+            None, rebuild_leaderboards, self.db, None, self.scoring_kernel_name
+        )
+
+        msg = ""
+        for game, leaderboards in results.items():
+            for leaderboard_id, weeklies, timings in leaderboards:
+                msg += "Leaderboard #%d (%s, %d semanais): %s\n" % (
+                    leaderboard_id, game, weeklies, ", ".join("%s **%.3fs**" % (s, timings[s]) for s in STAGES)
+                )
+        msg += "Leaderboards recalculadas em **%.3fs**." % elapsed
+        await ctx.reply(msg)
+
     @leaderboard.command(
         name="add",
         aliases=['a'],
@@ -904,14 +1093,17 @@ class Weekly(commands.Cog, name="Semanais"):
         results_url = url_dos_resultados
         self._check_monitor(ctx.author, game)
 
-        with self.db.Session() as session:
+        def set_url(session):
             lb = self.db.get_open_leaderboard(session, game)
             if lb is None:
                 raise FrompsBotException("A leaderboard de %s não está aberta." % game)
 
             lb.results_url = results_url
             session.commit()
-            ctx.reply("URL para os resultados da leaderboard de %s alterada com sucesso." % game)
+
+        async with self.db.session() as session:
+            await self.db.run(set_url, session)
+        await ctx.reply("URL para os resultados da leaderboard de %s alterada com sucesso." % game)
 
     @leaderboard.command(
         name="set",
@@ -928,7 +1120,7 @@ class Weekly(commands.Cog, name="Semanais"):
         value = valor
         self._check_monitor(ctx.author, game)
 
-        with self.db.Session() as session:
+        def set_parameter(session):
             lb = self.db.get_open_leaderboard(session, game)
             if lb is None:
                 raise FrompsBotException("A leaderboard de %s não está aberta." % game)
@@ -936,14 +1128,20 @@ class Weekly(commands.Cog, name="Semanais"):
             if value is None:
                 if parameter in lb.leaderboard_data.keys():
                     del lb.leaderboard_data[parameter]
+                    self.db.touch_leaderboard(session, lb)
                     session.commit()
-                    await ctx.reply("Parâmetro '%s' removido com sucesso!" % parameter)
+                    return "Parâmetro '%s' removido com sucesso!" % parameter
                 else:
                     raise FrompsBotException("Parâmetro '%s' não foi setado ainda." % parameter)
             else:
                 lb.leaderboard_data[parameter] = value
+                self.db.touch_leaderboard(session, lb)
                 session.commit()
-                await ctx.reply("Parâmetro '%s' atualizado com sucesso!" % parameter)
+                return "Parâmetro '%s' atualizado com sucesso!" % parameter
+
+        async with self.db.session() as session:
+            reply = await self.db.run(set_parameter, session)
+        await ctx.reply(reply)
 
     @commands.group(
         name="stat",
@@ -987,17 +1185,57 @@ class Weekly(commands.Cog, name="Semanais"):
     async def stat_headtohead(self, ctx, codigo_do_jogo: GameConverter(), id_do_jogador1: int, id_do_jogador2: int):
         await self.do_head_to_head(ctx, codigo_do_jogo, id_do_jogador1, id_do_jogador2)
 
+    @stat.command(
+        name="db",
+        help="Mostra contadores de uso do banco de dados.\nEste comando deve ser utilizado APENAS NO PRIVADO.",
+        brief="*NO PRIVADO* Mostra contadores de uso do banco de dados.",
+        hidden=True,
+        ignore_extra=False,
+        dm_only=True
+    )
+    async def stat_db(self, ctx):
+        self._check_admin(ctx.author)
+
+        stats = self.db.stats()
+        msg = ""
+        executor = stats["executor"]
+        if executor is None:
+            msg += "Executor: desativado\n"
+        else:
+            msg += "Executor: **%d** threads, **%d** na fila, **%d** em execução, **%d** concluídas\n" % (
+                executor["workers"], executor["queued"], executor["running"], executor["completed"]
+            )
+            msg += "Espera na fila: média **%.3fs**, máxima **%.3fs**\n" % (
+                executor["average_wait"], executor["max_wait"]
+            )
+        stats["seed_embeds"] = self.seed_embeds.stats()
+        for name, label in [
+            ("open_weeklies", "Cache de semanais abertas"),
+            ("players", "Cache de jogadores"),
+            ("seed_embeds", "Cache de seeds"),
+        ]:
+            cache = stats[name]
+            msg += "%s: **%d** itens, **%d** acertos, **%d** falhas" % (
+                label, cache["size"], cache["hits"], cache["misses"]
+            )
+            if "evictions" in cache:
+                msg += ", **%d** descartes, **%d** expirados (capacidade: **%d**)" % (
+                    cache["evictions"], cache["expirations"], cache["capacity"]
+                )
+            msg += "\n"
+        await ctx.reply(msg)
+
     async def do_head_to_head(self, ctx, game, discord_id_1, discord_id_2, initial_date=None, final_date=None):
         self._check_admin(ctx.author)
 
         if discord_id_1 == discord_id_2:
             raise FrompsBotException("Os jogadores devem ser diferentes!")
 
-        with self.db.Session() as session:
-            player1 = self.db.get_player(session, discord_id_1)
+        def load(session):
+            player1 = self.db.get_player_snapshot(session, discord_id_1)
             if player1 is None:
                 raise FrompsBotException("Não foi encontrado um jogador com id: %d" % discord_id_1)
-            player2 = self.db.get_player(session, discord_id_2)
+            player2 = self.db.get_player_snapshot(session, discord_id_2)
             if player2 is None:
                 raise FrompsBotException("Não foi encontrado um jogador com id: %d" % discord_id_2)
 
@@ -1009,50 +1247,55 @@ class Weekly(commands.Cog, name="Semanais"):
                 initial_date,
                 final_date
             )
-            results = {
-                "matches": len(values),
-                "players": [player1, player2],
-                "dnfs": [0, 0],
-                "victories": [0, 0],
-                "ties": 0,
-                "victories_with_dnfs": [0, 0],
-                "ties_with_dnfs": 0
-            }
-
-            for value in values.values():
-                entry1 = value["entries"][0]
-                entry2 = value["entries"][1]
-                if entry1.finish_time is None or entry2.finish_time is None:
-                    if entry1.finish_time is None:
-                        results["dnfs"][0] += 1
-                        if entry2.finish_time is None:
-                            results["dnfs"][1] += 1
-                            results["ties_with_dnfs"] += 1
-                        else:
-                            results["victories_with_dnfs"][1] += 1
-                    else:
+            return player1, player2, values
+
+        async with self.db.session() as session:
+            player1, player2, values = await self.db.run(load, session)
+
+        results = {
+            "matches": len(values),
+            "players": [player1, player2],
+            "dnfs": [0, 0],
+            "victories": [0, 0],
+            "ties": 0,
+            "victories_with_dnfs": [0, 0],
+            "ties_with_dnfs": 0
+        }
+
+        for value in values.values():
+            entry1 = value["entries"][0]
+            entry2 = value["entries"][1]
+            if entry1.finish_time is None or entry2.finish_time is None:
+                if entry1.finish_time is None:
+                    results["dnfs"][0] += 1
+                    if entry2.finish_time is None:
                         results["dnfs"][1] += 1
-                        results["victories_with_dnfs"][0] += 1
-                else:
-                    if entry1.finish_time < entry2.finish_time:
-                        results["victories"][0] += 1
-                        results["victories_with_dnfs"][0] += 1
-                    elif entry2.finish_time < entry1.finish_time:
-                        results["victories"][1] += 1
-                        results["victories_with_dnfs"][1] += 1
-                    else:
-                        results["ties"] += 1
                         results["ties_with_dnfs"] += 1
+                    else:
+                        results["victories_with_dnfs"][1] += 1
+                else:
+                    results["dnfs"][1] += 1
+                    results["victories_with_dnfs"][0] += 1
+            else:
+                if entry1.finish_time < entry2.finish_time:
+                    results["victories"][0] += 1
+                    results["victories_with_dnfs"][0] += 1
+                elif entry2.finish_time < entry1.finish_time:
+                    results["victories"][1] += 1
+                    results["victories_with_dnfs"][1] += 1
+                else:
+                    results["ties"] += 1
+                    results["ties_with_dnfs"] += 1
 
-            msg = "Confrontos diretos entre **%s** e **%s** em **%s**\n\n" % (player1.name, player2.name, game)
-            msg += "Número de partidas: **%d**\n" % results["matches"]
-            msg += "DNFs: **%d x %d**\n" % (results["dnfs"][0], results["dnfs"][1])
-            msg += "Resultado (excluindo DNFs): **%d x %d** (**%d** empates)\n" % \
-                   (results["victories"][0], results["victories"][1], results["ties"])
-            msg += "Resultado (incluindo DNFs): **%d x %d** (**%d** empates)\n" % \
-                   (results["victories_with_dnfs"][0], results["victories_with_dnfs"][1], results["ties_with_dnfs"])
+        msg = "Confrontos diretos entre **%s** e **%s** em **%s**\n\n" % (player1.name, player2.name, game)
+        msg += "Número de partidas: **%d**\n" % results["matches"]
+        msg += "DNFs: **%d x %d**\n" % (results["dnfs"][0], results["dnfs"][1])
+        msg += "Resultado (excluindo DNFs): **%d x %d** (**%d** empates)\n" % \
+               (results["victories"][0], results["victories"][1], results["ties"])
+        msg += "Resultado (incluindo DNFs): **%d x %d** (**%d** empates)\n" % \
+               (results["victories_with_dnfs"][0], results["victories_with_dnfs"][1], results["ties_with_dnfs"])
 
-            await ctx.reply(msg)
+        await ctx.reply(msg)
 
     async def genhash(self, ctx, game, hash_str):
         try:
@@ -1066,6 +1309,10 @@ class Weekly(commands.Cog, name="Semanais"):
                 raise FrompsBotException("Erro ao enviar a imagem pelo Discord.")
             return message.attachments[0].url
 
+    def _invalidate_weekly_listing(self):
+        self.weekly_listing_generation += 1
+        self.weekly_listing = None
+
     def _check_admin(self, user):
         if user.id not in self.admins:
             raise FrompsBotException("Este comando deve ser executado apenas por administradores.")
@@ -4,8 +4,12 @@ from datetime import datetime
 from datatypes import Games
 
 
+def signup_channel_name(ctx):
+    return "semanais-seed" if isinstance(ctx.message.channel, discord.DMChannel) else ctx.message.channel.name
+
+
 def seed_embed(ctx, weekly, gameData, instructions):
-    signup_channel = "semanais-seed" if isinstance(ctx.message.channel, discord.DMChannel) else ctx.message.channel.name
+    signup_channel = signup_channel_name(ctx)
     game = weekly.game
     description = instructions['ALL'] + "\n" + instructions[game]
 
@@ -27,8 +31,9 @@ def seed_embed(ctx, weekly, gameData, instructions):
     return embed
 
 
-def list_embed(weeklies):
-    weeklies = sorted(weeklies, key=lambda v: 2 if v.submission_end <= datetime.now() else 1)
+def list_embed(weeklies, now=None):
+    now = now or datetime.now()
+    weeklies = sorted(weeklies, key=lambda v: (v.submission_end <= now, v.submission_end))
     embed = discord.Embed(title="Semanais da Randomizer Brasil")
     if len(weeklies) > 0:
         codes = []
@@ -38,7 +43,7 @@ def list_embed(weeklies):
             codes.append(w.game.keys[0])
             games.append(str(w.game))
 
-            if w.submission_end > datetime.now():
+            if w.submission_end > now:
                 time = int(w.submission_end.timestamp())
                 times.append(f"<t:{time}>")
             else:
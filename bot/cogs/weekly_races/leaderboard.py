@@ -1,172 +1,238 @@
-from functools import reduce
 from datetime import time
 
-from datatypes.enums import PlayerStatus
+from database import snapshot
+from database.model import LeaderboardWeeklyResult
+from datatypes.enums import PlayerStatus, EntryStatus, WeeklyStatus
 from util import time_to_timedelta
 from bot.exceptions import FrompsBotException
 
+from . import ranking
+from .ranking import competition_rank
 
-def update_leaderboard(db, session, leaderboard):
-    sorted_entries = sorted(
-        filter(lambda e: e.player.status is PlayerStatus.ACTIVE, leaderboard.entries),
-        key=lambda e: e.leaderboard_data["final_points"],
-        reverse=True
-    )
-
-    def finished_weeklies(entry):
-        return set(filter(
-            lambda k: not entry.leaderboard_data["weeklies"][k]["discarded"]
-                and entry.leaderboard_data["weeklies"][k]["points"] > 0,
-            entry.leaderboard_data["weeklies"].keys()
-        ))
 
-    tied_entries = []
-    tiebreak_data = {}
-    pos = 1
-    while len(sorted_entries) > 0:
-        tied_entries.append(sorted_entries.pop(0))
-        if len(sorted_entries) > 0 and (
-                sorted_entries[0].leaderboard_data["final_points"] == tied_entries[0].leaderboard_data["final_points"]
-        ):
-            continue
+def update_leaderboard(db, session, leaderboard, kernel=ranking):
+    active_entries = []
+    for e in leaderboard.entries:
+        if e.player.status is PlayerStatus.ACTIVE:
+            active_entries.append(e)
+        elif e.position is not None:
+            # Players banned since the last update leave the standings
+            e.position = None
+            e.tiebreak_common_points = None
+            e.tiebreak_minimum_time = None
+    weekly_ids = leaderboard.leaderboard_data["weeklies"]
 
+    def finished_weeklies(entry):
+        # Provisional results of the open weekly do not break ties until it closes and gets its week
+        return {
+            r.week_number for r in entry.results
+            if not r.discarded and r.points > 0 and r.week_number < len(weekly_ids)
+        }
+
+    groups = {}
+    for entry, pos in zip(active_entries, kernel.positions([e.final_points for e in active_entries], True)):
+        groups.setdefault(pos, []).append(entry)
+
+    tie_groups = []
+    for pos, tied_entries in sorted(groups.items()):
         if len(tied_entries) == 1:
-            tied_entries[0].leaderboard_data["position"] = pos
-            tied_entries[0].leaderboard_data["tiebreak"] = None
-            pos += 1
-            tied_entries = []
+            tied_entries[0].position = pos
+            tied_entries[0].tiebreak_common_points = None
+            tied_entries[0].tiebreak_minimum_time = None
         else:
             common_weeklies = finished_weeklies(tied_entries[0])
             for i in range(1, len(tied_entries)):
                 common_weeklies &= finished_weeklies(tied_entries[i])
-            tiebreak_data[pos] = {
-                "common_weeklies": sorted(list(common_weeklies))
-            }
-
-            max_time = time(23, 59, 59)
-            for e in tied_entries:
-                common_points = reduce(lambda a, w: a + e.leaderboard_data["weeklies"][w]["points"], common_weeklies, 0)
-                minimum_time = max_time
-                for w in common_weeklies:
-                    player_entry = db.get_player_entry(
-                        session,
-                        leaderboard.leaderboard_data["weeklies"][int(w)],
-                        e.player_discord_id
-                    )
-                    if minimum_time > player_entry.finish_time:
-                        minimum_time = player_entry.finish_time
-                e.leaderboard_data["tiebreak"] = {
-                    "common_points": common_points,
-                    "minimum_time": int(time_to_timedelta(minimum_time).total_seconds())
-                }
-
-            max_time = int(time_to_timedelta(max_time).total_seconds())
-            tied_entries = sorted(
-                tied_entries,
-                key=lambda e: (
-                    e.leaderboard_data["tiebreak"]["common_points"],
-                    max_time - e.leaderboard_data["tiebreak"]["minimum_time"]
-                ),
-                reverse=True
-            )
-
-            still_tied = []
-            while len(tied_entries) > 0:
-                still_tied.append(tied_entries.pop(0))
-                if len(tied_entries) > 0:
-                    common_points = still_tied[0].leaderboard_data["tiebreak"]["common_points"]
-                    minimum_time = still_tied[0].leaderboard_data["tiebreak"]["minimum_time"]
-                    if tied_entries[0].leaderboard_data["tiebreak"]["common_points"] == common_points\
-                            and tied_entries[0].leaderboard_data["tiebreak"]["minimum_time"] == minimum_time:
-                        continue
-
-                for e in still_tied:
-                    e.leaderboard_data["position"] = pos
-                pos += len(still_tied)
-                still_tied = []
+            tie_groups.append((pos, tied_entries, common_weeklies))
+
+    # Every finish time needed to break the ties is fetched at once
+    finish_times = {}
+    if len(tie_groups) > 0:
+        finish_times = db.get_finish_times(
+            session,
+            list({weekly_ids[w] for _, _, common_weeklies in tie_groups for w in common_weeklies}),
+            [e.player_discord_id for _, tied_entries, _ in tie_groups for e in tied_entries]
+        )
+
+    tiebreak_data = {}
+    for pos, tied_entries, common_weeklies in tie_groups:
+        # Week numbers are kept as strings, as they were when the results lived in the JSON data
+        tiebreak_data[pos] = {
+            "common_weeklies": sorted(str(w) for w in common_weeklies)
+        }
+
+        max_time = time(23, 59, 59)
+        for e in tied_entries:
+            common_points = 0
+            for r in e.results:
+                if r.week_number in common_weeklies:
+                    common_points += r.points
+            minimum_time = max_time
+            for w in common_weeklies:
+                finish_time = finish_times[(weekly_ids[w], e.player_discord_id)]
+                if minimum_time > finish_time:
+                    minimum_time = finish_time
+            e.tiebreak_common_points = common_points
+            e.tiebreak_minimum_time = int(time_to_timedelta(minimum_time).total_seconds())
+
+        max_time = int(time_to_timedelta(max_time).total_seconds())
+        tiebreak = competition_rank(
+            tied_entries,
+            key=lambda e: (e.tiebreak_common_points, max_time - e.tiebreak_minimum_time),
+            reverse=True,
+            start=pos
+        )
+        for tiebreak_pos, still_tied in tiebreak:
+            for e in still_tied:
+                e.position = tiebreak_pos
 
     leaderboard.leaderboard_data["tiebreak_data"] = tiebreak_data
+    db.touch_leaderboard(session, leaderboard)
 
 
-def update_leaderboard_entry(db, session, player_entry, week_number, included_weeklies):
-    data = player_entry.leaderboard_data
-    lb_entry = db.get_or_create_leaderboard_entry(session, player_entry.weekly.leaderboard, player_entry.player)
-    lb_entry.leaderboard_data["weeklies"][str(week_number)] = {
-        "points": data["points"]
-    }
+# Only the weeks are stored as they change, the whole leaderboard is stored by the API once read at a new version
 
-    sorted_weeklies = sorted(
-        sorted(lb_entry.leaderboard_data["weeklies"].keys(), key=int),
-        key=lambda w: lb_entry.leaderboard_data["weeklies"][w]["points"],
-        reverse=True
+def snapshot_weekly(db, session, lb, weekly):
+    if weekly.id not in lb.leaderboard_data["weeklies"]:
+        return
+    week_id = _week_number(lb, weekly) + 1
+    entries = db.get_weekly_standings(session, weekly.id)
+    db.save_leaderboard_snapshot(
+        session, lb, week_id, snapshot.weekly_document(lb, week_id, weekly, entries), weekly.version
     )
 
-    total_points = 0
-    final_points = 0
-    for i in range(len(sorted_weeklies)):
-        result = lb_entry.leaderboard_data["weeklies"][sorted_weeklies[i]]
-        total_points += result["points"]
 
-        if i < included_weeklies:
-            result["discarded"] = False
-            final_points += result["points"]
-        else:
-            result["discarded"] = True
+def snapshot_weeks(db, session, lb):
+    for weekly_id in lb.leaderboard_data["weeklies"]:
+        snapshot_weekly(db, session, lb, db.get_weekly(session, weekly_id))
+
+
+def set_weekly_result(lb_entry, week_number, points):
+    for result in lb_entry.results:
+        if result.week_number == week_number:
+            result.points = points
+            return
+    lb_entry.results.append(LeaderboardWeeklyResult(week_number=week_number, points=points))
+
+
+def update_totals(lb_entries, included_weeklies, weeks, kernel=ranking):
+    # Only the weeks of the leaderboard count, provisional results of the open weekly wait until it closes
+    week_results = [[r for r in lb_entry.results if r.week_number < weeks] for lb_entry in lb_entries]
+    totals = kernel.best_of(
+        [[(r.week_number, r.points) for r in results] for results in week_results],
+        included_weeklies
+    )
+    for lb_entry, results, (total_points, final_points, discarded) in zip(lb_entries, week_results, totals):
+        # Only assign on changes, so a single week update does not rewrite every row
+        for result, result_discarded in zip(results, discarded):
+            if result.discarded is not result_discarded:
+                result.discarded = result_discarded
+
+        lb_entry.total_points = total_points
+        lb_entry.final_points = final_points
+
 
-    lb_entry.leaderboard_data["total_points"] = total_points
-    lb_entry.leaderboard_data["final_points"] = final_points
+def _week_number(lb, weekly):
+    weeklies = lb.leaderboard_data["weeklies"]
+    if weekly.id in weeklies:
+        return weeklies.index(weekly.id)
 
+    # Weeklies only join the leaderboard once closed, the week published by the API would give the results away
+    if weekly.status is WeeklyStatus.CLOSED:
+        lb.leaderboard_data["weeklies"] = weeklies + [weekly.id]
+    return len(weeklies)
 
-def update_weekly(db, session, weekly):
+
+def _score_weekly(weekly, kernel):
+    included_entries = list(filter(lambda e: not e.excluded, weekly.entries))
+    scores = {}
+
+    finished = [e for e in included_entries if e.finish_time is not None]
+    weekly_positions, weekly_points = kernel.weekly_points(
+        [time_to_timedelta(e.finish_time).total_seconds() for e in finished]
+    )
+    for entry, pos, points in zip(finished, weekly_positions, weekly_points):
+        scores[entry] = (pos, points)
+
+    # While the weekly is open, players that are still playing have no result yet
+    for entry in included_entries:
+        if entry.finish_time is None and (weekly.status is WeeklyStatus.CLOSED or entry.status is EntryStatus.DNF):
+            scores[entry] = (None, 0)
+
+    return included_entries, scores
+
+
+def _update_leaderboard_entries(db, session, lb, week_number, entries, kernel):
+    included_weeklies = int(lb.leaderboard_data["included_weeklies"])
+    player_discord_ids = [e.player_discord_id for e in entries]
+
+    lb_entries = db.get_leaderboard_entries(session, lb, player_discord_ids)
+    lb_entries.update(db.create_leaderboard_entries(
+        session,
+        lb,
+        [discord_id for discord_id in player_discord_ids if discord_id not in lb_entries]
+    ))
+    for entry in entries:
+        set_weekly_result(lb_entries[entry.player_discord_id], week_number, entry.points)
+    update_totals(
+        [lb_entries[discord_id] for discord_id in player_discord_ids],
+        included_weeklies,
+        len(lb.leaderboard_data["weeklies"]),
+        kernel
+    )
+
+
+def update_weekly(db, session, weekly, kernel=ranking):
     lb = weekly.leaderboard
     if lb is None:
         raise FrompsBotException("A semanal escolhida não faz parte de uma leaderboard.")
 
-    try:
-        week_number = lb.leaderboard_data["weeklies"].index(weekly.id)
-    except ValueError:
-        week_number = len(lb.leaderboard_data["weeklies"])
-        lb.leaderboard_data["weeklies"] += [weekly.id]
-    included_weeklies = int(lb.leaderboard_data["included_weeklies"])
+    week_number = _week_number(lb, weekly)
+    included_entries, scores = _score_weekly(weekly, kernel)
+    for entry, (position, points) in scores.items():
+        entry.position = position
+        entry.points = points
 
-    def points_generator():
-        for i in 15, 13, 12, 10, 9, 8, 7, 6, 5, 4, 3, 2:
-            yield i
-        while True:
-            yield 1
+    _update_leaderboard_entries(db, session, lb, week_number, [e for e in included_entries if e in scores], kernel)
+    db.touch_weekly(session, weekly)
+    db.touch_leaderboard(session, lb)
+    snapshot_weekly(db, session, lb, weekly)
 
-    included_entries = list(filter(lambda e: not e.leaderboard_data["excluded"], weekly.entries))
-    finished = sorted(
-        list(filter(lambda e: e.finish_time is not None, included_entries)),
-        key=lambda e: e.finish_time
-    )
-    points = points_generator()
-    tied_entries = []
-    pos = 1
-    while len(finished) > 0:
-        tied_entries.append(finished.pop(0))
-        if len(finished) > 0 and finished[0].finish_time == tied_entries[0].finish_time:
-            continue
-
-        acc_points = 0
-        for i in range(len(tied_entries)):
-            acc_points += next(points)
-        acc_points /= len(tied_entries)
-
-        for entry in tied_entries:
-            entry.leaderboard_data.update({
-                "position": str(pos),
-                "points": acc_points
-            })
-            update_leaderboard_entry(db, session, entry, week_number, included_weeklies)
-
-        pos += len(tied_entries)
-        tied_entries = []
-
-    not_finished = list(filter(lambda e: e.finish_time is None, included_entries))
-    for entry in not_finished:
-        entry.leaderboard_data.update({
-            "position": "DNF",
-            "points": 0
-        })
-        update_leaderboard_entry(db, session, entry, week_number, included_weeklies)
+
+def update_provisional(db, session, weekly, kernel=ranking):
+    if weekly.leaderboard_id is None:
+        return
+    lb = weekly.leaderboard
+    published = weekly.id in lb.leaderboard_data["weeklies"]
+    week_number = _week_number(lb, weekly)
+    joined = not published and weekly.id in lb.leaderboard_data["weeklies"]
+
+    # Only the entries whose result changed are written, along with the leaderboard entries of their players
+    _, scores = _score_weekly(weekly, kernel)
+    changed = []
+    moved = False
+    for entry, (position, points) in scores.items():
+        if entry.position != position:
+            entry.position = position
+            moved = True
+        if entry.points != points:
+            entry.points = points
+            changed.append(entry)
+
+    if joined:
+        # The week is published as the weekly closes, and every result in it joins the totals
+        changed = list(scores)
+    if len(changed) > 0:
+        _update_leaderboard_entries(db, session, lb, week_number, changed, kernel)
+    if moved or len(changed) > 0:
+        db.touch_weekly(session, weekly)
+
+    # Results of an open weekly stay provisional: they are kept out of the totals and of the published standings
+    if not published and not joined:
+        return
+    if len(changed) > 0:
+        # Positions follow the points they were given, so the standings never list them out of order
+        session.expire(lb, ["entries"])
+        update_leaderboard(db, session, db.get_leaderboard_with_entries(session, lb.id), kernel)
+    if moved or len(changed) > 0 or weekly.status is WeeklyStatus.CLOSED:
+        snapshot_weekly(db, session, lb, weekly)
@@ -0,0 +1,130 @@
+from datatypes import EntryStatus
+
+from util import time_to_timedelta, timedelta_to_str
+
+import asyncio
+import csv
+import io
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+PAGE_SIZE = 1800
+DATETIME_FORMAT = "%d/%m/%Y %H:%M"
+CSV_HEADER = [
+    "player", "aka", "status", "tempo", "print", "vod", "comentario", "registro", "envio_do_tempo", "envio_do_vod"
+]
+
+
+def format_entry(entry, player, nicknames, verbose):
+    name = player.name
+    if len(nicknames) > 0:
+        name += " (Aka: {})".format(", ".join(nicknames))
+
+    text = "Player: %s\nStatus: %s\n" % (name, entry.status.name)
+    if entry.status in [EntryStatus.TIME_SUBMITTED, EntryStatus.DONE]:
+        finish_time = str(entry.finish_time)
+        if not verbose:
+            finish_time = "||" + finish_time + "||"
+        text += "Tempo: %s\nPrint: <%s>\n" % (finish_time, entry.print_url)
+    if entry.status == EntryStatus.DONE:
+        text += "VOD: <%s>\n" % entry.vod_url
+    if entry.comment is not None:
+        comment = entry.comment if verbose else "||" + entry.comment + "||"
+        text += "Comentário: %s\n" % comment
+
+    if verbose:
+        text += "Registro: %s\n" % entry.registered_at.strftime(DATETIME_FORMAT)
+        if entry.status in [EntryStatus.TIME_SUBMITTED, EntryStatus.DONE]:
+            text += "Envio do tempo: %s (%s)\n" % (
+                entry.time_submitted_at.strftime(DATETIME_FORMAT),
+                timedelta_to_str(
+                    entry.time_submitted_at - entry.registered_at - time_to_timedelta(entry.finish_time)
+                )
+            )
+            if entry.status is EntryStatus.DONE:
+                text += "Envio do VOD: %s\n" % entry.vod_submitted_at.strftime(DATETIME_FORMAT)
+
+    return text + "\n"
+
+
+def csv_row(entry, player, nicknames):
+    def fmt(value):
+        return "" if value is None else value.strftime(DATETIME_FORMAT)
+
+    return [
+        player.name,
+        ", ".join(nicknames),
+        entry.status.name,
+        "" if entry.finish_time is None else str(entry.finish_time),
+        entry.print_url or "",
+        entry.vod_url or "",
+        entry.comment or "",
+        fmt(entry.registered_at),
+        fmt(entry.time_submitted_at),
+        fmt(entry.vod_submitted_at),
+    ]
+
+
+async def paginate(texts, page_size=PAGE_SIZE):
+    page = ""
+    async for text in texts:
+        if len(page) > 0 and len(page) + len(text) > page_size:
+            yield page
+            page = ""
+        page += text
+    if len(page) > 0:
+        yield page
+
+
+def csv_file(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    writer.writerows(rows)
+    return io.BytesIO(buffer.getvalue().encode("utf-8"))
+
+
+class PageSender:
+    """Sends pages as replies to a message while the next ones are still being produced."""
+
+    def __init__(self, message, depth=2):
+        self.message = message
+        self.queue = asyncio.Queue(maxsize=depth)
+        self.error = None
+        self.task = None
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.task.cancel()
+            return False
+        await self.queue.put(None)
+        await self.task
+        if self.error is not None:
+            raise self.error
+        return False
+
+    async def send(self, page=None, **kwargs):
+        if self.error is not None:
+            raise self.error
+        await self.queue.put((page, kwargs))
+
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                # Keep draining so the producer never blocks on a full queue
+                continue
+            page, kwargs = item
+            try:
+                await self.message.reply(page, **kwargs)
+            except Exception as e:
+                logger.warning("Could not send page: %s", e)
+                self.error = e
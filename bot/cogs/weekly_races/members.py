@@ -0,0 +1,140 @@
+import discord
+
+from database.cache import LRUCache
+
+import asyncio
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class MemberNames:
+    def __init__(self, bot, concurrency=5):
+        self.bot = bot
+        # Display names by member and guild, and the members indexed from each guild, so a guild can be redone alone
+        self.names = {}
+        self.guild_members = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def rebuild(self):
+        self.names = {}
+        self.guild_members = {}
+        for guild in self.bot.guilds:
+            self.refresh_guild(guild)
+
+    def refresh_guild(self, guild):
+        self.remove_guild(guild)
+        for member in guild.members:
+            self.names.setdefault(member.id, {})[guild.id] = member.display_name
+        self.guild_members[guild.id] = {member.id for member in guild.members}
+
+    def remove_guild(self, guild):
+        for discord_id in self.guild_members.pop(guild.id, ()):
+            names = self.names.get(discord_id)
+            if names is not None:
+                names.pop(guild.id, None)
+                if len(names) == 0:
+                    del self.names[discord_id]
+
+    def refresh(self, discord_id):
+        names = {}
+        for guild in self.bot.guilds:
+            member = guild.get_member(discord_id)
+            if member is not None:
+                names[guild.id] = member.display_name
+                self.guild_members.setdefault(guild.id, set()).add(discord_id)
+            else:
+                self.guild_members.get(guild.id, set()).discard(discord_id)
+        if len(names) > 0:
+            self.names[discord_id] = names
+        else:
+            self.names.pop(discord_id, None)
+
+    def display_names(self, discord_id):
+        return set(self.names.get(discord_id, {}).values())
+
+    async def resolve(self, discord_ids):
+        names = {discord_id: self.display_names(discord_id) for discord_id in discord_ids}
+        missing = [discord_id for discord_id, member_names in names.items() if len(member_names) == 0]
+        if len(missing) > 0:
+            # Players that left every server are shown with their current Discord name
+            users = await self.fetch_users(missing)
+            names.update({discord_id: {user.name} for discord_id, user in users.items() if user is not None})
+        return names
+
+    async def fetch_users(self, discord_ids):
+        async def fetch(discord_id):
+            async with self._semaphore:
+                try:
+                    return await self.bot.fetch_user(discord_id)
+                except Exception as e:
+                    logger.warning("Could not fetch user %d: %s", discord_id, e)
+                    return None
+
+        users = {discord_id: self.bot.get_user(discord_id) for discord_id in discord_ids}
+        missing = [discord_id for discord_id, user in users.items() if user is None]
+        if len(missing) > 0:
+            users.update(zip(missing, await asyncio.gather(*(fetch(discord_id) for discord_id in missing))))
+        return users
+
+
+class LazyMemberNames(MemberNames):
+    """Member names looked up on demand, for bots that do not keep the guild members in memory."""
+
+    def __init__(self, bot, concurrency=5, capacity=1024, ttl=600):
+        super().__init__(bot, concurrency)
+        self.cache = LRUCache(capacity, ttl)
+
+    def rebuild(self):
+        self.cache.clear()
+
+    def refresh_guild(self, guild):
+        # Nothing is indexed by guild, the names looked up expire on their own
+        pass
+
+    def remove_guild(self, guild):
+        pass
+
+    def refresh(self, discord_id):
+        self.cache.invalidate(discord_id)
+
+    def display_names(self, discord_id):
+        return self.cache.get(discord_id, set())
+
+    async def resolve(self, discord_ids):
+        names = {}
+        missing = []
+        for discord_id in discord_ids:
+            member_names = self.cache.get(discord_id)
+            if member_names is None:
+                missing.append(discord_id)
+            else:
+                names[discord_id] = member_names
+
+        if len(missing) > 0:
+            fetched = await asyncio.gather(*(self._fetch_names(discord_id) for discord_id in missing))
+            for discord_id, member_names in zip(missing, fetched):
+                if member_names is not None:
+                    self.cache.put(discord_id, member_names)
+                    names[discord_id] = member_names
+
+        missing = [discord_id for discord_id in discord_ids if len(names.get(discord_id, ())) == 0]
+        if len(missing) > 0:
+            users = await self.fetch_users(missing)
+            names.update({discord_id: {user.name} for discord_id, user in users.items() if user is not None})
+        return names
+
+    async def _fetch_names(self, discord_id):
+        names = set()
+        async with self._semaphore:
+            for guild in self.bot.guilds:
+                try:
+                    member = await guild.fetch_member(discord_id)
+                except discord.NotFound:
+                    continue
+                except discord.HTTPException as e:
+                    # Not cached, so the lookup is retried on the next listing
+                    logger.warning("Could not fetch member %d of guild %d: %s", discord_id, guild.id, e)
+                    return None
+                names.add(member.display_name)
+        return names
@@ -0,0 +1,98 @@
+from collections import Counter
+from itertools import groupby
+import sys
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+POINTS_TABLE = (15, 13, 12, 10, 9, 8, 7, 6, 5, 4, 3, 2)
+MINIMUM_POINTS = 1
+
+
+def _groups(items, key, reverse):
+    # sorted() is stable, so tied items keep their relative order
+    for _, group in groupby(sorted(items, key=key, reverse=reverse), key=key):
+        yield list(group)
+
+
+def competition_rank(items, key, reverse=False, start=1):
+    position = start
+    for group in _groups(items, key, reverse):
+        yield position, group
+        position += len(group)
+
+
+def dense_rank(items, key, reverse=False, start=1):
+    for rank, group in enumerate(_groups(items, key, reverse), start):
+        yield rank, group
+
+
+def points_for(position):
+    if position <= len(POINTS_TABLE):
+        return POINTS_TABLE[position - 1]
+    return MINIMUM_POINTS
+
+
+def tie_averaged_points(position, count):
+    total = 0
+    for p in range(position, position + count):
+        total += points_for(p)
+    return total / count
+
+
+# Scoring kernel: the operations below are also implemented by ranking_numpy, with identical results
+
+def positions(keys, descending=False):
+    result = [None] * len(keys)
+    for position, group in competition_rank(range(len(keys)), key=lambda i: keys[i], reverse=descending):
+        for i in group:
+            result[i] = position
+    return result
+
+
+def dense_positions(keys, descending=False):
+    result = [None] * len(keys)
+    for rank, group in dense_rank(range(len(keys)), key=lambda i: keys[i], reverse=descending):
+        for i in group:
+            result[i] = rank
+    return result
+
+
+def weekly_points(keys):
+    weekly_positions = positions(keys)
+    group_points = {p: tie_averaged_points(p, count) for p, count in Counter(weekly_positions).items()}
+    return weekly_positions, [group_points[p] for p in weekly_positions]
+
+
+def best_of(results, included):
+    totals = []
+    for player_results in results:
+        order = sorted(
+            sorted(range(len(player_results)), key=lambda i: player_results[i][0]),
+            key=lambda i: player_results[i][1],
+            reverse=True
+        )
+
+        total_points = 0
+        final_points = 0
+        discarded = [True] * len(player_results)
+        for rank, i in enumerate(order):
+            total_points += player_results[i][1]
+            if rank < included:
+                discarded[i] = False
+                final_points += player_results[i][1]
+        totals.append((total_points, final_points, discarded))
+    return totals
+
+
+def get_kernel(name="python"):
+    if name == "numpy":
+        try:
+            from . import ranking_numpy
+            return ranking_numpy
+        except ImportError:
+            logger.warning("NumPy is not available, falling back to the Python scoring kernel.")
+    elif name != "python":
+        raise ValueError("Unknown scoring kernel: %s" % name)
+    return sys.modules[__name__]
@@ -0,0 +1,85 @@
+import numpy as np
+
+from .ranking import POINTS_TABLE, MINIMUM_POINTS
+
+
+# The results must match the Python kernel bit for bit: integer point sums are divided only once, and floating
+# point sums are accumulated in the same order the Python kernel adds them.
+
+def _sorted_groups(keys, descending):
+    keys = np.asarray(keys, dtype=np.float64)
+    order = np.argsort(-keys if descending else keys, kind="stable")
+    sorted_keys = keys[order]
+
+    group_starts = np.ones(len(keys), dtype=bool)
+    group_starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    return order, group_starts
+
+
+def positions(keys, descending=False):
+    if len(keys) == 0:
+        return []
+    order, group_starts = _sorted_groups(keys, descending)
+    first_index = np.maximum.accumulate(np.where(group_starts, np.arange(len(keys)), 0))
+
+    result = np.empty(len(keys), dtype=np.int64)
+    result[order] = first_index + 1
+    return result.tolist()
+
+
+def dense_positions(keys, descending=False):
+    if len(keys) == 0:
+        return []
+    order, group_starts = _sorted_groups(keys, descending)
+
+    result = np.empty(len(keys), dtype=np.int64)
+    result[order] = np.cumsum(group_starts)
+    return result.tolist()
+
+
+def weekly_points(keys):
+    if len(keys) == 0:
+        return [], []
+    weekly_positions = np.asarray(positions(keys))
+
+    table = np.full(len(keys), MINIMUM_POINTS, dtype=np.int64)
+    size = min(len(keys), len(POINTS_TABLE))
+    table[:size] = POINTS_TABLE[:size]
+    cumulative = np.concatenate(([0], np.cumsum(table)))
+
+    counts = np.bincount(weekly_positions)[weekly_positions]
+    sums = cumulative[weekly_positions - 1 + counts] - cumulative[weekly_positions - 1]
+    return weekly_positions.tolist(), (sums / counts).tolist()
+
+
+def best_of(results, included):
+    width = max((len(r) for r in results), default=0)
+    if width == 0:
+        return [(0, 0, []) for _ in results]
+
+    # Players have different numbers of results, the missing ones are padded and sorted last
+    points = np.zeros((len(results), width), dtype=np.float64)
+    weeks = np.zeros((len(results), width), dtype=np.int64)
+    padding = np.ones((len(results), width), dtype=bool)
+    for row, player_results in enumerate(results):
+        for column, (week_number, week_points) in enumerate(player_results):
+            weeks[row, column] = week_number
+            points[row, column] = week_points
+            padding[row, column] = False
+
+    order = np.lexsort((weeks, -points, padding), axis=-1)
+    sorted_points = np.take_along_axis(points, order, axis=-1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(width), order.shape), axis=-1)
+
+    total_points = np.cumsum(sorted_points, axis=-1)[:, -1]
+    if included > 0:
+        final_points = np.cumsum(sorted_points[:, :min(included, width)], axis=-1)[:, -1]
+    else:
+        final_points = np.zeros(len(results))
+    discarded = ranks >= included
+
+    return [
+        (total_points[row].item(), final_points[row].item(), discarded[row, :len(player_results)].tolist())
+        for row, player_results in enumerate(results)
+    ]
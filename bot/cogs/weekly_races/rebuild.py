@@ -0,0 +1,81 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import time
+
+from sqlalchemy import create_engine
+
+from database import Database, ConsistencyError
+from datatypes import WeeklyStatus
+from bot.exceptions import FrompsBotException
+
+from .leaderboard import update_weekly, update_leaderboard
+from .ranking import get_kernel
+
+
+STAGES = ["load", "weeklies", "leaderboard", "commit"]
+
+
+def rebuild_leaderboard(db, leaderboard_id, kernel):
+    timings = {}
+    with db.Session() as session:
+        start = time.perf_counter()
+        lb = db.get_leaderboard(session, leaderboard_id)
+        # Locked so the bot can not score any of them until the rebuild is committed
+        weeklies = db.get_leaderboard_weeklies(session, lb, for_update=True)
+        if any(weekly.status is WeeklyStatus.OPEN for weekly in weeklies):
+            raise ConsistencyError("Attempt to rebuild a leaderboard that has an open weekly.")
+        db.reset_leaderboard_results(session, lb, weeklies)
+        timings["load"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for weekly in weeklies:
+            update_weekly(db, session, weekly, kernel)
+        timings["weeklies"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        lb = db.get_leaderboard_with_entries(session, leaderboard_id)
+        update_leaderboard(db, session, lb, kernel)
+        timings["leaderboard"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        session.commit()
+        timings["commit"] = time.perf_counter() - start
+    return leaderboard_id, len(weeklies), timings
+
+
+def _rebuild_game(url, engine_options, leaderboard_ids, kernel_name):
+    db = Database.from_engine(create_engine(url, **engine_options, future=True), engine_options=engine_options)
+    kernel = get_kernel(kernel_name)
+    try:
+        return [rebuild_leaderboard(db, leaderboard_id, kernel) for leaderboard_id in leaderboard_ids]
+    finally:
+        db.engine.dispose()
+
+
+def rebuild_leaderboards(db, workers=None, kernel_name="python"):
+    start = time.perf_counter()
+    with db.Session() as session:
+        leaderboards = db.list_leaderboards_by_game(session)
+        open_weeklies = [weekly for weekly in db.list_open_weeklies(session) if weekly.leaderboard_id is not None]
+    if len(open_weeklies) > 0:
+        # Their provisional results are being written as players submit, the rebuild would overwrite them
+        raise FrompsBotException(
+            "Não é possível recalcular as leaderboards com a semanal de %s aberta." % open_weeklies[0].game
+        )
+    if len(leaderboards) == 0:
+        return {}, time.perf_counter() - start
+
+    if workers is None:
+        # SQLite serializes writers, so concurrent transactions would only wait on each other's locks
+        workers = 1 if db.engine.dialect.name == "sqlite" else len(leaderboards)
+
+    # Each game is rebuilt in its own process, one transaction per leaderboard
+    url = db.engine.url.render_as_string(hide_password=False)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {
+            game: pool.submit(_rebuild_game, url, db.engine_options, ids, kernel_name)
+            for game, ids in leaderboards.items()
+        }
+        results = {game: future.result() for game, future in futures.items()}
+    return results, time.perf_counter() - start
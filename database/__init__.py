@@ -1,10 +1,19 @@
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import sessionmaker, aliased
+from sqlalchemy import create_engine, select, update, delete, and_, or_, event
+from sqlalchemy.orm import Session, sessionmaker, aliased, selectinload, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 
 from datetime import datetime, timedelta
+import contextlib
+import functools
+import threading
+import weakref
 
 from datatypes import PlayerStatus, EntryStatus, WeeklyStatus, LeaderboardStatus
-from database.model import Player, PlayerEntry, Game, Weekly, Leaderboard, LeaderboardEntry, Base
+from database.model import Player, PlayerEntry, Game, Weekly, Leaderboard, LeaderboardEntry, LeaderboardWeeklyResult, LeaderboardSnapshot, Base
+from database.executor import DatabaseExecutor
+from database.cache import Cache, LRUCache, WeeklySnapshot, PlayerSnapshot
+from database import snapshot
 
 import logging
 logger = logging.getLogger(__name__)
@@ -14,6 +23,29 @@ class ConsistencyError(Exception):
     pass
 
 
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    session.info.pop("touched", None)
+    for callback in session.info.pop("invalidations", []) + session.info.pop("on_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("touched", None)
+    session.info.pop("on_commit", None)
+    for invalidate in session.info.pop("invalidations", []):
+        invalidate()
+
+
+def _weekly_entries_query(weekly_id, batch_size):
+    return select(PlayerEntry, Player).join(Player, PlayerEntry.player_discord_id == Player.discord_id).where(
+        PlayerEntry.weekly_id == weekly_id
+    ).order_by(
+        PlayerEntry.finish_time.is_(None), PlayerEntry.finish_time, PlayerEntry.registered_at
+    ).execution_options(yield_per=batch_size)
+
+
 class Database:
     def __init__(
             self,
@@ -25,7 +57,10 @@ class Database:
             host="",
             port="",
             dbpath,
-            engine_options=None
+            engine_options=None,
+            executor_workers=0,
+            player_cache_size=1024,
+            player_cache_ttl=600
     ):
         url = Database.build_database_url(
             dialect=dialect,
@@ -36,9 +71,79 @@ class Database:
             port=port,
             dbpath=dbpath
         )
-        options = engine_options or {}
-        self.engine = create_engine(url, **options, future=True)
+        options = dict(engine_options or {})
+        if executor_workers > 0 and dialect == "sqlite":
+            # Sessions are handed between the event loop and the executor threads, but never used concurrently.
+            options["connect_args"] = {"check_same_thread": False, **options.get("connect_args", {})}
+        self._bind(
+            create_engine(url, **options, future=True), executor_workers, player_cache_size, player_cache_ttl, options
+        )
+
+    @classmethod
+    def from_engine(cls, engine, executor_workers=0, player_cache_size=1024, player_cache_ttl=600, engine_options=None):
+        db = cls.__new__(cls)
+        db._bind(engine, executor_workers, player_cache_size, player_cache_ttl, engine_options)
+        return db
+
+    def _bind(self, engine, executor_workers=0, player_cache_size=1024, player_cache_ttl=600, engine_options=None):
+        self.engine = engine
+        # Kept so other processes can connect with the same settings
+        self.engine_options = dict(engine_options or {})
         self.Session = sessionmaker(self.engine, future=True)
+        self.executor = DatabaseExecutor(executor_workers) if executor_workers > 0 else None
+        self.open_weeklies = Cache()
+        self.players = LRUCache(player_cache_size, player_cache_ttl)
+        # A lock lives while someone holds or waits on it, so weeklies no longer in use leave nothing behind
+        self._weekly_locks = weakref.WeakValueDictionary()
+        self._weekly_locks_lock = threading.Lock()
+
+    def share_caches(self, other):
+        # Invalidations are only seen by the caches of the process that made them, so databases in the same process
+        # must use the same ones to see each other's changes
+        self.open_weeklies = other.open_weeklies
+        self.players = other.players
+
+    async def run(self, fn, *args, **kwargs):
+        if self.executor is None:
+            return fn(*args, **kwargs)
+        return await self.executor.run(fn, *args, **kwargs)
+
+    @contextlib.asynccontextmanager
+    async def session(self):
+        session = self.Session()
+        try:
+            yield session
+        finally:
+            await self.run(session.close)
+
+    @contextlib.contextmanager
+    def lock_weekly(self, session, weekly_id):
+        # Entry changes and the re-scoring of the weekly that follows them must not interleave: the lock keeps them
+        # apart in this process, the row lock across processes where the database has one. Everything in the session
+        # is reloaded once it is held, so it should be taken before changing anything, and committed before leaving.
+        with self._weekly_locks_lock:
+            lock = self._weekly_locks.setdefault(weekly_id, threading.Lock())
+        with lock:
+            session.execute(select(Weekly.id).where(Weekly.id == weekly_id).with_for_update())
+            session.expire_all()
+            yield
+
+    def stats(self):
+        return {
+            "executor": None if self.executor is None else self.executor.stats(),
+            "open_weeklies": self.open_weeklies.stats(),
+            "players": self.players.stats(),
+        }
+
+    def _invalidate(self, session, cache, key):
+        # Evict now and again once the transaction ends, so no reader can cache the state it had in between
+        cache.invalidate(key)
+        session.info.setdefault("invalidations", []).append(lambda: cache.invalidate(key))
+
+    def _write_through(self, session, player):
+        snapshot = PlayerSnapshot.from_player(player)
+        self._invalidate(session, self.players, snapshot.discord_id)
+        session.info.setdefault("on_commit", []).append(lambda: self.players.put(snapshot.discord_id, snapshot))
 
     def get_player(self, session, discord_id):
         return session.get(Player, discord_id)
@@ -53,6 +158,7 @@ class Database:
             }
         )
         session.add(player)
+        self._write_through(session, player)
         return player
 
     def get_or_create_player(self, session, discord_user):
@@ -61,9 +167,142 @@ class Database:
             player = self.create_player(session, discord_user)
         return player
 
+    def get_player_snapshot(self, session, discord_id):
+        def load():
+            player = self.get_player(session, discord_id)
+            return None if player is None else PlayerSnapshot.from_player(player)
+        return self.players.get_or_load(discord_id, load)
+
+    def get_or_create_player_snapshot(self, session, discord_user):
+        player = self.get_player_snapshot(session, discord_user.id)
+        if player is None:
+            player = PlayerSnapshot.from_player(self.create_player(session, discord_user))
+        return player
+
+    def set_player_name(self, session, player, name):
+        player.name = name
+        self._write_through(session, player)
+
+        # The name is published in the leaderboards the player took part in, and in the weeks of their weeklies
+        weekly_ids = select(PlayerEntry.weekly_id).where(PlayerEntry.player_discord_id == player.discord_id)
+        session.execute(
+            update(Weekly).where(Weekly.id.in_(weekly_ids), Weekly.leaderboard_id.is_not(None)).values(
+                version=Weekly.version + 1
+            ),
+            execution_options={"synchronize_session": "fetch"}
+        )
+
+        leaderboard_ids = select(LeaderboardEntry.leaderboard_id).where(
+            LeaderboardEntry.player_discord_id == player.discord_id
+        ).union(
+            select(Weekly.leaderboard_id).where(Weekly.id.in_(weekly_ids), Weekly.leaderboard_id.is_not(None))
+        )
+        leaderboards = session.execute(
+            select(Leaderboard).where(Leaderboard.id.in_(leaderboard_ids))
+        ).scalars().all()
+        for leaderboard in leaderboards:
+            self.touch_leaderboard(session, leaderboard)
+        return leaderboards
+
+    def set_player_status(self, session, player, status):
+        player.status = status
+        self._write_through(session, player)
+
+    def _touch(self, session, instance, **values):
+        # Versions change once per transaction, so snapshots written along the way all match them. They are
+        # incremented by the database, the one loaded in this session may be stale already.
+        entity = type(instance)
+        touched = session.info.setdefault("touched", set())
+        if (entity.__tablename__, instance.id) in touched:
+            return
+        session.execute(
+            update(entity).where(entity.id == instance.id).values(version=entity.version + 1, **values),
+            execution_options={"synchronize_session": False}
+        )
+        version = session.execute(select(entity.version).where(entity.id == instance.id)).scalar_one()
+        set_committed_value(instance, "version", version)
+        for key, value in values.items():
+            set_committed_value(instance, key, value)
+        touched.add((entity.__tablename__, instance.id))
+
+    def touch_leaderboard(self, session, leaderboard):
+        if leaderboard.id is None:
+            leaderboard.version = (leaderboard.version or 0) + 1
+            leaderboard.updated_at = datetime.utcnow()
+        else:
+            self._touch(session, leaderboard, updated_at=datetime.utcnow())
+
+    def touch_weekly(self, session, weekly):
+        if weekly.id is not None:
+            self._touch(session, weekly)
+
+    def save_leaderboard_snapshot(self, session, leaderboard, week, document, version=None):
+        data = snapshot.encode(document)
+        return session.merge(LeaderboardSnapshot(
+            leaderboard_id=leaderboard.id,
+            week=week,
+            version=leaderboard.version if version is None else version,
+            data=data,
+            gzip_data=snapshot.compress(data)
+        ))
+
+    def get_leaderboard_summary(self, session, leaderboard_id, with_snapshot=False):
+        # Plain row with the columns the API needs, plus the stored snapshot of the leaderboard if it is current
+        columns = [
+            Leaderboard.id,
+            Leaderboard.game,
+            Leaderboard.status,
+            Leaderboard.created_at,
+            Leaderboard.updated_at,
+            Leaderboard.version,
+            Leaderboard.leaderboard_data,
+        ]
+        if not with_snapshot:
+            stmt = select(*columns)
+        else:
+            stmt = select(*columns, LeaderboardSnapshot.data, LeaderboardSnapshot.gzip_data).outerjoin(
+                LeaderboardSnapshot, and_(
+                    LeaderboardSnapshot.leaderboard_id == Leaderboard.id,
+                    LeaderboardSnapshot.week == 0,
+                    LeaderboardSnapshot.version == Leaderboard.version
+                )
+            )
+        return session.execute(stmt.where(Leaderboard.id == leaderboard_id)).first()
+
+    def _touch_weekly(self, session, weekly):
+        self.touch_weekly(session, weekly)
+        if weekly.leaderboard_id is not None:
+            self.touch_leaderboard(session, weekly.leaderboard)
+
     def get_weekly(self, session, weekly_id):
         return session.get(Weekly, weekly_id)
 
+    def get_weekly_summary(self, session, weekly_id, leaderboard_id=None, week=None):
+        # Same for a weekly, with the snapshot of its leaderboard week when one is given
+        columns = [
+            Weekly.id, Weekly.game, Weekly.status, Weekly.created_at, Weekly.seed_url, Weekly.seed_hash, Weekly.version
+        ]
+        if week is None:
+            stmt = select(*columns)
+        else:
+            stmt = select(*columns, LeaderboardSnapshot.data, LeaderboardSnapshot.gzip_data).outerjoin(
+                LeaderboardSnapshot, and_(
+                    LeaderboardSnapshot.leaderboard_id == leaderboard_id,
+                    LeaderboardSnapshot.week == week,
+                    LeaderboardSnapshot.version == Weekly.version
+                )
+            )
+        return session.execute(stmt.where(Weekly.id == weekly_id)).first()
+
+    def get_weekly_standings(self, session, weekly_id):
+        return session.execute(
+            select(
+                Player.name, PlayerEntry.position, PlayerEntry.points, PlayerEntry.finish_time
+            ).join(Player, PlayerEntry.player_discord_id == Player.discord_id).where(
+                PlayerEntry.weekly_id == weekly_id, PlayerEntry.excluded.is_(False)
+            ).order_by(PlayerEntry.points.desc().nullslast(), PlayerEntry.player_discord_id)
+        ).all()
+
     def get_open_weekly(self, session, game):
         return session.execute(
             select(Weekly).where(Weekly.game == game, Weekly.status == WeeklyStatus.OPEN).order_by(
@@ -71,6 +310,53 @@ class Database:
             )
         ).scalars().first()
 
+    def get_open_weekly_snapshot(self, session, game):
+        def load():
+            weekly = self.get_open_weekly(session, game)
+            return None if weekly is None else WeeklySnapshot.from_weekly(weekly)
+        return self.open_weeklies.get_or_load(game, load)
+
+    def get_open_weekly_with_entries(self, session, game):
+        return session.execute(
+            select(Weekly).where(Weekly.game == game, Weekly.status == WeeklyStatus.OPEN).order_by(
+                Weekly.created_at.desc()
+            ).options(
+                selectinload(Weekly.entries).joinedload(PlayerEntry.player),
+                joinedload(Weekly.leaderboard)
+            )
+        ).scalars().first()
+
+    def stream_weekly_entries(self, session, weekly_id, batch_size=100):
+        return session.execute(_weekly_entries_query(weekly_id, batch_size)).partitions()
+
+    def get_weekly_entries_page(self, session, weekly_id, after=None, limit=100):
+        # Keyset pages in the order of the listing, each read on its own, so nothing is left open between them
+        stmt = select(PlayerEntry, Player).join(Player, PlayerEntry.player_discord_id == Player.discord_id).where(
+            PlayerEntry.weekly_id == weekly_id
+        )
+        if after is not None:
+            registered_later = or_(
+                PlayerEntry.registered_at > after.registered_at,
+                and_(
+                    PlayerEntry.registered_at == after.registered_at,
+                    PlayerEntry.player_discord_id > after.player_discord_id
+                )
+            )
+            if after.finish_time is None:
+                stmt = stmt.where(PlayerEntry.finish_time.is_(None), registered_later)
+            else:
+                stmt = stmt.where(or_(
+                    PlayerEntry.finish_time.is_(None),
+                    PlayerEntry.finish_time > after.finish_time,
+                    and_(PlayerEntry.finish_time == after.finish_time, registered_later)
+                ))
+        return session.execute(stmt.order_by(
+            PlayerEntry.finish_time.is_(None),
+            PlayerEntry.finish_time,
+            PlayerEntry.registered_at,
+            PlayerEntry.player_discord_id
+        ).limit(limit)).all()
+
     def get_last_closed_weekly(self, session, game):
         return session.execute(
             select(Weekly).where(Weekly.game == game, Weekly.status == WeeklyStatus.CLOSED).order_by(
@@ -87,6 +373,8 @@ class Database:
                 "Attempt to reopen a weekly while another one for the same game is open"
             )
         weekly.status = WeeklyStatus.OPEN
+        self._touch_weekly(session, weekly)
+        self._invalidate(session, self.open_weeklies, weekly.game)
 
     def list_open_weeklies(self, session):
         return session.execute(
@@ -110,12 +398,15 @@ class Database:
             leaderboard=leaderboard
         )
         session.add(weekly)
+        self._invalidate(session, self.open_weeklies, game)
         return weekly
 
     def update_weekly(self, session, weekly, seed_url, seed_hash, submission_end):
         weekly.seed_url = seed_url
         weekly.seed_hash = seed_hash
         weekly.submission_end = submission_end
+        self._touch_weekly(session, weekly)
+        self._invalidate(session, self.open_weeklies, weekly.game)
         return weekly
 
     def close_weekly(self, session, weekly):
@@ -123,10 +414,21 @@ class Database:
             if entry.status == EntryStatus.REGISTERED:
                 entry.status = EntryStatus.DNF
         weekly.status = WeeklyStatus.CLOSED
+        self._touch_weekly(session, weekly)
+        self._invalidate(session, self.open_weeklies, weekly.game)
 
     def get_player_entry(self, session, weekly_id, player_discord_id):
         return session.get(PlayerEntry, (weekly_id, player_discord_id))
 
+    def get_finish_times(self, session, weekly_ids, player_discord_ids):
+        rows = session.execute(
+            select(PlayerEntry.weekly_id, PlayerEntry.player_discord_id, PlayerEntry.finish_time).where(
+                PlayerEntry.weekly_id.in_(weekly_ids),
+                PlayerEntry.player_discord_id.in_(player_discord_ids)
+            )
+        ).all()
+        return {(row.weekly_id, row.player_discord_id): row.finish_time for row in rows}
+
     def get_registered_entry(self, session, player):
         registered = session.execute(
             select(PlayerEntry).where(PlayerEntry.player_discord_id == player.discord_id,
@@ -150,11 +452,11 @@ class Database:
             )
 
         entry = PlayerEntry(
-            weekly=weekly,
-            player=player,
+            weekly_id=weekly.id,
+            player_discord_id=player.discord_id,
             status=EntryStatus.REGISTERED,
             registered_at=datetime.now(),
-            leaderboard_data={"excluded": self.excluded_from_leaderboard(self, player, weekly.game)}
+            excluded=self.excluded_from_leaderboard(self, player, weekly.game)
         )
         session.add(entry)
         return entry
@@ -217,6 +519,136 @@ class Database:
     def get_leaderboard(self, session, leaderboard_id):
         return session.get(Leaderboard, leaderboard_id)
 
+    def get_leaderboard_standings(
+            self, session, leaderboard_id, after_position=None, limit=None, with_player=True, with_results=True
+    ):
+        ranked = and_(LeaderboardEntry.leaderboard_id == leaderboard_id, LeaderboardEntry.position.is_not(None))
+        if after_position is not None:
+            ranked = and_(ranked, LeaderboardEntry.position > after_position)
+
+        columns = [LeaderboardEntry.player_discord_id, LeaderboardEntry.position, LeaderboardEntry.final_points]
+        stmt = select(*columns).where(ranked).order_by(
+            LeaderboardEntry.position, LeaderboardEntry.player_discord_id
+        )
+        if limit is not None:
+            # A page ends at the position of its last row, so tied players are never split between pages
+            last_position = select(LeaderboardEntry.position).where(ranked).order_by(
+                LeaderboardEntry.position
+            ).offset(limit - 1).limit(1).scalar_subquery()
+            stmt = stmt.where(or_(last_position.is_(None), LeaderboardEntry.position <= last_position))
+
+        if with_player:
+            stmt = stmt.add_columns(Player.name).join(Player, LeaderboardEntry.player_discord_id == Player.discord_id)
+        entries = session.execute(stmt).all()
+        if not with_results:
+            return entries, None
+
+        results_stmt = select(
+            LeaderboardWeeklyResult.player_discord_id,
+            LeaderboardWeeklyResult.week_number,
+            LeaderboardWeeklyResult.points,
+            LeaderboardWeeklyResult.discarded
+        ).where(LeaderboardWeeklyResult.leaderboard_id == leaderboard_id).order_by(
+            LeaderboardWeeklyResult.player_discord_id, LeaderboardWeeklyResult.week_number
+        )
+        if after_position is not None or limit is not None:
+            results_stmt = results_stmt.where(
+                LeaderboardWeeklyResult.player_discord_id.in_([e.player_discord_id for e in entries])
+            )
+        results = {}
+        for row in session.execute(results_stmt):
+            results.setdefault(row.player_discord_id, []).append(row)
+        return entries, results
+
+    def get_leaderboard_with_entries(self, session, leaderboard_id):
+        return session.execute(
+            select(Leaderboard).where(Leaderboard.id == leaderboard_id).options(
+                selectinload(Leaderboard.entries).joinedload(LeaderboardEntry.player),
+                selectinload(Leaderboard.entries).selectinload(LeaderboardEntry.results)
+            )
+        ).scalars().first()
+
+    def get_leaderboard_rank(self, session, leaderboard_id, player_discord_id):
+        # Positions are kept current with the points, so the rank is the one in the standings, and the players just
+        # above and below are found on the (leaderboard_id, position) index
+        def ranked(condition, *order):
+            return session.execute(
+                select(
+                    LeaderboardEntry.player_discord_id,
+                    Player.name,
+                    LeaderboardEntry.final_points,
+                    LeaderboardEntry.position
+                ).join(Player, LeaderboardEntry.player_discord_id == Player.discord_id).where(
+                    LeaderboardEntry.leaderboard_id == leaderboard_id, LeaderboardEntry.position.is_not(None), condition
+                ).order_by(*order).limit(1)
+            ).first()
+
+        entry = ranked(LeaderboardEntry.player_discord_id == player_discord_id)
+        if entry is None:
+            return None, None, None
+
+        above = ranked(
+            LeaderboardEntry.position < entry.position,
+            LeaderboardEntry.position.desc(), LeaderboardEntry.player_discord_id
+        )
+        below = ranked(
+            LeaderboardEntry.position > entry.position,
+            LeaderboardEntry.position, LeaderboardEntry.player_discord_id
+        )
+        return entry, above, below
+
+    def list_leaderboards_by_game(self, session):
+        rows = session.execute(
+            select(Leaderboard.game, Leaderboard.id).order_by(Leaderboard.game, Leaderboard.created_at)
+        ).all()
+        leaderboards = {}
+        for row in rows:
+            leaderboards.setdefault(row.game, []).append(row.id)
+        return leaderboards
+
+    def get_leaderboard_weeklies(self, session, leaderboard, for_update=False):
+        week_ids = leaderboard.leaderboard_data["weeklies"]
+        stmt = select(Weekly).where(Weekly.leaderboard_id == leaderboard.id).order_by(Weekly.created_at).options(
+            selectinload(Weekly.entries)
+        )
+        if for_update:
+            # The same row locks lock_weekly takes, held until the transaction ends
+            stmt = stmt.with_for_update(of=Weekly)
+        weeklies = session.execute(stmt).scalars().all()
+
+        # Weeklies keep their week numbers, the ones missing from the leaderboard data come after them
+        positions = {weekly_id: i for i, weekly_id in enumerate(week_ids)}
+        return sorted(weeklies, key=lambda w: positions.get(w.id, len(week_ids)))
+
+    def reset_leaderboard_results(self, session, leaderboard, weeklies):
+        session.execute(
+            delete(LeaderboardWeeklyResult).where(LeaderboardWeeklyResult.leaderboard_id == leaderboard.id),
+            execution_options={"synchronize_session": "fetch"}
+        )
+        session.execute(
+            update(LeaderboardEntry).where(LeaderboardEntry.leaderboard_id == leaderboard.id).values(
+                position=None,
+                total_points=0,
+                final_points=0,
+                tiebreak_common_points=None,
+                tiebreak_minimum_time=None
+            ),
+            execution_options={"synchronize_session": "fetch"}
+        )
+        session.execute(
+            update(PlayerEntry).where(PlayerEntry.weekly_id.in_([w.id for w in weeklies])).values(
+                position=None,
+                points=None
+            ),
+            execution_options={"synchronize_session": "fetch"}
+        )
+        # The open weekly keeps out of the leaderboard weeks until it closes
+        week_ids = leaderboard.leaderboard_data["weeklies"]
+        leaderboard.leaderboard_data["weeklies"] = [
+            w.id for w in weeklies if w.status is WeeklyStatus.CLOSED or w.id in week_ids
+        ]
+        leaderboard.leaderboard_data["tiebreak_data"] = {}
+
     def get_open_leaderboard(self, session, game):
         return session.execute(
             select(Leaderboard).where(Leaderboard.game == game, Leaderboard.status == LeaderboardStatus.OPEN).order_by(
@@ -224,6 +656,16 @@ class Database:
             )
         ).scalars().first()
 
+    def get_open_leaderboard_with_entries(self, session, game):
+        return session.execute(
+            select(Leaderboard).where(Leaderboard.game == game, Leaderboard.status == LeaderboardStatus.OPEN).order_by(
+                Leaderboard.created_at.desc()
+            ).options(
+                selectinload(Leaderboard.entries).joinedload(LeaderboardEntry.player),
+                selectinload(Leaderboard.entries).selectinload(LeaderboardEntry.results)
+            )
+        ).scalars().first()
+
     def create_leaderboard(self, session, game, results_url=None):
         open_lb = self.get_open_leaderboard(session, game)
         if open_lb is not None:
@@ -236,6 +678,8 @@ class Database:
             results_url=results_url,
             status=LeaderboardStatus.OPEN,
             created_at=datetime.now(),
+            updated_at=datetime.utcnow(),
+            version=0,
             leaderboard_data={
                 "included_weeklies": "6",
                 "weeklies": []
@@ -251,6 +695,7 @@ class Database:
                     "Cannot close a leaderboard that has an open weekly."
                 )
         leaderboard.status = LeaderboardStatus.CLOSED
+        self.touch_leaderboard(session, leaderboard)
 
     def get_last_closed_leaderboard(self, session, game):
         return session.execute(
@@ -268,6 +713,7 @@ class Database:
                 "Attempt to reopen a leaderboard while another one for the same game is open"
             )
         leaderboard.status = LeaderboardStatus.OPEN
+        self.touch_leaderboard(session, leaderboard)
 
     def get_leaderboard_entry(self, session, leaderboard_id, player_discord_id):
         return session.get(LeaderboardEntry, (leaderboard_id, player_discord_id))
@@ -276,11 +722,9 @@ class Database:
         lb_entry = LeaderboardEntry(
             leaderboard=leaderboard,
             player=player,
-            leaderboard_data={
-                "weeklies": {},
-                "total_points": 0,
-                "final_points": 0
-            }
+            total_points=0,
+            final_points=0,
+            results=[]
         )
         session.add(lb_entry)
         return lb_entry
@@ -291,18 +735,42 @@ class Database:
             return lb_entry
         return self.create_leaderboard_entry(session, leaderboard, player)
 
+    def get_leaderboard_entries(self, session, leaderboard, player_discord_ids=None):
+        stmt = select(LeaderboardEntry).where(LeaderboardEntry.leaderboard_id == leaderboard.id).options(
+            selectinload(LeaderboardEntry.results)
+        )
+        if player_discord_ids is not None:
+            stmt = stmt.where(LeaderboardEntry.player_discord_id.in_(player_discord_ids))
+        lb_entries = session.execute(stmt).scalars().all()
+        return {lb_entry.player_discord_id: lb_entry for lb_entry in lb_entries}
+
+    def create_leaderboard_entries(self, session, leaderboard, player_discord_ids):
+        lb_entries = {
+            discord_id: LeaderboardEntry(
+                leaderboard_id=leaderboard.id,
+                player_discord_id=discord_id,
+                total_points=0,
+                final_points=0,
+                results=[]
+            ) for discord_id in player_discord_ids
+        }
+        session.add_all(lb_entries.values())
+        return lb_entries
+
     def excluded_from_leaderboard(self, session, player, game):
-        return game.name in player.leaderboard_data["excluded_from"]
+        return game.name in player.excluded_from
 
     def exclude_from_leaderboard(self, session, player, game):
         if not self.excluded_from_leaderboard(session, player, game):
             player.leaderboard_data["excluded_from"] += [game.name]
+            self._write_through(session, player)
 
     def include_on_leaderboard(self, session, player, game):
         if self.excluded_from_leaderboard(session, player, game):
             player.leaderboard_data["excluded_from"] = [
                 g for g in player.leaderboard_data["excluded_from"] if g != game.name
             ]
+            self._write_through(session, player)
 
     def get_head_to_head(self, session, game, player1_id, player2_id, initial_date=None, final_date=None):
         entry1 = aliased(PlayerEntry, name="entry1")
@@ -353,3 +821,132 @@ class Database:
         url += dbpath
 
         return url
+
+
+def _run_sync(name):
+    method = getattr(Database, name)
+
+    @functools.wraps(method)
+    async def wrapper(self, session, *args, **kwargs):
+        return await session.run_sync(lambda sync_session: method(self.sync, sync_session, *args, **kwargs))
+    return wrapper
+
+
+class AsyncDatabase:
+    """Asyncio variant of Database built on AsyncEngine/AsyncSession.
+
+    Every operation runs the corresponding Database method through AsyncSession.run_sync, so the queries and
+    consistency checks are the same, but I/O is awaited instead of blocking the event loop.
+
+    When the synchronous Database used by the bot runs in the same process, pass it as database so both share
+    their caches. Otherwise, as with the API served on its own, each process's caches only see its own changes: the
+    player snapshots until they expire, the open weeklies for good, so the API must not rely on them.
+    """
+
+    ASYNC_DBAPIS = {
+        "sqlite": "aiosqlite",
+        "postgresql": "asyncpg",
+    }
+
+    def __init__(
+            self,
+            *,
+            dialect,
+            dbapi="",
+            user="",
+            password="",
+            host="",
+            port="",
+            dbpath,
+            engine_options=None,
+            executor_workers=0,
+            player_cache_size=1024,
+            player_cache_ttl=600,
+            database=None
+    ):
+        # executor_workers only applies to the synchronous Database, the same config section is shared by both.
+        url = Database.build_database_url(
+            dialect=dialect,
+            dbapi=AsyncDatabase.ASYNC_DBAPIS.get(dialect, dbapi),
+            user=user,
+            password=password,
+            host=host,
+            port=port,
+            dbpath=dbpath
+        )
+        options = engine_options or {}
+        self.engine = create_async_engine(url, **options)
+        self.Session = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False, future=True)
+        self.sync = Database.from_engine(
+            self.engine.sync_engine,
+            player_cache_size=player_cache_size,
+            player_cache_ttl=player_cache_ttl
+        )
+        if database is not None:
+            self.sync.share_caches(database)
+
+    async def run_sync(self, session, fn, *args, **kwargs):
+        return await session.run_sync(fn, *args, **kwargs)
+
+    async def stream_weekly_entries(self, session, weekly_id, batch_size=100):
+        # run_sync can not hand out a result that is still being read, so this one streams on its own
+        result = await session.stream(_weekly_entries_query(weekly_id, batch_size))
+        async for partition in result.partitions():
+            yield partition
+
+    get_player = _run_sync("get_player")
+    create_player = _run_sync("create_player")
+    get_or_create_player = _run_sync("get_or_create_player")
+    get_player_snapshot = _run_sync("get_player_snapshot")
+    get_or_create_player_snapshot = _run_sync("get_or_create_player_snapshot")
+    set_player_name = _run_sync("set_player_name")
+    set_player_status = _run_sync("set_player_status")
+    touch_leaderboard = _run_sync("touch_leaderboard")
+    save_leaderboard_snapshot = _run_sync("save_leaderboard_snapshot")
+    get_leaderboard_summary = _run_sync("get_leaderboard_summary")
+    get_weekly = _run_sync("get_weekly")
+    get_weekly_summary = _run_sync("get_weekly_summary")
+    get_weekly_standings = _run_sync("get_weekly_standings")
+    get_open_weekly = _run_sync("get_open_weekly")
+    get_open_weekly_snapshot = _run_sync("get_open_weekly_snapshot")
+    get_open_weekly_with_entries = _run_sync("get_open_weekly_with_entries")
+    get_weekly_entries_page = _run_sync("get_weekly_entries_page")
+    get_last_closed_weekly = _run_sync("get_last_closed_weekly")
+    reopen_weekly = _run_sync("reopen_weekly")
+    list_open_weeklies = _run_sync("list_open_weeklies")
+    create_weekly = _run_sync("create_weekly")
+    update_weekly = _run_sync("update_weekly")
+    close_weekly = _run_sync("close_weekly")
+    get_player_entry = _run_sync("get_player_entry")
+    get_finish_times = _run_sync("get_finish_times")
+    get_registered_entry = _run_sync("get_registered_entry")
+    register_player = _run_sync("register_player")
+    forfeit = _run_sync("forfeit")
+    submit_time = _run_sync("submit_time")
+    submit_vod = _run_sync("submit_vod")
+    submit_comment = _run_sync("submit_comment")
+    update_time = _run_sync("update_time")
+    update_vod = _run_sync("update_vod")
+    get_game = _run_sync("get_game")
+    get_leaderboard = _run_sync("get_leaderboard")
+    get_leaderboard_standings = _run_sync("get_leaderboard_standings")
+    get_leaderboard_with_entries = _run_sync("get_leaderboard_with_entries")
+    get_leaderboard_rank = _run_sync("get_leaderboard_rank")
+    list_leaderboards_by_game = _run_sync("list_leaderboards_by_game")
+    get_leaderboard_weeklies = _run_sync("get_leaderboard_weeklies")
+    reset_leaderboard_results = _run_sync("reset_leaderboard_results")
+    get_open_leaderboard = _run_sync("get_open_leaderboard")
+    get_open_leaderboard_with_entries = _run_sync("get_open_leaderboard_with_entries")
+    create_leaderboard = _run_sync("create_leaderboard")
+    close_leaderboard = _run_sync("close_leaderboard")
+    get_last_closed_leaderboard = _run_sync("get_last_closed_leaderboard")
+    reopen_leaderboard = _run_sync("reopen_leaderboard")
+    get_leaderboard_entry = _run_sync("get_leaderboard_entry")
+    create_leaderboard_entry = _run_sync("create_leaderboard_entry")
+    get_or_create_leaderboard_entry = _run_sync("get_or_create_leaderboard_entry")
+    get_leaderboard_entries = _run_sync("get_leaderboard_entries")
+    create_leaderboard_entries = _run_sync("create_leaderboard_entries")
+    excluded_from_leaderboard = _run_sync("excluded_from_leaderboard")
+    exclude_from_leaderboard = _run_sync("exclude_from_leaderboard")
+    include_on_leaderboard = _run_sync("include_on_leaderboard")
+    get_head_to_head = _run_sync("get_head_to_head")
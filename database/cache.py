@@ -0,0 +1,144 @@
+from collections import namedtuple, OrderedDict
+import threading
+import time
+
+
+class Cache:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            # Anything invalidated while the value was being loaded may have made it stale
+            if generation == self._generation:
+                self._store(key, value)
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._generation += 1
+            self._store(key, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _lookup(self, key):
+        if key in self._data:
+            return True, self._data[key]
+        return False, None
+
+    def _store(self, key, value):
+        self._data[key] = value
+
+
+class LRUCache(Cache):
+    def __init__(self, capacity, ttl=None):
+        super().__init__()
+        self._data = OrderedDict()
+        self.capacity = capacity
+        self.ttl = ttl
+
+        self.evictions = 0
+        self.expirations = 0
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update({
+                "capacity": self.capacity,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            })
+        return stats
+
+    def _lookup(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return False, None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def _store(self, key, value):
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.capacity:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+
+class WeeklySnapshot(namedtuple(
+        "WeeklySnapshot",
+        ["id", "game", "status", "seed_url", "seed_hash", "created_at", "submission_end", "leaderboard_id"]
+)):
+    __slots__ = ()
+
+    @staticmethod
+    def from_weekly(weekly):
+        return WeeklySnapshot(
+            id=weekly.id,
+            game=weekly.game,
+            status=weekly.status,
+            seed_url=weekly.seed_url,
+            seed_hash=weekly.seed_hash,
+            created_at=weekly.created_at,
+            submission_end=weekly.submission_end,
+            leaderboard_id=weekly.leaderboard_id
+        )
+
+
+class PlayerSnapshot(namedtuple("PlayerSnapshot", ["discord_id", "name", "status", "excluded_from"])):
+    __slots__ = ()
+
+    @staticmethod
+    def from_player(player):
+        return PlayerSnapshot(
+            discord_id=player.discord_id,
+            name=player.name,
+            status=player.status,
+            excluded_from=tuple(player.excluded_from)
+        )
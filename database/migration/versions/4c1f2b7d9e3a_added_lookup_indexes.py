@@ -0,0 +1,28 @@
+"""Added indexes for the weekly, entry and leaderboard lookups
+
+Revision ID: 4c1f2b7d9e3a
+Revises: 8da9320b9b5a
+Create Date: 2026-10-18 10:12:40.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1f2b7d9e3a'
+down_revision = '8da9320b9b5a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_weeklies_game_status_created_at', 'weeklies', ['game', 'status', 'created_at'])
+    op.create_index('ix_player_entries_player_status', 'player_entries', ['player_discord_id', 'status'])
+    op.create_index('ix_leaderboards_game_status_created_at', 'leaderboards', ['game', 'status', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_leaderboards_game_status_created_at', table_name='leaderboards')
+    op.drop_index('ix_player_entries_player_status', table_name='player_entries')
+    op.drop_index('ix_weeklies_game_status_created_at', table_name='weeklies')
@@ -0,0 +1,124 @@
+"""Moved leaderboard results out of the JSON data into their own columns and table
+
+Revision ID: 5d2a9c8e1f47
+Revises: 4c1f2b7d9e3a
+Create Date: 2026-10-18 14:03:27.551904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2a9c8e1f47'
+down_revision = '4c1f2b7d9e3a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('player_entries', sa.Column('excluded', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.add_column('player_entries', sa.Column('position', sa.Integer(), nullable=True))
+    op.add_column('player_entries', sa.Column('points', sa.Float(), nullable=True))
+
+    op.add_column('leaderboard_entries', sa.Column('position', sa.Integer(), nullable=True))
+    op.add_column('leaderboard_entries', sa.Column('total_points', sa.Float(), server_default='0', nullable=False))
+    op.add_column('leaderboard_entries', sa.Column('final_points', sa.Float(), server_default='0', nullable=False))
+    op.add_column('leaderboard_entries', sa.Column('tiebreak_common_points', sa.Float(), nullable=True))
+    op.add_column('leaderboard_entries', sa.Column('tiebreak_minimum_time', sa.Integer(), nullable=True))
+
+    op.create_table(
+        'leaderboard_weekly_results',
+        sa.Column('leaderboard_id', sa.Integer(), nullable=False),
+        sa.Column('player_discord_id', sa.BigInteger(), nullable=False),
+        sa.Column('week_number', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('points', sa.Float(), nullable=False),
+        sa.Column('discarded', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['leaderboard_id', 'player_discord_id'],
+            ['leaderboard_entries.leaderboard_id', 'leaderboard_entries.player_discord_id']
+        ),
+        sa.PrimaryKeyConstraint('leaderboard_id', 'player_discord_id', 'week_number')
+    )
+
+    bind = op.get_bind()
+
+    player_entries = sa.table(
+        'player_entries',
+        sa.column('weekly_id', sa.Integer()),
+        sa.column('player_discord_id', sa.BigInteger()),
+        sa.column('excluded', sa.Boolean()),
+        sa.column('position', sa.Integer()),
+        sa.column('points', sa.Float()),
+        sa.column('leaderboard_data', sa.JSON())
+    )
+    for row in bind.execute(sa.select(player_entries)).all():
+        data = row.leaderboard_data or {}
+        position = data.get("position")
+        bind.execute(
+            sa.update(player_entries).where(
+                player_entries.c.weekly_id == row.weekly_id,
+                player_entries.c.player_discord_id == row.player_discord_id
+            ).values(
+                excluded=data.get("excluded", False),
+                position=None if position in (None, "DNF") else int(position),
+                points=data.get("points")
+            )
+        )
+
+    leaderboard_entries = sa.table(
+        'leaderboard_entries',
+        sa.column('leaderboard_id', sa.Integer()),
+        sa.column('player_discord_id', sa.BigInteger()),
+        sa.column('position', sa.Integer()),
+        sa.column('total_points', sa.Float()),
+        sa.column('final_points', sa.Float()),
+        sa.column('tiebreak_common_points', sa.Float()),
+        sa.column('tiebreak_minimum_time', sa.Integer()),
+        sa.column('leaderboard_data', sa.JSON())
+    )
+    results = []
+    for row in bind.execute(sa.select(leaderboard_entries)).all():
+        data = row.leaderboard_data or {}
+        tiebreak = data.get("tiebreak") or {}
+        bind.execute(
+            sa.update(leaderboard_entries).where(
+                leaderboard_entries.c.leaderboard_id == row.leaderboard_id,
+                leaderboard_entries.c.player_discord_id == row.player_discord_id
+            ).values(
+                position=data.get("position"),
+                total_points=data.get("total_points", 0),
+                final_points=data.get("final_points", 0),
+                tiebreak_common_points=tiebreak.get("common_points"),
+                tiebreak_minimum_time=tiebreak.get("minimum_time")
+            )
+        )
+        for week_number, result in data.get("weeklies", {}).items():
+            results.append({
+                'leaderboard_id': row.leaderboard_id,
+                'player_discord_id': row.player_discord_id,
+                'week_number': int(week_number),
+                'points': result["points"],
+                'discarded': result.get("discarded", False)
+            })
+    if len(results) > 0:
+        op.bulk_insert(sa.table(
+            'leaderboard_weekly_results',
+            sa.column('leaderboard_id', sa.Integer()),
+            sa.column('player_discord_id', sa.BigInteger()),
+            sa.column('week_number', sa.Integer()),
+            sa.column('points', sa.Float()),
+            sa.column('discarded', sa.Boolean())
+        ), results)
+
+    with op.batch_alter_table('player_entries') as batch_op:
+        batch_op.drop_column('leaderboard_data')
+    with op.batch_alter_table('leaderboard_entries') as batch_op:
+        batch_op.drop_column('leaderboard_data')
+
+    op.create_index('ix_leaderboard_entries_final_points', 'leaderboard_entries', ['leaderboard_id', 'final_points'])
+    op.create_index('ix_leaderboard_entries_position', 'leaderboard_entries', ['leaderboard_id', 'position'])
+
+
+def downgrade():
+    raise Exception("Downgrading from this point is not possible without the risk of data loss.")
@@ -0,0 +1,30 @@
+"""Added version and update time to leaderboards
+
+Revision ID: 7b3e1d6f2a90
+Revises: 5d2a9c8e1f47
+Create Date: 2026-10-18 16:41:09.230417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3e1d6f2a90'
+down_revision = '5d2a9c8e1f47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('leaderboards', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.add_column('leaderboards', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+    leaderboards = sa.table('leaderboards', sa.column('created_at', sa.DateTime()), sa.column('updated_at', sa.DateTime()))
+    op.execute(sa.update(leaderboards).values(updated_at=leaderboards.c.created_at))
+
+
+def downgrade():
+    with op.batch_alter_table('leaderboards') as batch_op:
+        batch_op.drop_column('version')
+        batch_op.drop_column('updated_at')
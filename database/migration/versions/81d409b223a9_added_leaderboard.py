@@ -8,8 +8,6 @@ Create Date: 2021-11-10 08:45:48.362672
 from alembic import op
 import sqlalchemy as sa
 
-from database.model import Player, PlayerEntry
-
 
 # revision identifiers, used by Alembic.
 revision = '81d409b223a9'
@@ -43,12 +41,15 @@ def upgrade():
     op.add_column('weeklies', sa.Column('leaderboard_id', sa.Integer(), nullable=True))
     op.create_foreign_key(None, 'weeklies', 'leaderboards', ['leaderboard_id'], ['id'])
 
+    # Lightweight tables, since the models no longer match the schema of this revision
+    players = sa.table('players', sa.column('leaderboard_data', sa.JSON()))
     op.execute(
-        sa.update(Player).values({"leaderboard_data": {"excluded_from": []}})
+        sa.update(players).values({"leaderboard_data": {"excluded_from": []}})
     )
 
+    player_entries = sa.table('player_entries', sa.column('leaderboard_data', sa.JSON()))
     op.execute(
-        sa.update(PlayerEntry).values({"leaderboard_data": {"excluded": False}})
+        sa.update(player_entries).values({"leaderboard_data": {"excluded": False}})
     )
 
 
@@ -0,0 +1,33 @@
+"""Added pre-encoded leaderboard snapshots
+
+Revision ID: 9e4f0a2c7d15
+Revises: 7b3e1d6f2a90
+Create Date: 2026-10-18 18:02:55.804113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4f0a2c7d15'
+down_revision = '7b3e1d6f2a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'leaderboard_snapshots',
+        sa.Column('leaderboard_id', sa.Integer(), nullable=False),
+        sa.Column('week', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('gzip_data', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['leaderboard_id'], ['leaderboards.id'], ),
+        sa.PrimaryKeyConstraint('leaderboard_id', 'week')
+    )
+
+
+def downgrade():
+    op.drop_table('leaderboard_snapshots')
@@ -0,0 +1,32 @@
+"""Added version to weeklies, so each leaderboard week has a snapshot of its own
+
+Revision ID: b6c8e2f4a1d3
+Revises: 9e4f0a2c7d15
+Create Date: 2026-10-18 21:14:37.518920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6c8e2f4a1d3'
+down_revision = '9e4f0a2c7d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('weeklies', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+    # Week snapshots were stored with the leaderboard version, which the weekly versions could match by chance
+    snapshots = sa.table('leaderboard_snapshots', sa.column('week', sa.Integer()))
+    op.execute(sa.delete(snapshots).where(snapshots.c.week > 0))
+
+
+def downgrade():
+    snapshots = sa.table('leaderboard_snapshots', sa.column('week', sa.Integer()))
+    op.execute(sa.delete(snapshots).where(snapshots.c.week > 0))
+
+    with op.batch_alter_table('weeklies') as batch_op:
+        batch_op.drop_column('version')
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.ext.mutable import MutableDict
-from sqlalchemy import Column, Integer, BigInteger, String, Text, Time, DateTime, Enum, ForeignKey, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Time, DateTime, Enum, ForeignKey, JSON, Index
+from sqlalchemy import Boolean, Float, ForeignKeyConstraint, LargeBinary
 from datetime import datetime
 
 from datatypes import Games, PlayerStatus, EntryStatus, WeeklyStatus, LeaderboardStatus
@@ -20,9 +21,16 @@ class Player(Base):
     weekly_entries = relationship("PlayerEntry", back_populates="player")  # bi-directional
     leaderboard_entries = relationship("LeaderboardEntry", back_populates="player")  # bi-directional
 
+    @property
+    def excluded_from(self):
+        return self.leaderboard_data["excluded_from"]
+
 
 class Weekly(Base):
     __tablename__ = 'weeklies'
+    __table_args__ = (
+        Index('ix_weeklies_game_status_created_at', 'game', 'status', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     game = Column(Enum(Games, native_enum=False, validate_strings=True, length=20), nullable=False)
@@ -32,6 +40,7 @@ class Weekly(Base):
     created_at = Column(DateTime, nullable=False)
     submission_end = Column(DateTime, nullable=False)
     leaderboard_id = Column(ForeignKey('leaderboards.id'))  # relationship: leaderboard
+    version = Column(Integer, nullable=False, default=0)  # bumped on every change visible in its leaderboard week
 
     entries = relationship("PlayerEntry", back_populates="weekly")  # bi-directional
     leaderboard = relationship("Leaderboard", back_populates="weeklies")  # bi-directional
@@ -42,6 +51,9 @@ class Weekly(Base):
 
 class PlayerEntry(Base):
     __tablename__ = 'player_entries'
+    __table_args__ = (
+        Index('ix_player_entries_player_status', 'player_discord_id', 'status'),
+    )
 
     weekly_id = Column('weekly_id', ForeignKey('weeklies.id'), primary_key=True)  # relationship: weekly
     player_discord_id = Column(ForeignKey('players.discord_id'), primary_key=True)  # relationship: player
@@ -53,7 +65,9 @@ class PlayerEntry(Base):
     registered_at = Column(DateTime, nullable=False)
     time_submitted_at = Column(DateTime)
     vod_submitted_at = Column(DateTime)
-    leaderboard_data = Column(MutableDict.as_mutable(JSON))
+    excluded = Column(Boolean, nullable=False, default=False)
+    position = Column(Integer)  # NULL with points set means DNF
+    points = Column(Float)
 
     weekly = relationship("Weekly", back_populates="entries")  # bi-directional
     player = relationship("Player", back_populates="weekly_entries")  # bi-directional
@@ -61,12 +75,17 @@ class PlayerEntry(Base):
 
 class Leaderboard(Base):
     __tablename__ = 'leaderboards'
+    __table_args__ = (
+        Index('ix_leaderboards_game_status_created_at', 'game', 'status', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     game = Column(Enum(Games, native_enum=False, validate_strings=True, length=20), nullable=False)
     results_url = Column(String)
     status = Column(Enum(LeaderboardStatus, native_enum=False, validate_strings=True, length=20), nullable=False)
     created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime)  # UTC, served as Last-Modified by the API
+    version = Column(Integer, nullable=False, default=0)  # bumped on every change visible through the API
     leaderboard_data = Column(MutableDict.as_mutable(JSON))
 
     weeklies = relationship("Weekly", back_populates='leaderboard')  # bi-directional
@@ -75,13 +94,52 @@ class Leaderboard(Base):
 
 class LeaderboardEntry(Base):
     __tablename__ = 'leaderboard_entries'
+    __table_args__ = (
+        Index('ix_leaderboard_entries_final_points', 'leaderboard_id', 'final_points'),
+        Index('ix_leaderboard_entries_position', 'leaderboard_id', 'position'),
+    )
 
     leaderboard_id = Column(ForeignKey('leaderboards.id'), primary_key=True)  # relationship: leaderboard
     player_discord_id = Column(ForeignKey('players.discord_id'), primary_key=True) #relationship: player
-    leaderboard_data = Column(MutableDict.as_mutable(JSON))
+    position = Column(Integer)
+    total_points = Column(Float, nullable=False, default=0)
+    final_points = Column(Float, nullable=False, default=0)
+    tiebreak_common_points = Column(Float)
+    tiebreak_minimum_time = Column(Integer)
 
     leaderboard = relationship("Leaderboard", back_populates='entries')  # bi-directional
     player = relationship("Player", back_populates='leaderboard_entries')  # bi-directional
+    results = relationship(
+        "LeaderboardWeeklyResult", back_populates='entry', order_by="LeaderboardWeeklyResult.week_number"
+    )  # bi-directional
+
+
+class LeaderboardWeeklyResult(Base):
+    __tablename__ = 'leaderboard_weekly_results'
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ['leaderboard_id', 'player_discord_id'],
+            ['leaderboard_entries.leaderboard_id', 'leaderboard_entries.player_discord_id']
+        ),
+    )
+
+    leaderboard_id = Column(Integer, primary_key=True)  # relationship: entry
+    player_discord_id = Column(BigInteger, primary_key=True)  # relationship: entry
+    week_number = Column(Integer, primary_key=True, autoincrement=False)
+    points = Column(Float, nullable=False)
+    discarded = Column(Boolean, nullable=False, default=False)
+
+    entry = relationship("LeaderboardEntry", back_populates='results')  # bi-directional
+
+
+class LeaderboardSnapshot(Base):
+    __tablename__ = 'leaderboard_snapshots'
+
+    leaderboard_id = Column(ForeignKey('leaderboards.id'), primary_key=True)
+    week = Column(Integer, primary_key=True, autoincrement=False)  # 0 for the whole leaderboard
+    version = Column(Integer, nullable=False)  # of the leaderboard for week 0, of the weekly for the others
+    data = Column(LargeBinary, nullable=False)
+    gzip_data = Column(LargeBinary, nullable=False)
 
 
 class Game(Base):
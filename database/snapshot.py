@@ -0,0 +1,99 @@
+from calendar import timegm
+from datetime import date
+from email.utils import formatdate
+import gzip
+import json
+
+from datatypes import WeeklyStatus
+from util import time_to_timedelta
+
+
+# Documents served by the API, built here so the bot can store them already encoded as snapshots
+
+# Entries are rows from Database.get_leaderboard_standings, results are their weekly results by player
+LEADERBOARD_ENTRY_FIELDS = {
+    "name": lambda e, results: e.name,
+    "position": lambda e, results: e.position,
+    "points": lambda e, results: e.final_points,
+    "weeklies": lambda e, results: {
+        str(r.week_number): {"points": r.points, "discarded": r.discarded}
+        for r in results.get(e.player_discord_id, [])
+    },
+}
+
+
+def leaderboard_document(lb, entries, results, fields=None):
+    if fields is None:
+        fields = LEADERBOARD_ENTRY_FIELDS.keys()
+    if results is not None:
+        # Results of the open weekly are provisional, they are published once it closes and gets its week
+        weeks = len(lb.leaderboard_data["weeklies"])
+        results = {
+            discord_id: [r for r in player_results if r.week_number < weeks]
+            for discord_id, player_results in results.items()
+        }
+    return {
+        "id": lb.id,
+        "game": lb.game.name,
+        "status": lb.status.name,
+        "created_at": lb.created_at,
+        "data": dict(lb.leaderboard_data),
+        "entries": [{field: LEADERBOARD_ENTRY_FIELDS[field](e, results) for field in fields} for e in entries]
+    }
+
+
+def _weekly_position(entry):
+    if entry.position is not None:
+        return str(entry.position)
+    if entry.points is not None:
+        return "DNF"
+    return None
+
+
+def _weekly_entry(e):
+    return {
+        "name": e.name,
+        "position": _weekly_position(e),
+        "points": e.points,
+        "time": None if e.finish_time is None else int(time_to_timedelta(e.finish_time).total_seconds())
+    }
+
+
+def _open_weekly_entry(e):
+    return {"name": e.name, "position": None, "points": None, "time": None}
+
+
+def weekly_document(lb, week_id, weekly, entries):
+    if weekly.status is WeeklyStatus.OPEN:
+        # Results of a weekly that was reopened stay hidden until it closes again, and so does their order
+        entries = sorted(entries, key=lambda e: e.name)
+        entry_document = _open_weekly_entry
+    else:
+        entry_document = _weekly_entry
+    return {
+        "leaderboard_id": lb.id,
+        "leaderboard_week": week_id,
+        "weekly_id": weekly.id,
+        "game": weekly.game.name,
+        "status": weekly.status.name,
+        "created_at": weekly.created_at,
+        "seed": weekly.seed_url,
+        "hash": weekly.seed_hash,
+        "entries": [entry_document(e) for e in entries]
+    }
+
+
+def _default(value):
+    # Same representation Quart's JSON encoder uses for dates
+    if isinstance(value, date):
+        return formatdate(timegm(value.utctimetuple()), usegmt=True)
+    raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
+
+
+def encode(document):
+    # Matches the output of Quart's jsonify with the default settings
+    return (json.dumps(document, separators=(",", ":"), sort_keys=True, default=_default) + "\n").encode("utf-8")
+
+
+def compress(data):
+    return gzip.compress(data, mtime=0)
@@ -1,21 +1,78 @@
 from util import load_conf, setup_logging
-from database import Database
-from bot import create_bot
+from database import Database, AsyncDatabase
+from bot import create_bot, FrompsBotException
 from api import create_api
+from bot.cogs.weekly_races.rebuild import rebuild_leaderboards, STAGES
 
+import argparse
 import asyncio
 
 
+def rebuild(cfg, workers):
+    import logging
+    logger = logging.getLogger(__name__)
+
+    db = Database(**cfg['database'])
+    try:
+        results, elapsed = rebuild_leaderboards(db, workers, cfg['weeklies'].get('scoring_kernel', "python"))
+    except FrompsBotException as e:
+        logger.error("Leaderboards not rebuilt: %s", e)
+        raise SystemExit(str(e))
+    for game, leaderboards in results.items():
+        for leaderboard_id, weeklies, timings in leaderboards:
+            line = "Leaderboard #%d (%s, %d weeklies): %s" % (
+                leaderboard_id, game, weeklies, ", ".join("%s %.3fs" % (s, timings[s]) for s in STAGES)
+            )
+            print(line)
+            logger.info(line)
+    print("Leaderboards rebuilt in %.3fs" % elapsed)
+    logger.info("Leaderboards rebuilt in %.3fs", elapsed)
+
+
+def run_api(cfg):
+    from hypercorn.config import Config
+    from hypercorn.run import run
+
+    server_cfg = cfg.get('api_server', {})
+    config = Config()
+    config.application_path = "api.asgi:app"
+    config.bind = ["%s:%s" % (cfg['api'].get('host', "127.0.0.1"), cfg['api'].get('port', "5001"))]
+    config.workers = server_cfg.get('workers', 1)
+    config.keep_alive_timeout = server_cfg.get('keep_alive_timeout', config.keep_alive_timeout)
+    config.backlog = server_cfg.get('backlog', config.backlog)
+    config.graceful_timeout = server_cfg.get('graceful_timeout', config.graceful_timeout)
+    run(config)
+
+
 def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("all", help="run the bot and the API in the same process (default)")
+    subparsers.add_parser("bot", help="run only the bot")
+    subparsers.add_parser("api", help="run only the API, under Hypercorn with the workers set in [api_server]")
+    rebuild_parser = subparsers.add_parser(
+        "rebuild-leaderboards", help="recompute every leaderboard from the weekly results and exit"
+    )
+    rebuild_parser.add_argument(
+        "--workers", type=int, help="number of processes (default: one per game, or one on SQLite)"
+    )
+    args = parser.parse_args()
+
     cfg = load_conf()
     setup_logging(cfg['logging'])
 
+    if args.command == "rebuild-leaderboards":
+        rebuild(cfg, args.workers)
+        return
+    if args.command == "api":
+        run_api(cfg)
+        return
+
     import logging
     logger = logging.getLogger(__name__)
 
     db = Database(**cfg['database'])
     bot = create_bot(db, cfg)
-    api = create_api(db, cfg['api'])
 
     @bot.listen()
     async def on_ready():
@@ -25,7 +82,9 @@ def main():
 
     loop = asyncio.get_event_loop()
     loop.create_task(bot.start())
-    loop.create_task(api.run(use_reloader=False, loop=loop))
+    if args.command != "bot":
+        api = create_api(AsyncDatabase(**cfg['database'], database=db), cfg['api'])
+        loop.create_task(api.run(use_reloader=False, loop=loop))
     loop.run_forever()
 
 
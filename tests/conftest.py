@@ -0,0 +1,37 @@
+from sqlalchemy import create_engine, event
+import pytest
+
+from database import Database
+from database.model import Base
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    return Database.from_engine(engine)
+
+
+@pytest.fixture
+def session(db):
+    with db.Session() as session:
+        yield session
+
+
+@pytest.fixture
+def statements(engine):
+    """Every statement sent to the database, as (sql, parameters). Clear it before the part being measured."""
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield recorded
+    event.remove(engine, "before_cursor_execute", record)
@@ -0,0 +1,121 @@
+from database.model import Player, Weekly, PlayerEntry, Leaderboard
+from datatypes import Games, PlayerStatus, EntryStatus, WeeklyStatus, LeaderboardStatus
+
+from datetime import datetime, time, timedelta
+import random
+
+
+def random_time(rng, low=5400, high=10800, step=1):
+    seconds = rng.randrange(low, high, step)
+    return time(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def create_players(session, count, start_id=1000):
+    players = [
+        Player(
+            discord_id=start_id + i,
+            name="player%d" % i,
+            status=PlayerStatus.ACTIVE,
+            leaderboard_data={"excluded_from": []}
+        ) for i in range(count)
+    ]
+    session.add_all(players)
+    return players
+
+
+def create_weekly(session, game, created_at, status=WeeklyStatus.CLOSED, leaderboard=None):
+    weekly = Weekly(
+        game=game,
+        status=status,
+        seed_url="https://example.com/seed/%s" % created_at.strftime("%Y%m%d"),
+        seed_hash="hash",
+        created_at=created_at,
+        submission_end=created_at + timedelta(days=6),
+        leaderboard=leaderboard
+    )
+    session.add(weekly)
+    return weekly
+
+
+def create_entry(session, weekly, player, status, finish_time=None):
+    registered_at = weekly.created_at + timedelta(hours=1)
+    entry = PlayerEntry(
+        weekly=weekly,
+        player=player,
+        status=status,
+        finish_time=finish_time,
+        print_url=None if finish_time is None else "https://example.com/print.png",
+        vod_url="https://example.com/vod" if status is EntryStatus.DONE else None,
+        registered_at=registered_at,
+        time_submitted_at=None if finish_time is None else registered_at + timedelta(hours=3),
+        vod_submitted_at=registered_at + timedelta(hours=4) if status is EntryStatus.DONE else None,
+        excluded=False
+    )
+    session.add(entry)
+    return entry
+
+
+def create_leaderboard(session, game, created_at, status=LeaderboardStatus.OPEN):
+    lb = Leaderboard(
+        game=game,
+        status=status,
+        created_at=created_at,
+        updated_at=created_at,
+        version=0,
+        leaderboard_data={"included_weeklies": "6", "weeklies": []}
+    )
+    session.add(lb)
+    return lb
+
+
+def seed_tied_leaderboard(session, *, game=Games.ALTTPR, groups, group_size, weeklies=3, start_id=1000,
+                          start=datetime(2021, 1, 4)):
+    """Leaderboard where players finish every weekly in groups with the same time, so each group ends up tied."""
+    players = create_players(session, groups * group_size, start_id)
+    lb = create_leaderboard(session, game, start)
+    closed = []
+    for week in range(weeklies):
+        weekly = create_weekly(session, game, start + timedelta(weeks=week), leaderboard=lb)
+        for i, player in enumerate(players):
+            group = i // group_size
+            create_entry(session, weekly, player, EntryStatus.DONE, time(1, 30 + group % 30, group // 30))
+        closed.append(weekly)
+    session.flush()
+    lb.leaderboard_data["weeklies"] = [weekly.id for weekly in closed]
+    return lb, closed
+
+
+def seed_leaderboard(
+        session, *, game=Games.ALTTPR, players=40, weeklies=6, open_weekly=True, time_step=1, seed=0,
+        start=datetime(2021, 1, 4)
+):
+    """Leaderboard with closed weeklies where most players finish and a few forfeit, plus an open weekly."""
+    rng = random.Random(seed)
+    if isinstance(players, int):
+        players = create_players(session, players)
+    lb = create_leaderboard(session, game, start)
+
+    closed = []
+    for week in range(weeklies):
+        weekly = create_weekly(session, game, start + timedelta(weeks=week), leaderboard=lb)
+        for player in players:
+            if rng.random() < 0.2:
+                continue
+            if rng.random() < 0.1:
+                create_entry(session, weekly, player, EntryStatus.DNF)
+            else:
+                create_entry(session, weekly, player, EntryStatus.DONE, random_time(rng, step=time_step))
+        closed.append(weekly)
+
+    current = None
+    if open_weekly:
+        current = create_weekly(session, game, start + timedelta(weeks=weeklies), WeeklyStatus.OPEN, lb)
+        for player in players:
+            if rng.random() < 0.5:
+                create_entry(session, current, player, EntryStatus.REGISTERED)
+            else:
+                create_entry(session, current, player, EntryStatus.TIME_SUBMITTED, random_time(rng, step=time_step))
+
+    session.flush()
+    lb.leaderboard_data["weeklies"] = [weekly.id for weekly in closed]
+    return lb, closed, current, players
@@ -0,0 +1,139 @@
+"""The scoring as it was before the ranking module, on plain data, to check the current code against.
+
+Kept as close as possible to the original loops in leaderboard.py, quadratic pops included.
+"""
+from functools import reduce
+from datetime import time
+
+from util import time_to_timedelta
+
+
+def points_generator():
+    for i in 15, 13, 12, 10, 9, 8, 7, 6, 5, 4, 3, 2:
+        yield i
+    while True:
+        yield 1
+
+
+def weekly(finish_times):
+    """finish_times: time or None for each included entry. Returns (position, points) for each of them."""
+    results = [None] * len(finish_times)
+    finished = sorted([i for i, t in enumerate(finish_times) if t is not None], key=lambda i: finish_times[i])
+    points = points_generator()
+    tied_entries = []
+    pos = 1
+    while len(finished) > 0:
+        tied_entries.append(finished.pop(0))
+        if len(finished) > 0 and finish_times[finished[0]] == finish_times[tied_entries[0]]:
+            continue
+
+        acc_points = 0
+        for i in range(len(tied_entries)):
+            acc_points += next(points)
+        acc_points /= len(tied_entries)
+
+        for i in tied_entries:
+            results[i] = (str(pos), acc_points)
+
+        pos += len(tied_entries)
+        tied_entries = []
+
+    for i, t in enumerate(finish_times):
+        if t is None:
+            results[i] = ("DNF", 0)
+    return results
+
+
+def totals(weeklies, included_weeklies):
+    """weeklies: {str(week_number): {"points": points}}, updated in place with the discarded flags."""
+    sorted_weeklies = sorted(
+        sorted(weeklies.keys(), key=int),
+        key=lambda w: weeklies[w]["points"],
+        reverse=True
+    )
+
+    total_points = 0
+    final_points = 0
+    for i in range(len(sorted_weeklies)):
+        result = weeklies[sorted_weeklies[i]]
+        total_points += result["points"]
+
+        if i < included_weeklies:
+            result["discarded"] = False
+            final_points += result["points"]
+        else:
+            result["discarded"] = True
+    return total_points, final_points
+
+
+def leaderboard(entries, finish_time):
+    """entries: dicts with "final_points" and "weeklies" as left by totals(), for the active players.
+
+    finish_time(week_number, entry) returns the time of the entry in that week. Sets "position" and "tiebreak" on
+    the entries and returns the tiebreak data of the leaderboard.
+    """
+    sorted_entries = sorted(entries, key=lambda e: e["final_points"], reverse=True)
+
+    def finished_weeklies(entry):
+        return set(filter(
+            lambda k: not entry["weeklies"][k]["discarded"] and entry["weeklies"][k]["points"] > 0,
+            entry["weeklies"].keys()
+        ))
+
+    tied_entries = []
+    tiebreak_data = {}
+    pos = 1
+    while len(sorted_entries) > 0:
+        tied_entries.append(sorted_entries.pop(0))
+        if len(sorted_entries) > 0 and sorted_entries[0]["final_points"] == tied_entries[0]["final_points"]:
+            continue
+
+        if len(tied_entries) == 1:
+            tied_entries[0]["position"] = pos
+            tied_entries[0]["tiebreak"] = None
+            pos += 1
+            tied_entries = []
+        else:
+            common_weeklies = finished_weeklies(tied_entries[0])
+            for i in range(1, len(tied_entries)):
+                common_weeklies &= finished_weeklies(tied_entries[i])
+            tiebreak_data[pos] = {
+                "common_weeklies": sorted(list(common_weeklies))
+            }
+
+            max_time = time(23, 59, 59)
+            for e in tied_entries:
+                common_points = reduce(lambda a, w: a + e["weeklies"][w]["points"], common_weeklies, 0)
+                minimum_time = max_time
+                for w in common_weeklies:
+                    t = finish_time(int(w), e)
+                    if minimum_time > t:
+                        minimum_time = t
+                e["tiebreak"] = {
+                    "common_points": common_points,
+                    "minimum_time": int(time_to_timedelta(minimum_time).total_seconds())
+                }
+
+            max_time = int(time_to_timedelta(max_time).total_seconds())
+            tied_entries = sorted(
+                tied_entries,
+                key=lambda e: (e["tiebreak"]["common_points"], max_time - e["tiebreak"]["minimum_time"]),
+                reverse=True
+            )
+
+            still_tied = []
+            while len(tied_entries) > 0:
+                still_tied.append(tied_entries.pop(0))
+                if len(tied_entries) > 0:
+                    common_points = still_tied[0]["tiebreak"]["common_points"]
+                    minimum_time = still_tied[0]["tiebreak"]["minimum_time"]
+                    if tied_entries[0]["tiebreak"]["common_points"] == common_points\
+                            and tied_entries[0]["tiebreak"]["minimum_time"] == minimum_time:
+                        continue
+
+                for e in still_tied:
+                    e["position"] = pos
+                pos += len(still_tied)
+                still_tied = []
+
+    return tiebreak_data
@@ -0,0 +1,64 @@
+"""The API documents built from ORM objects, with the queries the API used before reading Core projections."""
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+
+from database.model import Leaderboard, LeaderboardEntry, PlayerEntry
+from util import time_to_timedelta
+
+
+def leaderboard_document(db, session, leaderboard_id):
+    lb = session.get(Leaderboard, leaderboard_id)
+    entries = session.execute(
+        select(LeaderboardEntry).where(
+            LeaderboardEntry.leaderboard_id == leaderboard_id, LeaderboardEntry.position.is_not(None)
+        ).order_by(LeaderboardEntry.position, LeaderboardEntry.player_discord_id).options(
+            joinedload(LeaderboardEntry.player), selectinload(LeaderboardEntry.results)
+        )
+    ).scalars().all()
+    return {
+        "id": lb.id,
+        "game": lb.game.name,
+        "status": lb.status.name,
+        "created_at": lb.created_at,
+        "data": dict(lb.leaderboard_data),
+        "entries": [
+            {
+                "name": e.player.name,
+                "position": e.position,
+                "points": e.final_points,
+                "weeklies": {
+                    str(r.week_number): {"points": r.points, "discarded": r.discarded}
+                    for r in sorted(e.results, key=lambda r: r.week_number)
+                    if r.week_number < len(lb.leaderboard_data["weeklies"])
+                }
+            } for e in entries
+        ]
+    }
+
+
+def weekly_document(db, session, leaderboard_id, week_id):
+    lb = session.get(Leaderboard, leaderboard_id)
+    weekly = db.get_weekly(session, lb.leaderboard_data["weeklies"][week_id - 1])
+    entries = session.execute(
+        select(PlayerEntry).where(PlayerEntry.weekly_id == weekly.id, PlayerEntry.excluded.is_(False)).order_by(
+            PlayerEntry.points.desc().nullslast(), PlayerEntry.player_discord_id
+        ).options(joinedload(PlayerEntry.player))
+    ).scalars().all()
+    return {
+        "leaderboard_id": lb.id,
+        "leaderboard_week": week_id,
+        "weekly_id": weekly.id,
+        "game": weekly.game.name,
+        "status": weekly.status.name,
+        "created_at": weekly.created_at,
+        "seed": weekly.seed_url,
+        "hash": weekly.seed_hash,
+        "entries": [
+            {
+                "name": e.player.name,
+                "position": str(e.position) if e.position is not None else "DNF" if e.points is not None else None,
+                "points": e.points,
+                "time": None if e.finish_time is None else int(time_to_timedelta(e.finish_time).total_seconds())
+            } for e in entries
+        ]
+    }
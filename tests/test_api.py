@@ -0,0 +1,140 @@
+from sqlalchemy import create_engine, event
+import pytest
+
+from api.Api import Api
+from database import Database, AsyncDatabase
+from database.model import Base
+from datatypes import EntryStatus
+
+from bot.cogs.weekly_races.leaderboard import update_weekly, update_leaderboard, update_provisional, snapshot_weeks
+
+from tests.factories import seed_leaderboard
+
+from datetime import datetime, time, timedelta, timezone
+from email.utils import parsedate_to_datetime
+import asyncio
+
+
+@pytest.fixture
+def seeded(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    engine = create_engine("sqlite:///" + path, future=True)
+    Base.metadata.create_all(engine)
+    db = Database.from_engine(engine)
+    with db.Session() as session:
+        lb, closed, current, _ = seed_leaderboard(session, players=20)
+        for weekly in closed:
+            update_weekly(db, session, weekly)
+        update_leaderboard(db, session, lb)
+        session.commit()
+        ids = lb.id, current.id, closed[0].id
+    yield db, path, ids
+    engine.dispose()
+
+
+def request(path, *requests):
+    """Runs the requests against the API in order, returning (status, etag, body, statements) for each."""
+    async def run():
+        async_db = AsyncDatabase(dialect="sqlite", dbpath=path)
+        statements = []
+        event.listen(
+            async_db.engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2])
+        )
+        client = Api(async_db, {"secret_key": "test"}).api.test_client()
+        responses = []
+        try:
+            for url, headers in requests:
+                statements.clear()
+                response = await client.get(url, headers=headers)
+                responses.append((response.status_code, response.headers.get("ETag"), await response.get_data(),
+                                  len(statements)))
+        finally:
+            await async_db.engine.dispose()
+        return responses
+    return asyncio.run(run())
+
+
+def test_weeks_stay_cached_while_the_open_weekly_changes(seeded):
+    db, path, (leaderboard_id, current_id, first_id) = seeded
+    week, whole = "/leaderboard/%d/1" % leaderboard_id, "/leaderboard/%d" % leaderboard_id
+    (_, week_tag, week_body, week_reads), (_, whole_tag, built, _), (_, _, served, whole_reads) = request(
+        path, (week, {}), (whole, {}), (whole, {})
+    )
+    # The stored snapshots are served, nothing is built from the entries. The whole leaderboard is stored by the
+    # first request that reads it.
+    assert (week_reads, whole_reads) == (2, 1)
+    assert served == built
+
+    # A time submitted to the open weekly
+    with db.Session() as session:
+        weekly = db.get_weekly(session, current_id)
+        entry = next(e for e in weekly.entries if e.status is EntryStatus.REGISTERED)
+        with db.lock_weekly(session, current_id):
+            db.submit_time(session, entry, time(1, 0), "https://example.com/print.png")
+            update_provisional(db, session, entry.weekly)
+            session.commit()
+
+    # Its results are provisional, nothing published changes until it closes
+    (week_status, _, _, _), (whole_status, _, _, _) = request(
+        path, (week, {"If-None-Match": week_tag}), (whole, {"If-None-Match": whole_tag})
+    )
+    assert (week_status, whole_status) == (304, 304)
+
+    with db.Session() as session:
+        with db.lock_weekly(session, current_id):
+            weekly = db.get_weekly(session, current_id)
+            db.close_weekly(session, weekly)
+            update_provisional(db, session, weekly)
+            session.commit()
+
+    (week_status, _, _, _), (whole_status, new_whole_tag, whole_body, _), (_, _, served, reads) = request(
+        path, (week, {"If-None-Match": week_tag}), (whole, {"If-None-Match": whole_tag}), (whole, {})
+    )
+    assert week_status == 304
+    assert whole_status == 200 and new_whole_tag != whole_tag
+    assert b'"points":15.0' in whole_body
+    assert served == whole_body and reads == 1
+
+    # Renaming a player changes the weeks they played in
+    with db.Session() as session:
+        player = next(e.player for e in db.get_weekly(session, first_id).entries)
+        for lb in db.set_player_name(session, player, "renamed"):
+            snapshot_weeks(db, session, lb)
+        session.commit()
+
+    [(status, new_week_tag, body, reads)] = request(path, (week, {"If-None-Match": week_tag}))
+    assert status == 200 and new_week_tag != week_tag
+    assert reads == 2
+    assert b'"renamed"' in body and body != week_body
+
+
+def response_headers(path, *urls):
+    async def run():
+        async_db = AsyncDatabase(dialect="sqlite", dbpath=path)
+        client = Api(async_db, {"secret_key": "test"}).api.test_client()
+        try:
+            return [(await client.get(url)).headers for url in urls]
+        finally:
+            await async_db.engine.dispose()
+    return asyncio.run(run())
+
+
+def test_cache_headers(seeded):
+    db, path, (leaderboard_id, current_id, _) = seeded
+    week, whole = "/leaderboard/%d/1" % leaderboard_id, "/leaderboard/%d" % leaderboard_id
+    with db.Session() as session:
+        db.close_weekly(session, db.get_weekly(session, current_id))
+        lb = db.get_leaderboard(session, leaderboard_id)
+        db.close_leaderboard(session, lb)
+        session.commit()
+        updated_at = lb.updated_at
+    assert abs(datetime.utcnow() - updated_at) < timedelta(minutes=1)
+
+    week_headers, whole_headers = response_headers(path, week, whole)
+    # Closed leaderboards are revalidated like open ones, they still change when rebuilt
+    for headers in (week_headers, whole_headers):
+        assert headers["Cache-Control"] == "no-cache"
+    assert parsedate_to_datetime(whole_headers["Last-Modified"]) \
+        == updated_at.replace(microsecond=0, tzinfo=timezone.utc)
+    # The week is validated by its weekly only, the leaderboard modification time says nothing about it
+    assert "Last-Modified" not in week_headers and week_headers["ETag"] != whole_headers["ETag"]
@@ -0,0 +1,36 @@
+from database import snapshot
+
+from bot.cogs.weekly_races.leaderboard import update_weekly, update_leaderboard
+
+from tests import orm_documents
+from tests.factories import seed_leaderboard
+
+
+def core_leaderboard_document(db, session, leaderboard_id):
+    lb = db.get_leaderboard_summary(session, leaderboard_id)
+    entries, results = db.get_leaderboard_standings(session, leaderboard_id)
+    return snapshot.leaderboard_document(lb, entries, results)
+
+
+def core_weekly_document(db, session, leaderboard_id, week_id):
+    lb = db.get_leaderboard_summary(session, leaderboard_id)
+    weekly = db.get_weekly_summary(session, lb.leaderboard_data["weeklies"][week_id - 1])
+    return snapshot.weekly_document(lb, week_id, weekly, db.get_weekly_standings(session, weekly.id))
+
+
+def test_core_documents_match_the_orm_ones(db, session):
+    lb, closed, _, _ = seed_leaderboard(session, players=40, time_step=900)
+    closed[0].entries[0].excluded = True
+    for weekly in closed:
+        update_weekly(db, session, weekly)
+    update_leaderboard(db, session, lb)
+    session.commit()
+
+    with db.Session() as orm_session:
+        expected = snapshot.encode(orm_documents.leaderboard_document(db, orm_session, lb.id))
+    assert snapshot.encode(core_leaderboard_document(db, session, lb.id)) == expected
+
+    for week_id in range(1, len(closed) + 1):
+        with db.Session() as orm_session:
+            expected = snapshot.encode(orm_documents.weekly_document(db, orm_session, lb.id, week_id))
+        assert snapshot.encode(core_weekly_document(db, session, lb.id, week_id)) == expected
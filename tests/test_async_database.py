@@ -0,0 +1,67 @@
+from sqlalchemy import create_engine
+
+from database import Database, AsyncDatabase
+from database.model import Base
+
+from tests.factories import create_players, seed_leaderboard
+
+import asyncio
+
+
+def entry_keys(batches):
+    return [(e.weekly_id, e.player_discord_id, player.name) for batch in batches for e, player in batch]
+
+
+def test_stream_weekly_entries_matches_sync(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    engine = create_engine("sqlite:///" + path, future=True)
+    Base.metadata.create_all(engine)
+    db = Database.from_engine(engine)
+    with db.Session() as session:
+        _, _, weekly, _ = seed_leaderboard(session, players=25, weeklies=1)
+        session.commit()
+        weekly_id = weekly.id
+        expected = entry_keys(db.stream_weekly_entries(session, weekly_id, batch_size=10))
+    engine.dispose()
+
+    async def stream():
+        async_db = AsyncDatabase(dialect="sqlite", dbpath=path)
+        try:
+            async with async_db.Session() as session:
+                batches = []
+                async for batch in async_db.stream_weekly_entries(session, weekly_id, batch_size=10):
+                    batches.append(batch)
+                return batches
+        finally:
+            await async_db.engine.dispose()
+
+    batches = asyncio.run(stream())
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert entry_keys(batches) == expected
+
+
+def test_shared_caches_see_the_changes_of_both(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    engine = create_engine("sqlite:///" + path, future=True)
+    Base.metadata.create_all(engine)
+    db = Database.from_engine(engine)
+    with db.Session() as session:
+        player = create_players(session, 1)[0]
+        session.commit()
+        discord_id = player.discord_id
+
+    async def run():
+        async_db = AsyncDatabase(dialect="sqlite", dbpath=path, database=db)
+        try:
+            async with async_db.Session() as session:
+                assert (await async_db.get_player_snapshot(session, discord_id)).name == "player0"
+            with db.Session() as session:
+                db.set_player_name(session, db.get_player(session, discord_id), "renamed")
+                session.commit()
+            async with async_db.Session() as session:
+                return await async_db.get_player_snapshot(session, discord_id)
+        finally:
+            await async_db.engine.dispose()
+
+    assert asyncio.run(run()).name == "renamed"
+    engine.dispose()
@@ -0,0 +1,147 @@
+from sqlalchemy import create_engine
+import pytest
+
+from database import Database
+from database.cache import Cache, LRUCache
+from database.model import Base
+from datatypes import Games, WeeklyStatus
+
+from tests.factories import create_players, create_weekly
+
+from datetime import datetime, timedelta
+import database.cache
+
+
+@pytest.fixture
+def file_db(tmp_path):
+    # Sessions on a file database see each other's changes only once committed, as they would in production
+    engine = create_engine("sqlite:///" + str(tmp_path / "db.sqlite"), future=True)
+    Base.metadata.create_all(engine)
+    yield Database.from_engine(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(database.cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("change", [
+    lambda cache: cache.invalidate("other"),
+    lambda cache: cache.put("other", 1),
+    lambda cache: cache.clear(),
+])
+def test_values_changed_while_loading_are_not_stored(change):
+    cache = Cache()
+
+    def load():
+        change(cache)
+        return "stale"
+
+    assert cache.get_or_load("key", load) == "stale"
+    assert cache.get("key", "missing") == "missing"
+    assert cache.get_or_load("key", lambda: "fresh") == "fresh"
+    assert cache.get_or_load("key", lambda: "unused") == "fresh"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+
+
+def test_lru_eviction(clock):
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    cache.get_or_load("d", lambda: 4)
+    assert cache.get("a") is None and cache.get("c") == 3
+    assert cache.stats() == {"size": 2, "hits": 4, "misses": 3, "capacity": 2, "evictions": 2, "expirations": 0}
+
+
+def test_lru_expiry(clock):
+    cache = LRUCache(10, ttl=60)
+    cache.put("a", 1)
+    clock[0] += 30
+    cache.put("b", 2)
+    clock[0] += 29
+    assert cache.get("a") == 1
+    # Reading does not extend the life of an entry
+    clock[0] += 1
+    assert cache.get("a") is None and cache.get("b") == 2
+    clock[0] += 30
+    assert cache.get_or_load("b", lambda: 3) == 3
+    clock[0] += 59
+    assert cache.get("b") == 3
+    assert cache.stats()["expirations"] == 2 and cache.stats()["size"] == 1
+
+
+def test_open_weekly_reloads_after_rollback(file_db):
+    db = file_db
+    with db.Session() as session:
+        create_weekly(session, Games.ALTTPR, datetime(2021, 1, 4), WeeklyStatus.OPEN)
+        session.commit()
+
+    with db.Session() as writer, db.Session() as reader:
+        weekly = db.get_open_weekly(writer, Games.ALTTPR)
+        db.close_weekly(writer, weekly)
+        writer.flush()
+        # Another session still sees it open and caches it while the change is pending
+        assert db.get_open_weekly_snapshot(reader, Games.ALTTPR).status is WeeklyStatus.OPEN
+        writer.rollback()
+        assert db.open_weeklies.stats()["size"] == 0
+        reader.rollback()
+        assert db.get_open_weekly_snapshot(reader, Games.ALTTPR).status is WeeklyStatus.OPEN
+
+
+def test_open_weekly_reloads_after_commit(file_db):
+    db = file_db
+    with db.Session() as session:
+        create_weekly(session, Games.ALTTPR, datetime(2021, 1, 4), WeeklyStatus.OPEN)
+        session.commit()
+
+    with db.Session() as writer, db.Session() as reader:
+        db.close_weekly(writer, db.get_open_weekly(writer, Games.ALTTPR))
+        writer.flush()
+        assert db.get_open_weekly_snapshot(reader, Games.ALTTPR) is not None
+        writer.commit()
+        reader.rollback()
+        assert db.get_open_weekly_snapshot(reader, Games.ALTTPR) is None
+
+
+def test_player_snapshots_write_through_on_commit_only(file_db):
+    db = file_db
+    with db.Session() as session:
+        discord_id = create_players(session, 1)[0].discord_id
+        session.commit()
+
+    with db.Session() as session:
+        assert db.get_player_snapshot(session, discord_id).name == "player0"
+        db.set_player_name(session, db.get_player(session, discord_id), "renamed")
+        assert db.players.get(discord_id) is None
+        session.rollback()
+        assert db.players.get(discord_id) is None
+        assert db.get_player_snapshot(session, discord_id).name == "player0"
+
+        db.set_player_name(session, db.get_player(session, discord_id), "renamed")
+        session.commit()
+        # Stored by the commit itself, with no read from the database
+        assert db.players.get(discord_id).name == "renamed"
+
+
+def test_player_snapshots_expire(file_db, clock):
+    db = file_db
+    db.players.ttl = 60
+    with db.Session() as session:
+        player = create_players(session, 1)[0]
+        session.commit()
+        assert db.get_player_snapshot(session, player.discord_id).name == "player0"
+
+        # Changed behind the cache's back, as another process would
+        player.name = "renamed"
+        session.commit()
+        assert db.get_player_snapshot(session, player.discord_id).name == "player0"
+        clock[0] += timedelta(minutes=1).total_seconds()
+        assert db.get_player_snapshot(session, player.discord_id).name == "renamed"
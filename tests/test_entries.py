@@ -0,0 +1,88 @@
+from sqlalchemy import create_engine, update
+
+from database import Database
+from database.model import Base, Player
+from datatypes import Games, EntryStatus, WeeklyStatus
+
+from bot.cogs.weekly_races import Weekly
+
+from tests.factories import create_players, create_weekly, create_entry
+
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+import asyncio
+import random
+
+
+def seed_entries(session, count=50, seed=0):
+    rng = random.Random(seed)
+    weekly = create_weekly(session, Games.ALTTPR, datetime(2021, 1, 4), WeeklyStatus.OPEN)
+    for player in create_players(session, count):
+        if rng.random() < 0.3:
+            entry = create_entry(session, weekly, player, EntryStatus.REGISTERED)
+        else:
+            # Few distinct times and registrations, so the pages have to split ties
+            entry = create_entry(session, weekly, player, EntryStatus.TIME_SUBMITTED, time(1, rng.randrange(3)))
+        entry.registered_at += timedelta(minutes=rng.randrange(3))
+    session.flush()
+    return weekly
+
+
+def listing_order(entries):
+    return sorted(
+        entries,
+        key=lambda e: (e.finish_time is None, e.finish_time or time(), e.registered_at, e.player_discord_id)
+    )
+
+
+def test_entry_pages_follow_the_listing_order(db, session):
+    weekly = seed_entries(session)
+
+    entries = []
+    after = None
+    while True:
+        page = db.get_weekly_entries_page(session, weekly.id, after, limit=7)
+        if len(page) == 0:
+            break
+        assert len(page) <= 7
+        entries += [e for e, _ in page]
+        after = page[-1][0]
+    assert entries == listing_order(weekly.entries)
+
+
+class WritingNames:
+    """Member names that, while being resolved, write to the database from another connection."""
+
+    def __init__(self, path):
+        self.engine = create_engine("sqlite:///" + path, future=True, connect_args={"timeout": 0.1})
+        self.calls = 0
+
+    async def resolve(self, discord_ids):
+        self.calls += 1
+        with self.engine.begin() as connection:
+            connection.execute(update(Player).where(Player.discord_id == discord_ids[0]).values(name="renamed"))
+        return {}
+
+
+def test_entries_hold_no_transaction_while_resolving_names(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    engine = create_engine("sqlite:///" + path, future=True)
+    Base.metadata.create_all(engine)
+    db = Database.from_engine(engine)
+    with db.Session() as session:
+        weekly_id = seed_entries(session, count=250).id
+        session.commit()
+
+    names = WritingNames(path)
+    cog = SimpleNamespace(db=db, member_names=names)
+
+    async def run():
+        return [e.player_discord_id async for e, _, _ in Weekly._stream_entries(cog, weekly_id)]
+
+    try:
+        streamed = asyncio.run(run())
+    finally:
+        names.engine.dispose()
+        engine.dispose()
+    assert names.calls == 3
+    assert len(streamed) == len(set(streamed)) == 250
@@ -0,0 +1,66 @@
+import pytest
+
+from database.executor import DatabaseExecutor
+
+import asyncio
+import gc
+import threading
+
+
+def test_executor_stats():
+    async def run():
+        executor = DatabaseExecutor(1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocking():
+            started.set()
+            release.wait(5)
+            return "done"
+
+        try:
+            tasks = [asyncio.create_task(executor.run(blocking)) for _ in range(3)]
+            await asyncio.sleep(0)
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            stats = executor.stats()
+            assert (stats["workers"], stats["queued"], stats["running"], stats["completed"]) == (1, 2, 1, 0)
+
+            # A task cancelled before it starts leaves the queue
+            tasks[2].cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await tasks[2]
+            assert executor.stats()["queued"] == 1
+
+            await asyncio.sleep(0.05)
+            release.set()
+            assert await asyncio.gather(*tasks[:2]) == ["done", "done"]
+            stats = executor.stats()
+            assert (stats["queued"], stats["running"], stats["completed"]) == (0, 0, 2)
+            # Only the second task waited, for as long as the first one was blocked
+            assert stats["max_wait"] >= 0.05
+            assert stats["average_wait"] == pytest.approx(executor.total_wait / 2)
+            assert stats["max_wait"] / 2 <= stats["average_wait"] < stats["max_wait"]
+        finally:
+            release.set()
+            executor.executor.shutdown()
+    asyncio.run(run())
+
+
+def test_executor_reraises():
+    async def run():
+        executor = DatabaseExecutor(1)
+        try:
+            with pytest.raises(ZeroDivisionError):
+                await executor.run(lambda: 1 / 0)
+            assert executor.stats()["completed"] == 1 and executor.stats()["running"] == 0
+        finally:
+            executor.executor.shutdown()
+    asyncio.run(run())
+
+
+def test_weekly_locks_are_released(db, session):
+    with db.lock_weekly(session, 1):
+        assert list(db._weekly_locks) == [1]
+        session.rollback()
+    gc.collect()
+    assert len(db._weekly_locks) == 0
@@ -0,0 +1,52 @@
+from bot.cogs.weekly_races.members import MemberNames
+
+from types import SimpleNamespace
+
+
+class Guild:
+    def __init__(self, id, names):
+        self.id = id
+        self.set_members(names)
+
+    def set_members(self, names):
+        self.members = [SimpleNamespace(id=discord_id, display_name=name) for discord_id, name in names.items()]
+
+    def get_member(self, discord_id):
+        return next((member for member in self.members if member.id == discord_id), None)
+
+
+def indexed(member_names, discord_ids):
+    return {discord_id: member_names.display_names(discord_id) for discord_id in discord_ids}
+
+
+def test_guilds_are_indexed_on_their_own():
+    first = Guild(1, {10: "a", 11: "b"})
+    second = Guild(2, {10: "c", 12: "d"})
+    bot = SimpleNamespace(guilds=[first, second])
+    member_names = MemberNames(bot)
+    member_names.rebuild()
+    assert indexed(member_names, [10, 11, 12]) == {10: {"a", "c"}, 11: {"b"}, 12: {"d"}}
+
+    # Only the guild that became available again is redone, the other keeps what it had
+    first.set_members({10: "e", 13: "f"})
+    second.set_members({})
+    member_names.refresh_guild(first)
+    assert indexed(member_names, [10, 11, 12, 13]) == {10: {"c", "e"}, 11: set(), 12: {"d"}, 13: {"f"}}
+
+    bot.guilds.remove(second)
+    member_names.remove_guild(second)
+    assert indexed(member_names, [10, 11, 12, 13]) == {10: {"e"}, 11: set(), 12: set(), 13: {"f"}}
+    assert member_names.names == {10: {1: "e"}, 13: {1: "f"}}
+
+
+def test_refreshed_members_leave_with_their_guild():
+    guild = Guild(1, {})
+    bot = SimpleNamespace(guilds=[guild])
+    member_names = MemberNames(bot)
+    member_names.rebuild()
+
+    guild.set_members({10: "a"})
+    member_names.refresh(10)
+    assert member_names.display_names(10) == {"a"}
+    member_names.remove_guild(guild)
+    assert member_names.display_names(10) == set() and member_names.names == {}
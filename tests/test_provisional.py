@@ -0,0 +1,159 @@
+from sqlalchemy import create_engine
+import pytest
+
+from database import Database, snapshot
+from database.model import Base
+from datatypes import Games, EntryStatus, WeeklyStatus
+
+from bot.cogs.weekly_races.leaderboard import update_provisional, update_weekly, update_leaderboard
+
+from tests.factories import seed_leaderboard, create_players, create_weekly, create_entry, create_leaderboard
+
+from datetime import datetime, time
+import threading
+
+
+def results(db, weekly_id):
+    with db.Session() as session:
+        weekly = db.get_weekly(session, weekly_id)
+        lb = weekly.leaderboard
+        return (
+            sorted((e.player_discord_id, e.position, e.points) for e in weekly.entries),
+            sorted(
+                (e.player_discord_id, e.total_points, e.final_points,
+                 sorted((r.week_number, r.points) for r in e.results))
+                for e in lb.entries
+            )
+        )
+
+
+@pytest.fixture
+def file_db(tmp_path):
+    engine = create_engine("sqlite:///" + str(tmp_path / "db.sqlite"), future=True)
+    Base.metadata.create_all(engine)
+    yield Database.from_engine(engine)
+    engine.dispose()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_concurrent_submissions_are_scored_in_turn(file_db, seed):
+    db = file_db
+    start = datetime(2021, 1, 4)
+    with db.Session() as session:
+        players = create_players(session, 8)
+        lb = create_leaderboard(session, Games.ALTTPR, start)
+        weekly = create_weekly(session, Games.ALTTPR, start, WeeklyStatus.OPEN, lb)
+        for player in players:
+            create_entry(session, weekly, player, EntryStatus.REGISTERED)
+        session.commit()
+        weekly_id = weekly.id
+        discord_ids = [player.discord_id for player in players]
+
+    # Everyone loads their entry first, then they all submit at once
+    barrier = threading.Barrier(len(discord_ids))
+    errors = []
+
+    def submit(discord_id, finish_time):
+        try:
+            with db.Session() as session:
+                entry = db.get_player_entry(session, weekly_id, discord_id)
+                entry.weekly.entries
+                barrier.wait()
+                with db.lock_weekly(session, weekly_id):
+                    db.submit_time(session, entry, finish_time, "https://example.com/print.png")
+                    update_provisional(db, session, entry.weekly)
+                    session.commit()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=submit, args=(discord_id, time(1, 30 + (i + seed) % 5, 0)))
+        for i, discord_id in enumerate(discord_ids)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+    # Scoring again from scratch changes nothing
+    stored = results(db, weekly_id)
+    with db.Session() as session:
+        update_provisional(db, session, db.get_weekly(session, weekly_id))
+        session.commit()
+    assert results(db, weekly_id) == stored
+
+    positions = {}
+    with db.Session() as session:
+        for e in db.get_weekly(session, weekly_id).entries:
+            positions.setdefault(e.position, set()).add(e.finish_time)
+    assert all(len(times) == 1 for times in positions.values())
+
+
+def test_open_weekly_joins_the_leaderboard_when_closed(db, session):
+    lb, closed, current, _ = seed_leaderboard(session, players=20, time_step=900)
+    for weekly in closed:
+        update_weekly(db, session, weekly)
+    week_ids = list(lb.leaderboard_data["weeklies"])
+
+    update_provisional(db, session, current)
+    update_leaderboard(db, session, lb)
+    session.flush()
+    assert lb.leaderboard_data["weeklies"] == week_ids
+    assert any(r.week_number == len(week_ids) for e in lb.entries for r in e.results)
+
+    db.close_weekly(session, current)
+    update_provisional(db, session, current)
+    assert lb.leaderboard_data["weeklies"] == week_ids + [current.id]
+
+
+def test_open_weekly_document_hides_results(db, session):
+    lb, closed, current, _ = seed_leaderboard(session, players=20, weeklies=1)
+    update_weekly(db, session, closed[0])
+    update_provisional(db, session, current)
+    session.flush()
+
+    document = snapshot.weekly_document(lb, 2, current, db.get_weekly_standings(session, current.id))
+    assert [e["name"] for e in document["entries"]] == sorted(e["name"] for e in document["entries"])
+    assert all(e["position"] is None and e["points"] is None and e["time"] is None for e in document["entries"])
+
+    # A reopened weekly keeps its week, but hides its results again
+    document = snapshot.weekly_document(lb, 1, closed[0], db.get_weekly_standings(session, closed[0].id))
+    assert any(e["time"] is not None for e in document["entries"])
+    closed[0].status = WeeklyStatus.OPEN
+    document = snapshot.weekly_document(lb, 1, closed[0], db.get_weekly_standings(session, closed[0].id))
+    assert all(e["time"] is None for e in document["entries"])
+
+
+def published(db, session, lb):
+    entries, results = db.get_leaderboard_standings(session, lb.id)
+    return snapshot.leaderboard_document(lb, entries, results)
+
+
+def test_open_weekly_results_stay_out_of_the_standings(db, session):
+    lb, closed, current, _ = seed_leaderboard(session, players=30, time_step=900)
+    for weekly in closed:
+        update_weekly(db, session, weekly)
+    update_leaderboard(db, session, lb)
+    session.flush()
+    document = published(db, session, lb)
+    version = lb.version
+
+    update_provisional(db, session, current)
+    session.flush()
+    assert any(r.week_number == len(closed) for e in lb.entries for r in e.results)
+    assert published(db, session, lb) == document
+    assert lb.version == version
+
+    # Closing it publishes the week, with the positions following the new points
+    db.close_weekly(session, current)
+    update_provisional(db, session, current)
+    session.flush()
+    document = published(db, session, lb)
+    assert any(str(len(closed)) in e["weeklies"] for e in document["entries"])
+    points = [e["points"] for e in document["entries"]]
+    assert points == sorted(points, reverse=True)
+
+    positions = {e.player_discord_id: e.position for e in lb.entries}
+    update_leaderboard(db, session, lb)
+    assert {e.player_discord_id: e.position for e in lb.entries} == positions
@@ -0,0 +1,87 @@
+from datatypes import Games
+
+from bot.cogs.weekly_races.leaderboard import update_weekly, update_leaderboard
+
+from tests.factories import seed_leaderboard, create_players
+
+
+SMALL, LARGE = Games.ALTTPR, Games.OOTR
+
+
+def count_statements(statements, fn):
+    # Only reads, the unit of work batches the writes in as many statements as there are sets of changed columns
+    statements.clear()
+    fn()
+    return len([statement for statement, _ in statements if statement.lstrip().startswith("SELECT")])
+
+
+def seed_games(db, session):
+    # The same data for two games, one with a few players and the other with many
+    leaderboards = {}
+    for game, players, start_id in [(SMALL, 20, 1000), (LARGE, 100, 2000)]:
+        # Finish times in steps of 15 minutes, so both leaderboards have ties to break
+        lb, closed, _, _ = seed_leaderboard(
+            session, game=game, players=create_players(session, players, start_id), time_step=900
+        )
+        for weekly in closed:
+            update_weekly(db, session, weekly)
+        leaderboards[game] = lb.id
+    session.commit()
+    return leaderboards
+
+
+def test_open_weekly_entries(db, session, statements):
+    seed_games(db, session)
+
+    def read(game):
+        weekly = db.get_open_weekly_with_entries(session, game)
+        for e in weekly.entries:
+            e.player.name
+        weekly.leaderboard.leaderboard_data
+
+    # The weekly joined with its leaderboard, then its entries joined with their players
+    assert count_statements(statements, lambda: read(SMALL)) == 2
+    assert count_statements(statements, lambda: read(LARGE)) == 2
+
+
+def test_leaderboard_entries(db, session, statements):
+    leaderboards = seed_games(db, session)
+
+    def read(game):
+        lb = db.get_leaderboard_with_entries(session, leaderboards[game])
+        for e in lb.entries:
+            e.player.name
+            [r.points for r in e.results]
+
+    # The leaderboard, its entries joined with their players, then their results
+    assert count_statements(statements, lambda: read(SMALL)) == 3
+    assert count_statements(statements, lambda: read(LARGE)) == 3
+
+
+def test_leaderboard_standings(db, session, statements):
+    leaderboards = seed_games(db, session)
+    for game in (SMALL, LARGE):
+        assert count_statements(statements, lambda: db.get_leaderboard_standings(session, leaderboards[game])) == 2
+
+
+def test_update_weekly(db, session, statements):
+    seed_games(db, session)
+
+    def score(game):
+        weekly = db.get_last_closed_weekly(session, game)
+        weekly.entries, weekly.leaderboard
+        update_weekly(db, session, weekly)
+        session.flush()
+
+    assert count_statements(statements, lambda: score(SMALL)) == count_statements(statements, lambda: score(LARGE))
+
+
+def test_update_leaderboard(db, session, statements):
+    seed_games(db, session)
+
+    def rank(game):
+        lb = db.get_open_leaderboard_with_entries(session, game)
+        update_leaderboard(db, session, lb)
+        session.flush()
+
+    assert count_statements(statements, lambda: rank(SMALL)) == count_statements(statements, lambda: rank(LARGE))
@@ -0,0 +1,81 @@
+from sqlalchemy import text
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+import pytest
+
+from datatypes import Games
+
+from tests.factories import seed_leaderboard, create_players
+
+import os
+
+
+MIGRATIONS = os.path.join(os.path.dirname(__file__), "..", "database", "migration")
+INDEX_REVISION = "4c1f2b7d9e3a"
+
+# Query and the index it must be answered from
+HOT_QUERIES = {
+    "get_open_weekly": (
+        lambda db, session, player: db.get_open_weekly(session, Games.ALTTPR),
+        "ix_weeklies_game_status_created_at (game=? AND status=?)"
+    ),
+    "get_last_closed_weekly": (
+        lambda db, session, player: db.get_last_closed_weekly(session, Games.ALTTPR),
+        "ix_weeklies_game_status_created_at (game=? AND status=?)"
+    ),
+    "get_registered_entry": (
+        lambda db, session, player: db.get_registered_entry(session, player),
+        "ix_player_entries_player_status (player_discord_id=? AND status=?)"
+    ),
+    "get_open_leaderboard": (
+        lambda db, session, player: db.get_open_leaderboard(session, Games.ALTTPR),
+        "ix_leaderboards_game_status_created_at (game=? AND status=?)"
+    ),
+}
+
+
+def apply_index_migration(engine):
+    # Drop the indexes created from the model and create them again with the migration that added them
+    revision = ScriptDirectory(MIGRATIONS).get_revision(INDEX_REVISION)
+    with engine.begin() as conn:
+        for table, index in [
+            ("weeklies", "ix_weeklies_game_status_created_at"),
+            ("player_entries", "ix_player_entries_player_status"),
+            ("leaderboards", "ix_leaderboards_game_status_created_at"),
+        ]:
+            conn.execute(text("DROP INDEX %s" % index))
+        with Operations.context(MigrationContext.configure(conn)):
+            revision.module.upgrade()
+
+
+def query_plan(engine, statement, parameters):
+    with engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+
+@pytest.fixture(params=["model", "migration"])
+def seeded(request, engine, db, session):
+    if request.param == "migration":
+        apply_index_migration(engine)
+
+    players = create_players(session, 100)
+    for i, game in enumerate([Games.ALTTPR, Games.OOTR, Games.MMR, Games.SMR]):
+        seed_leaderboard(session, game=game, players=players, weeklies=6, seed=i)
+    session.commit()
+    return db.get_player_snapshot(session, players[0].discord_id)
+
+
+@pytest.mark.parametrize("query", sorted(HOT_QUERIES))
+def test_hot_queries_use_indexes(query, engine, db, session, seeded, statements):
+    run, index = HOT_QUERIES[query]
+    statements.clear()
+    run(db, session, seeded)
+    assert len(statements) == 1
+
+    plan = query_plan(engine, *statements[0])
+    assert any(detail.endswith(index) for detail in plan), plan
+    full_scans = [detail for detail in plan if detail.startswith("SCAN")]
+    sorts = [detail for detail in plan if "TEMP B-TREE" in detail]
+    assert full_scans == [], plan
+    assert sorts == [], plan
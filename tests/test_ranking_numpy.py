@@ -0,0 +1,89 @@
+import pytest
+
+from datatypes import Games
+
+from bot.cogs.weekly_races import ranking
+from bot.cogs.weekly_races.leaderboard import update_weekly, update_leaderboard
+
+from tests.test_scoring import TIME_STEPS, seed_random_leaderboard
+
+import random
+
+
+numpy_kernel = pytest.importorskip("bot.cogs.weekly_races.ranking_numpy")
+
+TRIALS = 300
+
+
+@pytest.mark.parametrize("seed", range(TRIALS))
+def test_positions(seed):
+    rng = random.Random(seed)
+    step = rng.choice(TIME_STEPS)
+    keys = [rng.randrange(5400, 10800, step) for _ in range(rng.randrange(0, 60))]
+    for descending in (False, True):
+        assert numpy_kernel.positions(keys, descending) == ranking.positions(keys, descending)
+
+
+@pytest.mark.parametrize("seed", range(TRIALS))
+def test_dense_positions(seed):
+    rng = random.Random(seed)
+    step = rng.choice(TIME_STEPS)
+    keys = [rng.randrange(5400, 10800, step) for _ in range(rng.randrange(0, 60))]
+    for descending in (False, True):
+        assert numpy_kernel.dense_positions(keys, descending) == ranking.dense_positions(keys, descending)
+
+
+@pytest.mark.parametrize("seed", range(TRIALS))
+def test_weekly_points(seed):
+    rng = random.Random(seed)
+    step = rng.choice(TIME_STEPS)
+    keys = [float(rng.randrange(5400, 10800, step)) for _ in range(rng.randrange(0, 60))]
+    assert numpy_kernel.weekly_points(keys) == ranking.weekly_points(keys)
+
+
+@pytest.mark.parametrize("seed", range(TRIALS))
+def test_best_of(seed):
+    rng = random.Random(seed)
+    included = rng.randrange(0, 8)
+    # Averaged points of ties are not whole numbers, their sums depend on the order they are added in
+    points = [15, 13, 12.5, 12, 10, 9.333333333333334, 1.1, 1, 0]
+    results = [
+        [(w, rng.choice(points)) for w in rng.sample(range(10), rng.randrange(0, 10))]
+        for _ in range(rng.randrange(0, 20))
+    ]
+    assert numpy_kernel.best_of(results, included) == ranking.best_of(results, included)
+
+
+def test_kernel_selection():
+    assert ranking.get_kernel() is ranking
+    assert ranking.get_kernel("numpy") is numpy_kernel
+    with pytest.raises(ValueError):
+        ranking.get_kernel("fortran")
+
+
+def score(db, session, seed, kernel):
+    lb, weeklies = seed_random_leaderboard(session, random.Random(seed))
+    for weekly in weeklies:
+        update_weekly(db, session, weekly, kernel)
+    session.flush()
+    update_leaderboard(db, session, db.get_open_leaderboard_with_entries(session, Games.ALTTPR), kernel)
+    session.flush()
+
+    return (
+        [(e.player_discord_id, e.position, e.points) for weekly in weeklies for e in weekly.entries],
+        sorted(
+            (e.player_discord_id, e.position, e.total_points, e.final_points,
+             sorted((r.week_number, r.points, r.discarded) for r in e.results))
+            for e in lb.entries
+        ),
+        lb.leaderboard_data["tiebreak_data"]
+    )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_leaderboard(engine, db, seed):
+    with db.Session() as session:
+        expected = score(db, session, seed, ranking)
+        session.rollback()
+    with db.Session() as session:
+        assert score(db, session, seed, numpy_kernel) == expected
@@ -0,0 +1,56 @@
+from bot.ReactionQueue import ReactionQueue
+
+import asyncio
+from types import SimpleNamespace
+
+
+class Message:
+    def __init__(self, id, channel_id, fail_with=None):
+        self.id = id
+        self.channel = SimpleNamespace(id=channel_id)
+        self.fail_with = fail_with
+        self.reactions = []
+
+    async def add_reaction(self, emoji):
+        if self.fail_with is not None:
+            raise self.fail_with
+        self.reactions.append(emoji)
+
+    async def remove_reaction(self, emoji, member):
+        self.reactions.remove(emoji)
+
+
+def test_unexpected_errors_do_not_stop_the_channel():
+    async def run():
+        reactions = ReactionQueue(SimpleNamespace(user=None), "⏳", busy_delay=0, interval=0)
+        broken, ok, later = Message(1, 10, RuntimeError("boom")), Message(2, 10), Message(3, 10)
+
+        reactions.finished(broken, "✅")
+        reactions.finished(ok, "✅")
+        # The worker is kept while it runs
+        worker = reactions._workers[10]
+        await worker
+        assert ok.reactions == ["✅"]
+        assert reactions._queues == {} and reactions._workers == {}
+
+        # A new worker picks up the channel again
+        reactions.started(later)
+        reactions.finished(later, "❌")
+        await reactions._workers[10]
+        assert later.reactions == ["❌"]
+
+    asyncio.run(run())
+
+
+def test_cancelled_worker_leaves_no_queue_behind():
+    async def run():
+        reactions = ReactionQueue(SimpleNamespace(user=None), "⏳", busy_delay=0, interval=60)
+        reactions.finished(Message(1, 10), "✅")
+        reactions.finished(Message(2, 10), "✅")
+        worker = reactions._workers[10]
+        await asyncio.sleep(0)
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+        assert reactions._queues == {} and reactions._workers == {}
+
+    asyncio.run(run())
@@ -0,0 +1,132 @@
+from sqlalchemy import create_engine
+import pytest
+
+from database import Database, ConsistencyError
+from database.model import Base
+from datatypes import Games, EntryStatus, WeeklyStatus
+from bot.exceptions import FrompsBotException
+
+from bot.cogs.weekly_races import ranking
+from bot.cogs.weekly_races.leaderboard import update_provisional
+from bot.cogs.weekly_races.rebuild import rebuild_leaderboard, rebuild_leaderboards
+
+from tests.factories import create_players, create_leaderboard, create_weekly, create_entry, random_time
+
+from datetime import datetime, timedelta
+import random
+
+
+@pytest.fixture
+def file_db(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    engine = create_engine("sqlite:///" + path, future=True)
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    db = Database(dialect="sqlite", dbpath=path, engine_options={"connect_args": {"timeout": 30}})
+    yield db
+    db.engine.dispose()
+
+
+def play_weekly(db, lb_id, game, created_at, discord_ids, rng):
+    """Plays a weekly the way the bot does: every submission and forfeit is scored as it comes, then it closes."""
+    with db.Session() as session:
+        weekly = create_weekly(session, game, created_at, WeeklyStatus.OPEN, db.get_leaderboard(session, lb_id))
+        for discord_id in discord_ids:
+            if rng.random() < 0.8:
+                create_entry(session, weekly, db.get_player(session, discord_id), EntryStatus.REGISTERED)
+        session.commit()
+        weekly_id = weekly.id
+        registered = [e.player_discord_id for e in weekly.entries]
+
+    rng.shuffle(registered)
+    for discord_id in registered:
+        with db.Session() as session:
+            with db.lock_weekly(session, weekly_id):
+                entry = db.get_player_entry(session, weekly_id, discord_id)
+                if rng.random() < 0.1:
+                    db.forfeit(session, entry)
+                elif rng.random() < 0.9:
+                    db.submit_time(session, entry, random_time(rng, step=300), "https://example.com/print.png")
+                else:
+                    continue
+                update_provisional(db, session, entry.weekly)
+                session.commit()
+
+    with db.Session() as session:
+        with db.lock_weekly(session, weekly_id):
+            weekly = db.get_weekly(session, weekly_id)
+            db.close_weekly(session, weekly)
+            update_provisional(db, session, weekly)
+            session.commit()
+
+
+def seed_played(db, games=(Games.ALTTPR, Games.OOTR), players=30, weeklies=4, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2021, 1, 4)
+    with db.Session() as session:
+        discord_ids = [player.discord_id for player in create_players(session, players)]
+        lb_ids = {game: create_leaderboard(session, game, start) for game in games}
+        session.commit()
+        lb_ids = {game: lb.id for game, lb in lb_ids.items()}
+
+    for week in range(weeklies):
+        for game, lb_id in lb_ids.items():
+            play_weekly(db, lb_id, game, start + timedelta(weeks=week), discord_ids, rng)
+    return lb_ids
+
+
+def stored(db, lb_id):
+    with db.Session() as session:
+        lb = db.get_leaderboard_with_entries(session, lb_id)
+        return (
+            lb.leaderboard_data["weeklies"],
+            lb.leaderboard_data["tiebreak_data"],
+            sorted(
+                (
+                    e.player_discord_id, e.position, e.total_points, e.final_points, e.tiebreak_common_points,
+                    e.tiebreak_minimum_time, [(r.week_number, r.points, r.discarded) for r in e.results]
+                ) for e in lb.entries
+            ),
+            sorted(
+                (e.weekly_id, e.player_discord_id, e.position, e.points)
+                for weekly in db.get_leaderboard_weeklies(session, lb) for e in weekly.entries
+            )
+        )
+
+
+def test_rebuild_matches_incremental_scoring(file_db):
+    db = file_db
+    lb_ids = seed_played(db)
+    expected = {game: stored(db, lb_id) for game, lb_id in lb_ids.items()}
+    assert all(len(tiebreak_data) > 0 for _, tiebreak_data, _, _ in expected.values())
+
+    # Nothing is left of the scores the rebuild should restore
+    with db.Session() as session:
+        for lb_id in lb_ids.values():
+            lb = db.get_leaderboard(session, lb_id)
+            db.reset_leaderboard_results(session, lb, db.get_leaderboard_weeklies(session, lb))
+        session.commit()
+    assert all(stored(db, lb_id) != expected[game] for game, lb_id in lb_ids.items())
+
+    results, _ = rebuild_leaderboards(db, workers=2)
+    assert {game: [leaderboard_id for leaderboard_id, _, _ in leaderboards] for game, leaderboards in results.items()} \
+        == {game: [lb_id] for game, lb_id in lb_ids.items()}
+    assert {game: stored(db, lb_id) for game, lb_id in lb_ids.items()} == expected
+
+
+def test_rebuild_refuses_open_weeklies(file_db):
+    db = file_db
+    lb_ids = seed_played(db, games=(Games.ALTTPR,), players=10, weeklies=1)
+    with db.Session() as session:
+        lb = db.get_leaderboard(session, lb_ids[Games.ALTTPR])
+        create_weekly(session, Games.ALTTPR, datetime(2021, 2, 1), WeeklyStatus.OPEN, lb)
+        session.commit()
+
+    with pytest.raises(FrompsBotException):
+        rebuild_leaderboards(db, workers=1)
+    with pytest.raises(ConsistencyError):
+        rebuild_leaderboard(db, lb_ids[Games.ALTTPR], ranking)
+
+
+def test_database_keeps_engine_options(file_db):
+    assert file_db.engine_options == {"connect_args": {"timeout": 30}}
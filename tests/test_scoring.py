@@ -0,0 +1,169 @@
+import pytest
+
+from datatypes import Games, PlayerStatus, EntryStatus
+from util import time_to_timedelta
+
+from bot.cogs.weekly_races import ranking
+from bot.cogs.weekly_races.leaderboard import update_weekly, update_leaderboard
+
+from tests import legacy_scoring
+from tests.factories import random_time, create_players, create_weekly, create_entry, create_leaderboard
+
+from datetime import datetime, timedelta
+import random
+
+
+TRIALS = 300
+
+# Coarse steps make ties likely, in weeklies as well as in final points
+TIME_STEPS = [1, 60, 900, 1800]
+
+
+def random_finish_times(rng):
+    step = rng.choice(TIME_STEPS)
+    return [
+        None if rng.random() < 0.15 else random_time(rng, step=step)
+        for _ in range(rng.randrange(0, 40))
+    ]
+
+
+@pytest.mark.parametrize("seed", range(TRIALS))
+def test_weekly_points_match_legacy(seed):
+    rng = random.Random(seed)
+    finish_times = random_finish_times(rng)
+
+    weekly_positions, weekly_points = ranking.weekly_points(
+        [time_to_timedelta(t).total_seconds() for t in finish_times if t is not None]
+    )
+    scores = zip(weekly_positions, weekly_points)
+    results = []
+    for t in finish_times:
+        if t is None:
+            results.append(("DNF", 0))
+        else:
+            position, points = next(scores)
+            results.append((str(position), points))
+
+    assert results == legacy_scoring.weekly(finish_times)
+
+
+@pytest.mark.parametrize("seed", range(TRIALS))
+def test_best_of_matches_legacy(seed):
+    rng = random.Random(seed)
+    included = rng.randrange(0, 8)
+    points = [15, 13, 12.5, 12, 10, 1, 0]
+    results = [
+        [(w, rng.choice(points)) for w in rng.sample(range(10), rng.randrange(0, 10))]
+        for _ in range(rng.randrange(1, 20))
+    ]
+
+    for player_results, (total_points, final_points, discarded) in zip(results, ranking.best_of(results, included)):
+        weeklies = {str(w): {"points": p} for w, p in player_results}
+        assert (total_points, final_points) == legacy_scoring.totals(weeklies, included)
+        assert discarded == [weeklies[str(w)]["discarded"] for w, _ in player_results]
+
+
+def test_competition_rank():
+    items = ["a", "b", "c", "d", "e"]
+    keys = {"a": 3, "b": 1, "c": 3, "d": 2, "e": 1}
+    assert [(pos, group) for pos, group in ranking.competition_rank(items, key=keys.get)] == [
+        (1, ["b", "e"]), (3, ["d"]), (4, ["a", "c"])
+    ]
+    assert [pos for pos, _ in ranking.competition_rank(items, key=keys.get, reverse=True, start=5)] == [5, 7, 8]
+
+
+def test_dense_rank():
+    items = ["a", "b", "c", "d", "e"]
+    keys = {"a": 3, "b": 1, "c": 3, "d": 2, "e": 1}
+    assert [(rank, group) for rank, group in ranking.dense_rank(items, key=keys.get)] == [
+        (1, ["b", "e"]), (2, ["d"]), (3, ["a", "c"])
+    ]
+    assert [rank for rank, _ in ranking.dense_rank(items, key=keys.get, reverse=True, start=5)] == [5, 6, 7]
+    assert ranking.dense_positions([3, 1, 3, 2, 1]) == [3, 1, 3, 2, 1]
+    assert ranking.dense_positions([3, 1, 3, 2, 1], descending=True) == [1, 3, 1, 2, 3]
+
+
+def seed_random_leaderboard(session, rng):
+    players = create_players(session, rng.randrange(1, 40))
+    for player in players:
+        if rng.random() < 0.1:
+            player.status = rng.choice([PlayerStatus.RESTRICTED, PlayerStatus.BANNED])
+
+    start = datetime(2021, 1, 4)
+    lb = create_leaderboard(session, Games.ALTTPR, start)
+    lb.leaderboard_data["included_weeklies"] = str(rng.randrange(1, 7))
+
+    step = rng.choice(TIME_STEPS)
+    weeklies = []
+    for week in range(rng.randrange(1, 9)):
+        weekly = create_weekly(session, Games.ALTTPR, start + timedelta(weeks=week), leaderboard=lb)
+        for player in players:
+            if rng.random() < 0.2:
+                continue
+            if rng.random() < 0.15:
+                entry = create_entry(session, weekly, player, EntryStatus.DNF)
+            else:
+                entry = create_entry(session, weekly, player, EntryStatus.DONE, random_time(rng, step=step))
+            entry.excluded = rng.random() < 0.05
+        weeklies.append(weekly)
+    session.flush()
+    return lb, weeklies
+
+
+def legacy_leaderboard(lb, weeklies):
+    included_weeklies = int(lb.leaderboard_data["included_weeklies"])
+    weekly_results = {}
+    lb_entries = {}
+    for week_number, weekly in enumerate(weeklies):
+        included_entries = [e for e in weekly.entries if not e.excluded]
+        for e, result in zip(included_entries, legacy_scoring.weekly([e.finish_time for e in included_entries])):
+            weekly_results[(weekly.id, e.player_discord_id)] = result
+            lb_entry = lb_entries.setdefault(e.player_discord_id, {"player": e.player, "weeklies": {}})
+            lb_entry["weeklies"][str(week_number)] = {"points": result[1]}
+            lb_entry["total_points"], lb_entry["final_points"] = legacy_scoring.totals(
+                lb_entry["weeklies"], included_weeklies
+            )
+
+    finish_times = {(weekly_number, e.player_discord_id): e.finish_time
+                    for weekly_number, weekly in enumerate(weeklies) for e in weekly.entries}
+    tiebreak_data = legacy_scoring.leaderboard(
+        [e for e in lb_entries.values() if e["player"].status is PlayerStatus.ACTIVE],
+        lambda week_number, e: finish_times[(week_number, e["player"].discord_id)]
+    )
+    return weekly_results, lb_entries, tiebreak_data
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_leaderboard_matches_legacy(db, session, seed):
+    lb, weeklies = seed_random_leaderboard(session, random.Random(seed))
+    weekly_results, lb_entries, tiebreak_data = legacy_leaderboard(lb, weeklies)
+
+    for weekly in weeklies:
+        update_weekly(db, session, weekly)
+    session.flush()
+    update_leaderboard(db, session, db.get_open_leaderboard_with_entries(session, Games.ALTTPR))
+    session.flush()
+
+    for weekly in weeklies:
+        for e in weekly.entries:
+            if e.excluded:
+                assert e.points is None
+                continue
+            position, points = weekly_results[(weekly.id, e.player_discord_id)]
+            assert ("DNF" if e.position is None else str(e.position), e.points) == (position, points)
+
+    assert {e.player_discord_id for e in lb.entries} == set(lb_entries)
+    for e in lb.entries:
+        expected = lb_entries[e.player_discord_id]
+        assert (e.total_points, e.final_points) == (expected["total_points"], expected["final_points"])
+        assert {str(r.week_number): {"points": r.points, "discarded": r.discarded} for r in e.results} == \
+            expected["weeklies"]
+        if e.player.status is PlayerStatus.ACTIVE:
+            assert e.position == expected["position"]
+            tiebreak = None if e.tiebreak_common_points is None else {
+                "common_points": e.tiebreak_common_points,
+                "minimum_time": e.tiebreak_minimum_time
+            }
+            assert tiebreak == expected["tiebreak"]
+
+    assert lb.leaderboard_data["tiebreak_data"] == tiebreak_data
@@ -0,0 +1,82 @@
+from datatypes import PlayerStatus, EntryStatus
+
+from bot.cogs.weekly_races.leaderboard import update_provisional, update_weekly, update_leaderboard
+
+from tests.factories import seed_leaderboard, create_players, create_entry
+from tests.test_query_plans import query_plan
+
+from datetime import time
+
+
+def test_weekly_standings_put_players_still_playing_last(db, session, statements):
+    _, _, current, _ = seed_leaderboard(session, players=30, time_step=900)
+    update_provisional(db, session, current)
+    session.flush()
+
+    statements.clear()
+    standings = db.get_weekly_standings(session, current.id)
+    # Postgres sorts NULL first on descending order unless told otherwise
+    assert "NULLS LAST" in statements[0][0]
+
+    points = [e.points for e in standings]
+    scored = [p for p in points if p is not None]
+    assert 0 < len(scored) < len(points)
+    assert points == scored + [None] * (len(points) - len(scored))
+    assert scored == sorted(scored, reverse=True)
+
+    # Ties and players still playing come in a fixed order, by player
+    for group_points in set(points):
+        group = [int(e.name[len("player"):]) for e in standings if e.points == group_points]
+        assert group == sorted(group)
+
+
+
+def test_leaderboard_rank_matches_the_standings(engine, db, session, statements):
+    lb, closed, current, players = seed_leaderboard(session, players=40, time_step=900)
+    players[0].status = PlayerStatus.BANNED
+    for weekly in closed:
+        update_weekly(db, session, weekly)
+    update_leaderboard(db, session, lb)
+    # A newcomer with a provisional result only is not ranked until the weekly closes
+    newcomer = create_players(session, 1, start_id=5000)[0]
+    create_entry(session, current, newcomer, EntryStatus.TIME_SUBMITTED, time(1, 0))
+    session.flush()
+    update_provisional(db, session, current)
+    session.flush()
+
+    standings, _ = db.get_leaderboard_standings(session, lb.id, with_results=False)
+    assert any(e.position != i + 1 for i, e in enumerate(standings))
+    for i, e in enumerate(standings):
+        entry, above, below = db.get_leaderboard_rank(session, lb.id, e.player_discord_id)
+        assert (entry.name, entry.position, entry.final_points) == (e.name, e.position, e.final_points)
+
+        higher = [a.position for a in standings if a.position < e.position]
+        lower = [b.position for b in standings if b.position > e.position]
+        assert (above and above.position) == max(higher, default=None)
+        assert (below and below.position) == min(lower, default=None)
+        if above is not None:
+            assert above.final_points >= entry.final_points
+        if below is not None:
+            assert below.final_points <= entry.final_points
+
+    assert db.get_leaderboard_rank(session, lb.id, players[0].discord_id) == (None, None, None)
+    assert db.get_leaderboard_rank(session, lb.id, newcomer.discord_id) == (None, None, None)
+
+    # Closing the weekly ranks everyone again, the newcomer included
+    db.close_weekly(session, current)
+    update_provisional(db, session, current)
+    session.flush()
+    standings, _ = db.get_leaderboard_standings(session, lb.id, with_results=False)
+    for e in standings:
+        entry, _, _ = db.get_leaderboard_rank(session, lb.id, e.player_discord_id)
+        assert entry.position == e.position
+    assert newcomer.discord_id in [e.player_discord_id for e in standings]
+
+    # The neighbours are found on the positions index
+    statements.clear()
+    db.get_leaderboard_rank(session, lb.id, standings[len(standings) // 2].player_discord_id)
+    _, above, below = [query_plan(engine, *statement) for statement in list(statements)]
+    index = "USING INDEX ix_leaderboard_entries_position (leaderboard_id=? AND position>?"
+    for plan in (above, below):
+        assert any(index in d for d in plan), plan
+        assert not any("USE TEMP B-TREE FOR ORDER BY" in d for d in plan), plan
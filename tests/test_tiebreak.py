@@ -0,0 +1,37 @@
+from bot.cogs.weekly_races.leaderboard import update_weekly, update_leaderboard
+
+from datatypes import Games
+
+from tests.factories import seed_tied_leaderboard
+
+import pytest
+
+
+def rank(db, session, game, groups, group_size, start_id, statements):
+    lb, closed = seed_tied_leaderboard(
+        session, game=game, groups=groups, group_size=group_size, start_id=start_id
+    )
+    for weekly in closed:
+        update_weekly(db, session, weekly)
+    session.commit()
+
+    lb = db.get_open_leaderboard_with_entries(session, game)
+    statements.clear()
+    update_leaderboard(db, session, lb)
+    session.flush()
+    reads = [statement for statement, _ in statements if statement.lstrip().startswith("SELECT")]
+    return lb, reads
+
+
+@pytest.mark.parametrize("groups, group_size", [(1, 2), (5, 4), (40, 5)])
+def test_tiebreak_reads_finish_times_once(db, session, statements, groups, group_size):
+    _, baseline = rank(db, session, Games.OOTR, 1, 2, 100000, statements)
+    lb, reads = rank(db, session, Games.ALTTPR, groups, group_size, 1000, statements)
+
+    # One query for the finish times of every tied player, however many ties there are
+    assert len([statement for statement in reads if "FROM player_entries" in statement]) == 1
+    assert len(reads) == len(baseline)
+
+    # Same times in every weekly: each group stays tied, at the position of its first player
+    positions = sorted(e.position for e in lb.entries)
+    assert positions == [group * group_size + 1 for group in range(groups) for _ in range(group_size)]
@@ -0,0 +1,56 @@
+from datatypes import Games
+
+from tests.factories import seed_leaderboard, create_players, create_leaderboard
+
+from datetime import datetime
+
+
+def version(db, leaderboard_id):
+    with db.Session() as session:
+        return db.get_leaderboard(session, leaderboard_id).version
+
+
+def test_touch_leaderboard_once_per_transaction(db, session):
+    lb, _, _, _ = seed_leaderboard(session, players=5, weeklies=1)
+    session.commit()
+
+    db.touch_leaderboard(session, lb)
+    db.touch_leaderboard(session, lb)
+    assert lb.version == 1
+    session.commit()
+    db.touch_leaderboard(session, lb)
+    session.commit()
+    assert version(db, lb.id) == 2
+
+
+def test_concurrent_touches_get_their_own_version(db):
+    with db.Session() as session:
+        lb = create_leaderboard(session, Games.ALTTPR, datetime(2021, 1, 4))
+        session.commit()
+        leaderboard_id = lb.id
+
+    # Both load the same version before either of them changes it
+    with db.Session() as first, db.Session() as second:
+        first_lb = db.get_leaderboard(first, leaderboard_id)
+        second_lb = db.get_leaderboard(second, leaderboard_id)
+        assert first_lb.version == second_lb.version == 0
+
+        db.touch_leaderboard(second, second_lb)
+        second.commit()
+        db.touch_leaderboard(first, first_lb)
+        assert first_lb.version == 2
+        first.commit()
+
+    assert version(db, leaderboard_id) == 2
+
+
+def test_renaming_a_player_changes_their_leaderboards(db, session):
+    players = create_players(session, 5)
+    played, _, _, _ = seed_leaderboard(session, players=players[:3], weeklies=2)
+    other, _, _, _ = seed_leaderboard(session, game=Games.OOTR, players=players[3:], weeklies=2)
+    session.commit()
+
+    db.set_player_name(session, players[0], "renamed")
+    session.commit()
+    assert version(db, played.id) == 1
+    assert version(db, other.id) == 0